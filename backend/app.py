@@ -1,7 +1,8 @@
 from flask import Flask
 from flask_cors import CORS
 from config import Config
-from utils.database import init_db
+from utils import metrics, profiling
+from utils.database import db, init_db
 
 # Import blueprints
 from routes.health import health_bp
@@ -20,6 +21,11 @@ def create_app():
     # Initialize database
     init_db(app)
 
+    # Request and query timing for /api/metrics; per-request profiling if enabled
+    with app.app_context():
+        metrics.init_app(app, db.engine)
+        profiling.init_app(app, db.engine)
+
     # Register blueprints
     app.register_blueprint(health_bp)
     app.register_blueprint(products_bp)
@@ -0,0 +1,73 @@
+"""
+Re-analyze review sentiment in bulk through the Message Batches API.
+Run: python backfill_sentiment.py [--no-wait] [--batch-id ID ...] [--max-batches N] [--status]
+
+Submits every review whose sentiment_version differs from the current
+ANALYSIS_VERSION (e.g. after a SYSTEM_PROMPT or model change), except those
+the local lexicon scored confidently, polls until the batches end and
+writes the results back. Interrupted runs resume: open batches are polled
+and applied before anything new is submitted. With --no-wait it submits and
+exits; run it again later to collect results.
+"""
+import argparse
+import logging
+from app import create_app
+from models.sentiment_backfill_batch import SentimentBackfillBatch
+from services.chat_service import get_anthropic_client
+from services.sentiment_backfill import count_pending_reviews, run_backfill
+from services.sentiment_service import ANALYSIS_VERSION
+
+
+def print_status():
+    print(f"Analysis version: {ANALYSIS_VERSION}")
+    print(f"Reviews pending re-analysis: {count_pending_reviews()}")
+    batches = SentimentBackfillBatch.query.order_by(SentimentBackfillBatch.created_at.desc()).limit(20).all()
+    for batch in batches:
+        print(
+            f"  {batch.id}  {batch.status:<11} {batch.request_count} requests"
+            + (f", {batch.reviews_updated} reviews updated" if batch.reviews_updated is not None else "")
+        )
+
+
+def backfill(args):
+    app = create_app()
+
+    with app.app_context():
+        if args.status:
+            print_status()
+            return
+
+        api_key = app.config.get("ANTHROPIC_API_KEY", "")
+        if not api_key:
+            raise SystemExit("ANTHROPIC_API_KEY is not configured")
+
+        print(f"Reviews pending re-analysis: {count_pending_reviews()}")
+        result = run_backfill(
+            get_anthropic_client(api_key),
+            wait=not args.no_wait,
+            poll_seconds=args.poll_seconds,
+            max_batches=args.max_batches,
+            requests_per_batch=args.requests_per_batch,
+            batch_ids=args.batch_id,
+        )
+        print(
+            f"Resumed {result['resumed']} and submitted {result['submitted']} batch(es); "
+            f"applied {result['applied']}, {result['open']} still open. "
+            f"Updated {result['reviews_updated']} reviews from batches, {result['reviews_from_cache']} from cache."
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk sentiment backfill via the Message Batches API")
+    parser.add_argument("--no-wait", action="store_true", help="Submit (and apply ended batches) without polling")
+    parser.add_argument("--batch-id", action="append", help="Only resume this batch (repeatable)")
+    parser.add_argument("--max-batches", type=int, default=None, help="Submit at most this many new batches")
+    parser.add_argument("--requests-per-batch", type=int, default=None,
+                        help="Requests per batch (default: SENTIMENT_BACKFILL_REQUESTS_PER_BATCH)")
+    parser.add_argument("--poll-seconds", type=float, default=None,
+                        help="Seconds between status checks (default: SENTIMENT_BACKFILL_POLL_SECONDS)")
+    parser.add_argument("--status", action="store_true", help="Show pending reviews and recent batches")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    backfill(args)
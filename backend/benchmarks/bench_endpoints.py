@@ -0,0 +1,258 @@
+"""
+Benchmark API endpoints against a large synthetic catalogue.
+Run from backend/: python -m benchmarks.bench_endpoints [--products 10000] [--database-url URL] [--repeat 30]
+Compare two runs: python -m benchmarks.bench_endpoints --compare OLD.json NEW.json
+
+Generates the catalogue with seed_data.bulk_catalogue (reused on later runs
+if the database already holds a catalogue of the requested size), then times
+list/search/sort/detail/category requests through the Flask test client and
+chat prompt building. The response cache is disabled so every request
+reaches the database.
+
+Without --database-url a SQLite file under benchmarks/.data/ is used; pass a
+local Postgres URL (postgresql://localhost/revu_bench) to benchmark that.
+The target database is dropped and recreated when (re)generating.
+
+Results are written as JSON to benchmarks/results/ with the git commit,
+database dialect and catalogue size, for comparing between commits.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+SEARCH_COMMON = "wireless headphones"
+SEARCH_RARE = "acupressure sage"
+
+
+def build_app(database_url):
+    # Config reads the environment at import time
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+    os.environ.pop("PROFILING_SECRET", None)
+    from app import create_app
+    return create_app()
+
+
+def git_revision():
+    """(commit, has uncommitted changes), or (None, None) outside a git checkout."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def ensure_catalogue(args):
+    """Generate the catalogue unless one of the requested size is already there."""
+    from models.product import Product
+    from seed_data.bulk_catalogue import generate_catalogue
+    from utils.database import db
+
+    if not args.regenerate:
+        try:
+            if db.session.query(Product.id).count() == args.products:
+                print(f"Reusing existing catalogue of {args.products} products")
+                return None
+        except Exception:
+            db.session.rollback()
+
+    print(f"Generating {args.products} products (~{args.reviews_per_product} reviews each)...")
+    result = generate_catalogue(args.products, args.reviews_per_product, args.seed, workers=args.workers)
+    print(f"Generated {result['reviews']} reviews in {result['seconds']}s")
+    db.session.remove()
+    return result
+
+
+def time_call(fn, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "repeat": repeat,
+    }
+
+
+def endpoint_scenarios(client, products):
+    """Named GET URLs; reference rows are picked deterministically from the data."""
+    from models.product import Product
+    from utils.database import db
+
+    by_reviews = db.session.query(Product.id).order_by(Product.review_count.desc(), Product.id)
+    largest = by_reviews.first()[0]
+    typical = by_reviews.offset(products // 2).first()[0]
+
+    first_page = client.get("/api/products?limit=20&cursor=").get_json()
+    cursor = first_page.get("next_cursor") or ""
+    middle_page = max(products // 20 // 2, 1)
+
+    return {
+        "list_first_page": "/api/products?limit=20",
+        "list_first_page_no_total": "/api/products?limit=20&total=none",
+        "list_deep_offset": f"/api/products?limit=20&page={middle_page}",
+        "list_cursor_second_page": f"/api/products?limit=20&cursor={cursor}",
+        "list_fields_id_name": "/api/products?limit=100&fields=id,name,price",
+        "sort_price_asc": "/api/products?limit=20&sort=price_asc",
+        "sort_newest": "/api/products?limit=20&sort=newest",
+        "search_common": f"/api/products?limit=20&q={SEARCH_COMMON}",
+        "search_common_relevance": f"/api/products?limit=20&sort=relevance&q={SEARCH_COMMON}",
+        "search_rare": f"/api/products?limit=20&q={SEARCH_RARE}",
+        "categories": "/api/categories",
+        "category_products": "/api/categories/electronics/products?limit=20",
+        "category_products_price_desc": "/api/categories/electronics/products?limit=20&sort=price_desc",
+        "detail_typical": f"/api/products/{typical}",
+        "detail_most_reviews": f"/api/products/{largest}",
+    }, largest
+
+
+def run_benchmarks(app, args):
+    from models.product import Product
+    from models.review import Review
+    from services.chat_service import build_chat_context, build_system_prompt
+    from utils.database import db
+
+    results = {}
+    client = app.test_client()
+    with app.app_context():
+        urls, largest = endpoint_scenarios(client, args.products)
+        for name, url in urls.items():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f"{name}: {url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+            size = len(response.get_data())
+
+            def request_once(url=url):
+                client.get(url).get_data()
+
+            results[name] = dict(time_call(request_once, args.repeat, args.warmup), url=url, bytes=size)
+            print(f"{name:<32} {results[name]['median_ms']:>9.2f} ms  (p95 {results[name]['p95_ms']:.2f})")
+
+        product_data = db.session.get(Product, largest).to_dict(include_reviews=True)
+        context = build_chat_context(product_data, app.config.get("CHAT_CONTEXT_TOKEN_BUDGET", 3000))
+        selected = [product_data["reviews"][i] for i in context.overview_ids]
+        prompt_benchmarks = {
+            "build_system_prompt": lambda: build_system_prompt(product_data, selected),
+            "build_chat_context": lambda: build_chat_context(
+                product_data, app.config.get("CHAT_CONTEXT_TOKEN_BUDGET", 3000),
+            ),
+            "chat_user_message": lambda: context.user_message(
+                "Does the battery last?", app.config.get("CHAT_RELEVANT_TOKEN_BUDGET", 1000),
+            ),
+        }
+        for name, fn in prompt_benchmarks.items():
+            results[name] = dict(time_call(fn, args.repeat, args.warmup), reviews=len(product_data["reviews"]))
+            print(f"{name:<32} {results[name]['median_ms']:>9.2f} ms  (p95 {results[name]['p95_ms']:.2f})")
+
+        counts = {
+            "products": db.session.query(Product.id).count(),
+            "reviews": db.session.query(Review.id).count(),
+        }
+    return results, counts
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"old: {old['meta'].get('commit')} {old['meta']['dialect']} {old['meta']['products']} products")
+    print(f"new: {new['meta'].get('commit')} {new['meta']['dialect']} {new['meta']['products']} products")
+    print(f"{'benchmark':<32} {'old_ms':>10} {'new_ms':>10} {'change':>8}")
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None:
+            print(f"{name:<32} {'-':>10} {result['median_ms']:>10.2f}")
+            continue
+        change = (result["median_ms"] - before["median_ms"]) / before["median_ms"] * 100 if before["median_ms"] else 0
+        print(f"{name:<32} {before['median_ms']:>10.2f} {result['median_ms']:>10.2f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API endpoints on a large synthetic catalogue")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--reviews-per-product", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="Default: SQLite file in benchmarks/.data/")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate even if a catalogue exists")
+    parser.add_argument("--workers", type=int, default=None, help="Catalogue generator processes")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<commit>-<dialect>-<products>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two results files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    database_url = args.database_url
+    if not database_url:
+        data_dir = os.path.join(BENCH_DIR, ".data")
+        os.makedirs(data_dir, exist_ok=True)
+        database_url = f"sqlite:///{os.path.join(data_dir, f'catalogue-{args.products}-{args.seed}.db')}"
+
+    app = build_app(database_url)
+    with app.app_context():
+        generated = ensure_catalogue(args)
+        from utils.database import db
+        dialect = db.engine.dialect.name
+        server_version = ".".join(str(part) for part in (db.engine.dialect.server_version_info or ()))
+
+    results, counts = run_benchmarks(app, args)
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": dirty,
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "dialect": dialect,
+            "server_version": server_version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "products": counts["products"],
+            "reviews": counts["reviews"],
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "generation_seconds": generated["seconds"] if generated else None,
+        },
+        "results": results,
+    }
+
+    output = args.output
+    if not output:
+        results_dir = os.path.join(BENCH_DIR, "results")
+        os.makedirs(results_dir, exist_ok=True)
+        suffix = "-dirty" if dirty else ""
+        output = os.path.join(results_dir, f"{commit or 'nogit'}{suffix}-{dialect}-{counts['products']}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Offline accuracy of the local sentiment tier against stored Claude labels.
+Run from backend/: python -m benchmarks.bench_local_sentiment [--database-url URL] [--thresholds 0.4,0.5,0.6,0.7]
+
+Reads reviews whose sentiment_version is the current ANALYSIS_VERSION (their
+stored score and pros/cons came from Claude), scores them with
+services.local_sentiment product by product, and reports for each
+confidence threshold:
+
+- coverage: share of reviews the local tier would keep (Claude calls saved)
+- mae: mean absolute sentiment error on those reviews
+- class_agreement: same positive / mixed / negative class as Claude
+- aspect_recall: share of kept reviews with Claude pros/cons where the
+  local tier also found at least one
+
+plus the same error figures for every review and for the old star-rating
+fallback. --any-labels uses every stored score instead (e.g. the mock
+catalogue, which has no Claude labels).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+THRESHOLDS = "0.3,0.4,0.5,0.6,0.7,0.8"
+
+# Reviews read per query
+CHUNK_SIZE = 5000
+
+
+def _class(score):
+    from services.review_selection import NEGATIVE_THRESHOLD, POSITIVE_THRESHOLD
+    return 1 if score >= POSITIVE_THRESHOLD else -1 if score < NEGATIVE_THRESHOLD else 0
+
+
+def load_labelled(any_labels, limit):
+    """Review inputs grouped by product, with the stored labels keyed by review id."""
+    from models.review import Review
+    from services.sentiment_backfill import _review_input
+    from services.sentiment_service import ANALYSIS_VERSION
+    from utils.database import db
+
+    query = db.select(
+        Review.id, Review.product_id, Review.text, Review.source_rating,
+        Review.sentiment_score, Review.pros, Review.cons,
+    ).order_by(Review.product_id, Review.id)
+    if not any_labels:
+        query = query.where(Review.sentiment_version == ANALYSIS_VERSION)
+    if limit:
+        query = query.limit(limit)
+
+    products = {}
+    labels = {}
+    for review_id, product_id, text, source_rating, score, pros, cons in db.session.execute(
+        query.execution_options(yield_per=CHUNK_SIZE)
+    ):
+        products.setdefault(product_id, []).append(_review_input(review_id, text, source_rating))
+        labels[review_id] = {"score": score, "has_aspects": bool(json.loads(pros or "[]") or json.loads(cons or "[]"))}
+    return products, labels
+
+
+def evaluate(products, labels, thresholds):
+    from services.local_sentiment import score_reviews
+    from services.serpapi_client import SerpApiClient
+
+    start = time.perf_counter()
+    results = [result for reviews in products.values() for result in score_reviews(reviews)]
+    seconds = time.perf_counter() - start
+    inputs = {r["id"]: r for reviews in products.values() for r in reviews}
+
+    def summarize(selected):
+        if not selected:
+            return {"reviews": 0}
+        errors = [abs(r["sentiment_score"] - labels[r["id"]]["score"]) for r in selected]
+        with_aspects = [r for r in selected if labels[r["id"]]["has_aspects"]]
+        return {
+            "reviews": len(selected),
+            "coverage": round(len(selected) / len(results), 4),
+            "mae": round(sum(errors) / len(errors), 4),
+            "class_agreement": round(
+                sum(_class(r["sentiment_score"]) == _class(labels[r["id"]]["score"]) for r in selected) / len(selected), 4
+            ),
+            "aspect_recall": round(
+                sum(bool(r["pros"] or r["cons"]) for r in with_aspects) / len(with_aspects), 4
+            ) if with_aspects else None,
+        }
+
+    star_fallback = [
+        {"id": r["id"], "sentiment_score": SerpApiClient.convert_sentiment(inputs[r["id"]]["star_rating"]),
+         "pros": [], "cons": []}
+        for r in results
+    ]
+    return {
+        "reviews_per_second": round(len(results) / seconds) if seconds else None,
+        "all_reviews": summarize(results),
+        "star_rating_fallback": summarize(star_fallback),
+        "thresholds": {
+            str(threshold): summarize([r for r in results if r["confidence"] >= threshold])
+            for threshold in thresholds
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local sentiment accuracy against stored Claude labels")
+    parser.add_argument("--database-url", help="Default: DATABASE_URL from the environment")
+    parser.add_argument("--thresholds", default=THRESHOLDS, help="Comma-separated confidence thresholds")
+    parser.add_argument("--any-labels", action="store_true", help="Use every stored score, not only Claude's")
+    parser.add_argument("--limit", type=int, help="At most this many reviews")
+    parser.add_argument("--output", help="Also write the report as JSON here")
+    args = parser.parse_args()
+
+    if args.database_url:
+        # Config reads the environment at import time
+        os.environ["DATABASE_URL"] = args.database_url
+    from app import create_app
+    from services.local_sentiment import LOCAL_VERSION
+
+    app = create_app()
+    with app.app_context():
+        products, labels = load_labelled(args.any_labels, args.limit)
+    if not labels:
+        print("No labelled reviews (run the backfill first, or pass --any-labels)", file=sys.stderr)
+        raise SystemExit(1)
+
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    report = evaluate(products, labels, thresholds)
+    report["local_version"] = LOCAL_VERSION
+
+    print(f"{len(labels)} reviews in {len(products)} products, "
+          f"{report['reviews_per_second']:,} reviews/s scored locally")
+    print(f"{'':<22} {'coverage':>9} {'mae':>7} {'class':>7} {'aspects':>8}")
+    rows = [("all reviews", report["all_reviews"]), ("star-rating fallback", report["star_rating_fallback"])]
+    rows += [(f"confidence >= {t}", summary) for t, summary in report["thresholds"].items()]
+    for name, summary in rows:
+        if not summary["reviews"]:
+            print(f"{name:<22} {0:>9.1%}")
+            continue
+        aspects = f"{summary['aspect_recall']:.1%}" if summary["aspect_recall"] is not None else "-"
+        print(f"{name:<22} {summary['coverage']:>9.1%} {summary['mae']:>7.3f} "
+              f"{summary['class_agreement']:>7.1%} {aspects:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
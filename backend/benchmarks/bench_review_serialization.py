@@ -0,0 +1,90 @@
+"""
+Benchmark product detail review serialization.
+Run from backend/: python -m benchmarks.bench_review_serialization [--sizes 50 500 5000] [--repeat 20]
+
+Compares the ORM path (one Review object + two json.loads per row) with
+Review.dicts_for_product against a throwaway SQLite database.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+
+def build_app(db_path):
+    # Config reads DATABASE_URL at import time
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    from app import create_app
+    return create_app()
+
+
+def insert_reviews(db, product_id, count):
+    """Bulk insert `count` synthetic reviews for one product."""
+    from models.review import Review
+
+    rows = []
+    for _ in range(count):
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "product_id": product_id,
+            "source": random.choice(["amazon", "ebay", "tiktok", "etsy"]),
+            "text": "Solid product, battery lasts all day. " * random.randint(1, 8),
+            "sentiment_score": random.random(),
+            "source_rating": float(random.randint(1, 5)),
+            "pros": '["Great battery life", "Comfortable fit"]',
+            "cons": '["Pricey"]' if random.random() < 0.5 else None,
+        })
+    db.session.execute(Review.__table__.insert(), rows)
+    db.session.commit()
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(sizes, repeat):
+    from models.product import Product
+    from models.review import Review
+    from utils.database import db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, "bench.db"))
+        with app.app_context():
+            print(f"{'reviews':>8} {'orm_ms':>10} {'bulk_ms':>10} {'speedup':>8}")
+            for size in sizes:
+                product = Product(name=f"Bench {size}", price=10, category=None)
+                db.session.add(product)
+                db.session.commit()
+                insert_reviews(db, product.id, size)
+                product_id = product.id
+
+                def orm_path():
+                    db.session.expunge_all()
+                    p = db.session.get(Product, product_id)
+                    return [review.to_dict() for review in p.reviews.all()]
+
+                def bulk_path():
+                    db.session.expunge_all()
+                    return Review.dicts_for_product(product_id)
+
+                assert sorted(orm_path(), key=lambda r: r["id"]) == sorted(bulk_path(), key=lambda r: r["id"])
+
+                orm_ms = time_call(orm_path, repeat)
+                bulk_ms = time_call(bulk_path, repeat)
+                print(f"{size:>8} {orm_ms:>10.2f} {bulk_ms:>10.2f} {orm_ms / bulk_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark review serialization")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
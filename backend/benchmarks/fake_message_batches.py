@@ -0,0 +1,347 @@
+"""
+Exercise the sentiment backfill against a local fake of the Message Batches API.
+Run from backend/: python -m benchmarks.fake_message_batches [--requests-per-batch 20] [--error-rate 0.05]
+
+Starts a fake of POST /v1/messages/batches, GET /v1/messages/batches/<id>
+and its results endpoint (batches end after --process-seconds; a fraction of
+requests error, come back truncated at max_tokens or answer in text
+without the analysis tool call), plus POST /v1/messages, seeds a throwaway
+SQLite database with the mock catalogue plus one review long enough to be
+split across requests, and then:
+
+1. submits with wait=False, as if the backfill were interrupted
+2. runs again: the open batches are resumed, not resubmitted
+3. runs again: only the reviews whose requests failed are resubmitted
+4. marks every review stale again: they are updated from the sentiment
+   cache without a new batch
+5. analyzes a batch synchronously whose first response has no tool call:
+   it is retried as halves rather than dropped
+
+and checks review rows, review stats and product ratings after each step.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REVIEW_LINE = re.compile(r"^\[Review (\d+)\] \(Star rating: ([\d.]+|None)/5\)$", re.MULTILINE)
+
+
+class FakeBatches(BaseHTTPRequestHandler):
+    """In-memory Message Batches endpoints."""
+
+    protocol_version = "HTTP/1.1"
+    process_seconds = 0.5
+    error_rate = 0.05
+    truncate_rate = 0.05
+    text_only_rate = 0.05
+    text_only_messages = 0
+    batches = {}
+    prompts_seen = []  # (batch id, custom_id, prompt text) for every submitted request
+    messages_seen = []  # Prompt text of every synchronous Messages API call
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, payload, status=200, content_type="application/json"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _batch_json(self, batch):
+        ended = time.monotonic() >= batch["ends_at"]
+        counts = {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        if ended:
+            for result in batch["results"]:
+                counts[result["result"]["type"]] += 1
+        else:
+            counts["processing"] = len(batch["results"])
+        host = self.headers.get("Host")
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts,
+            "created_at": batch["created_at"],
+            "expires_at": batch["expires_at"],
+            "ended_at": batch["created_at"] if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"http://{host}/v1/messages/batches/{batch['id']}/results" if ended else None,
+        }
+
+    def do_POST(self):
+        if self.path.split("?")[0] == "/v1/messages":
+            return self._create_message()
+        if self.path.split("?")[0] != "/v1/messages/batches":
+            return self._send_json({"type": "error", "error": {"type": "not_found_error", "message": self.path}}, 404)
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        batch_id = f"msgbatch_{uuid.uuid4().hex[:24]}"
+        now = datetime.now(timezone.utc)
+        results = []
+        for n, request in enumerate(payload["requests"]):
+            prompt = request["params"]["messages"][0]["content"]
+            with self.lock:
+                self.prompts_seen.append((batch_id, request["custom_id"], prompt))
+            # Pseudo-random failures, stable for a given batch id and request
+            roll = zlib.crc32(f"{batch_id}:{n}".encode()) % 1000 / 1000
+            if roll < self.error_rate:
+                results.append({"custom_id": request["custom_id"], "result": {
+                    "type": "errored",
+                    "error": {"type": "error", "error": {"type": "overloaded_error", "message": "Overloaded"}},
+                }})
+                continue
+            if roll < self.error_rate + self.truncate_rate:
+                outcome = "truncated"
+            elif roll < self.error_rate + self.truncate_rate + self.text_only_rate:
+                outcome = "text_only"
+            else:
+                outcome = "complete"
+            results.append({"custom_id": request["custom_id"], "result": {
+                "type": "succeeded", "message": analysis_message(request["params"], prompt, outcome),
+            }})
+
+        batch = {
+            "id": batch_id,
+            "created_at": now.isoformat().replace("+00:00", "Z"),
+            "expires_at": (now + timedelta(days=1)).isoformat().replace("+00:00", "Z"),
+            "ends_at": time.monotonic() + self.process_seconds,
+            "results": results,
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+        self._send_json(self._batch_json(batch))
+
+    def _create_message(self):
+        """Synchronous Messages API: the first text_only_messages calls answer without the tool."""
+        params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = params["messages"][0]["content"]
+        with self.lock:
+            self.messages_seen.append(prompt)
+            text_only = self.text_only_messages > 0
+            self.text_only_messages -= text_only
+        self._send_json(analysis_message(params, prompt, "text_only" if text_only else "complete"))
+
+    def do_GET(self):
+        match = re.match(r"^/v1/messages/batches/([\w]+)(/results)?$", self.path.split("?")[0])
+        batch = self.batches.get(match.group(1)) if match else None
+        if batch is None:
+            return self._send_json({"type": "error", "error": {"type": "not_found_error", "message": self.path}}, 404)
+        if match.group(2):
+            lines = "\n".join(json.dumps(result) for result in batch["results"]) + "\n"
+            return self._send_json(lines.encode("utf-8"), content_type="application/binary")
+        self._send_json(self._batch_json(batch))
+
+
+def analysis_message(params, prompt, outcome):
+    """
+    A Messages API response to an analysis prompt. outcome is "complete",
+    "truncated" (half the reviews, stopped at max_tokens) or "text_only"
+    (prose instead of the tool call).
+    """
+    message = {
+        "id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant",
+        "model": params["model"], "stop_sequence": None,
+        "usage": {"input_tokens": 100, "output_tokens": 50},
+    }
+    if outcome == "text_only":
+        message["stop_reason"] = "end_turn"
+        message["content"] = [{"type": "text", "text": "These reviews are mostly positive."}]
+        return message
+
+    analysis = [
+        {
+            "id": int(index),
+            "sentiment_score": (float(rating) / 5 if rating != "None" else 0.5),
+            "pros": ["Batch analyzed pro"],
+            "cons": [] if rating != "None" and float(rating) >= 4 else ["Batch analyzed con"],
+        }
+        for index, rating in REVIEW_LINE.findall(prompt)
+    ]
+    if outcome == "truncated":
+        analysis = analysis[:len(analysis) // 2]
+    message["stop_reason"] = "max_tokens" if outcome == "truncated" else "tool_use"
+    message["content"] = [{
+        "type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}",
+        "name": "submit_review_analysis", "input": {"reviews": analysis},
+    }]
+    return message
+
+
+def requests_seen():
+    """Requests received by the fake across all batches."""
+    return len(FakeBatches.prompts_seen)
+
+
+def check(condition, message):
+    print(f"  {'ok ' if condition else 'FAIL'} {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def consistency(db):
+    """Review stats and product ratings agree with the review rows."""
+    from models.product import Product
+    from models.product_review_stats import ProductReviewStats
+    from models.review import Review
+
+    stats_total = db.session.query(db.func.sum(ProductReviewStats.review_count)).scalar() or 0
+    reviews_total = db.session.query(Review.id).count()
+    mismatched = 0
+    for product in Product.query.limit(20):
+        sentiments = [r.sentiment_score for r in product.reviews]
+        # Within rounding: the stats sum sentiments in a different order
+        if sentiments and abs(sum(sentiments) / len(sentiments) * 10 - product.rating) > 0.051:
+            mismatched += 1
+    return stats_total == reviews_total, mismatched
+
+
+def run(args):
+    FakeBatches.process_seconds = args.process_seconds
+    FakeBatches.error_rate = args.error_rate
+    FakeBatches.truncate_rate = args.truncate_rate
+    FakeBatches.text_only_rate = args.text_only_rate
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBatches)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "backfill.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        subprocess.run(
+            [sys.executable, "-m", "seed_data.mock_products"],
+            cwd=BACKEND_DIR, check=True, stdout=subprocess.DEVNULL,
+        )
+
+        import anthropic
+        from app import create_app
+        from models.review import Review
+        from models.sentiment_backfill_batch import SentimentBackfillBatch
+        from models.sentiment_cache import SentimentCacheEntry
+        from models.product import Product
+        from services import shared_counters
+        from services.review_stats import add_reviews
+        from services.sentiment_cache import cache_key
+        from services.sentiment_backfill import count_pending_reviews, iter_pending_reviews, run_backfill
+        from services.sentiment_service import ANALYSIS_VERSION, _run_batches, pack_reviews, split_oversized
+        from utils.database import db
+
+        client = anthropic.Anthropic(api_key="fake", base_url=base_url)
+        app = create_app()
+        with app.app_context():
+            product = Product.query.first()
+            long_review = Review(
+                product_id=product.id, source="amazon", source_rating=2.0, sentiment_score=0.4,
+                text=" ".join(f"Day {i}: the hinge creaked again and the battery drained overnight." for i in range(200)),
+            )
+            db.session.add(long_review)
+            add_reviews(product.id, [long_review])
+            product.review_count += 1
+            db.session.flush()
+            sentiments = [r.sentiment_score for r in product.reviews]
+            product.rating = round(sum(sentiments) / len(sentiments) * 10, 1)
+            db.session.commit()
+
+            total = db.session.query(Review.id).count()
+            print(f"{total} reviews pending, {args.requests_per_batch} requests per batch")
+            options = {"poll_seconds": 0.1, "requests_per_batch": args.requests_per_batch}
+
+            print("1. submit and exit (interrupted run)")
+            first = run_backfill(client, wait=False, **options)
+            check(first["submitted"] >= 1, f"submitted {first['submitted']} batch(es), {requests_seen()} requests")
+            parts = sum(len(re.findall(r"^Day \d+: the hinge", prompt, re.MULTILINE))
+                        for _, _, prompt in FakeBatches.prompts_seen)
+            check(parts > 1, f"long review sent as {parts} parts")
+            sizes = Counter(batch_id for batch_id, _, _ in FakeBatches.prompts_seen)
+            check(max(sizes.values()) <= args.requests_per_batch,
+                  f"batch sizes {sorted(sizes.values(), reverse=True)} (at most {args.requests_per_batch})")
+            check(first["applied"] == 0, "nothing applied before the batches ended")
+            requests_after_submit = requests_seen()
+
+            print("2. resume")
+            second = run_backfill(client, **options)
+            check(second["resumed"] == first["submitted"], f"resumed {second['resumed']} open batches")
+            check(second["submitted"] == 0, "no batch resubmitted")
+            check(requests_seen() == requests_after_submit, "no request sent twice")
+            errored = db.session.query(db.func.sum(SentimentBackfillBatch.errored)).scalar() or 0
+            pending = count_pending_reviews()
+            check(second["reviews_updated"] + pending == total,
+                  f"{second['reviews_updated']} reviews updated, {pending} left by {errored} failed requests")
+            stats_ok, mismatched = consistency(db)
+            check(stats_ok, "review stats match the reviews table")
+            check(mismatched == 0, "product ratings recomputed from the new sentiment")
+
+            print("3. retry errored requests")
+            # Mock reviews share texts; drop the pending ones' cache entries so the retry really goes to the API
+            pending_keys = [cache_key(r["text"], r["star_rating"], ANALYSIS_VERSION) for r in iter_pending_reviews()]
+            SentimentCacheEntry.query.filter(SentimentCacheEntry.key.in_(pending_keys)).delete()
+            db.session.commit()
+            FakeBatches.error_rate = 0
+            FakeBatches.truncate_rate = 0
+            FakeBatches.text_only_rate = 0
+            expected_requests = len(pack_reviews(split_oversized(list(iter_pending_reviews()))))
+            before = requests_seen()
+            third = run_backfill(client, **options)
+            check(requests_seen() - before == expected_requests, f"resubmitted {pending} reviews only")
+            check(third["reviews_updated"] == pending, f"{third['reviews_updated']} reviews updated")
+            check(count_pending_reviews() == 0, f"all reviews at version {ANALYSIS_VERSION}")
+
+            print("4. stale reviews served from the sentiment cache")
+            before = requests_seen()
+            db.session.execute(db.update(Review).values(sentiment_version=None))
+            db.session.commit()
+            updated_at = dict(db.session.execute(db.select(Product.id, Product.updated_at)).all())
+            fourth = run_backfill(client, **options)
+            check(fourth["submitted"] == 0 and requests_seen() == before, "no new batches")
+            check(fourth["reviews_from_cache"] == total, f"{fourth['reviews_from_cache']} reviews from cache")
+            check(count_pending_reviews() == 0, "nothing pending")
+            # Same sentiment and rating, but the chat prompt memo must still see the rewrite
+            unchanged = sum(
+                updated_at[product_id] == stamp
+                for product_id, stamp in db.session.execute(
+                    db.select(Product.id, Product.updated_at).where(Product.reviews.any())
+                )
+            )
+            check(unchanged == 0, "updated_at bumped for every product with reviews")
+
+            print("5. synchronous response without a tool call")
+            reviews = list(db.session.execute(db.select(Review.id, Review.text, Review.source_rating).limit(6)))
+            inputs = [{"id": rid, "text": text, "star_rating": rating} for rid, text, rating in reviews]
+            FakeBatches.text_only_messages = 1
+            results, rate_limited, _ = _run_batches(client, [inputs], 2)
+            check(len(FakeBatches.messages_seen) == 3,
+                  f"{len(FakeBatches.messages_seen)} calls (the batch, then its two halves)")
+            check(sorted(r["id"] for r in results) == sorted(r["id"] for r in inputs) and not rate_limited,
+                  f"{len(results)} of {len(inputs)} reviews analyzed")
+            # Before the throwaway database is removed
+            shared_counters.flush()
+
+    server.shutdown()
+    print("All checks passed.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the sentiment backfill against a fake Message Batches API")
+    parser.add_argument("--requests-per-batch", type=int, default=20)
+    parser.add_argument("--process-seconds", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--truncate-rate", type=float, default=0.05)
+    parser.add_argument("--text-only-rate", type=float, default=0.05)
+    run(parser.parse_args())
@@ -0,0 +1,244 @@
+"""
+Load test concurrent chat streams against gunicorn.
+Run from backend/: python -m benchmarks.load_test_chat [--modes gthread gevent] [--concurrency 4 16 64 200]
+
+Starts a fake Anthropic Messages API (ANTHROPIC_BASE_URL) that streams a
+reply over --stream-seconds, boots gunicorn with each worker class against
+a throwaway seeded SQLite database, then opens N chats at once and reports
+time-to-first-byte and how long /api/health takes while they're open.
+With thread-per-request workers, chats beyond workers x threads queue behind
+whole streams; with gevent they all start immediately.
+
+It also opens one chat, disconnects after the first chunk, and checks that
+the upstream stream was cancelled.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPLY_CHUNKS = 20
+
+
+class FakeAnthropic(BaseHTTPRequestHandler):
+    """Minimal streaming POST /v1/messages."""
+
+    protocol_version = "HTTP/1.1"
+    stream_seconds = 2.0
+    stats = {"started": 0, "completed": 0, "aborted": 0}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _event(self, name, data):
+        self.wfile.write(f"event: {name}\ndata: {json.dumps(data)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._count("started")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        delay = self.stream_seconds / REPLY_CHUNKS
+        try:
+            self._event("message_start", {"type": "message_start", "message": {
+                "id": "msg_load_test", "type": "message", "role": "assistant", "model": "fake",
+                "content": [], "stop_reason": None, "stop_sequence": None,
+                "usage": {"input_tokens": 10, "output_tokens": 1},
+            }})
+            self._event("content_block_start", {
+                "type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""},
+            })
+            for i in range(REPLY_CHUNKS):
+                time.sleep(delay)
+                self._event("content_block_delta", {
+                    "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": f"w{i} "},
+                })
+            self._event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            self._event("message_delta", {
+                "type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": REPLY_CHUNKS},
+            })
+            self._event("message_stop", {"type": "message_stop"})
+        except (BrokenPipeError, ConnectionResetError):
+            self._count("aborted")
+            return
+        self._count("completed")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_database(db_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}")
+    subprocess.run(
+        [sys.executable, "-m", "seed_data.mock_products"],
+        cwd=BACKEND_DIR, env=env, check=True, stdout=subprocess.DEVNULL,
+    )
+
+
+def start_gunicorn(mode, port, db_path, anthropic_url, workers, threads):
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        DATABASE_URL=f"sqlite:///{db_path}",
+        ANTHROPIC_API_KEY="load-test",
+        ANTHROPIC_BASE_URL=anthropic_url,
+        GUNICORN_WORKER_CLASS=mode,
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_THREADS=str(threads),
+        RESPONSE_CACHE_ENABLED="false",
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base}/api/health", timeout=1).ok:
+                return proc, base
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"gunicorn ({mode}) did not start")
+
+
+def one_chat(base, product_id):
+    """Returns (time to first chunk, total time, completed without error)."""
+    start = time.perf_counter()
+    first = None
+    done = False
+    failed = False
+    with requests.post(
+        f"{base}/api/products/{product_id}/chat",
+        json={"message": "Is it durable?"}, stream=True, timeout=300,
+    ) as response:
+        if response.status_code != 200:
+            return None, time.perf_counter() - start, False
+        for line in response.iter_lines():
+            if line and first is None:
+                first = time.perf_counter() - start
+            if line.startswith(b'data: {"error"'):
+                failed = True
+            if line == b"data: [DONE]":
+                done = not failed
+    return first, time.perf_counter() - start, done
+
+
+def probe_health(base, stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            requests.get(f"{base}/api/health", timeout=60)
+            samples.append(time.perf_counter() - start)
+        except requests.RequestException:
+            samples.append(float("inf"))
+        time.sleep(0.1)
+
+
+def run_level(base, product_id, concurrency):
+    stop = threading.Event()
+    health = []
+    prober = threading.Thread(target=probe_health, args=(base, stop, health), daemon=True)
+    prober.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: one_chat(base, product_id), range(concurrency)))
+    stop.set()
+    prober.join()
+
+    ttfb = sorted(r[0] for r in results if r[0] is not None)
+    completed = sum(1 for r in results if r[2])
+    return {
+        "completed": completed,
+        "ttfb_p50": statistics.median(ttfb) if ttfb else None,
+        "ttfb_max": ttfb[-1] if ttfb else None,
+        "wall": max(r[1] for r in results),
+        "health_max": max(health) if health else None,
+    }
+
+
+def check_disconnect(base, product_id):
+    """Disconnect after the first chunk; the upstream stream should be aborted."""
+    before = dict(FakeAnthropic.stats)
+    with requests.post(
+        f"{base}/api/products/{product_id}/chat",
+        json={"message": "hello"}, stream=True, timeout=60,
+    ) as response:
+        next(response.iter_lines())
+    # The server notices on its next write; give the upstream a few chunks to fail
+    time.sleep(FakeAnthropic.stream_seconds + 1)
+    return FakeAnthropic.stats["aborted"] > before["aborted"]
+
+
+def fmt(seconds):
+    return "-" if seconds is None else f"{seconds:.2f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test concurrent chat streams")
+    parser.add_argument("--modes", nargs="+", default=["gthread", "gevent"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 64, 200])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--stream-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    FakeAnthropic.stream_seconds = args.stream_seconds
+    upstream = ThreadingHTTPServer(("127.0.0.1", free_port()), FakeAnthropic)
+    upstream.daemon_threads = True
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    anthropic_url = f"http://127.0.0.1:{upstream.server_port}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "load.db")
+        seed_database(db_path)
+
+        for mode in args.modes:
+            proc, base = start_gunicorn(mode, free_port(), db_path, anthropic_url, args.workers, args.threads)
+            try:
+                product_id = requests.get(f"{base}/api/products?limit=1").json()["products"][0]["id"]
+                # Warm up every worker (imports, prompt memo) before measuring
+                run_level(base, product_id, args.workers * 2)
+                print(f"\n{mode}: {args.workers} workers, {args.stream_seconds:.1f}s streams")
+                print(f"{'chats':>6} {'done':>6} {'ttfb_p50':>9} {'ttfb_max':>9} {'wall':>8} {'health_max':>11}")
+                for concurrency in args.concurrency:
+                    r = run_level(base, product_id, concurrency)
+                    print(
+                        f"{concurrency:>6} {r['completed']:>6} {fmt(r['ttfb_p50']):>9} "
+                        f"{fmt(r['ttfb_max']):>9} {fmt(r['wall']):>8} {fmt(r['health_max']):>11}"
+                    )
+                cancelled = check_disconnect(base, product_id)
+                print(f"client disconnect cancels upstream stream: {'yes' if cancelled else 'NO'}")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,12 @@ class Config:
         "DATABASE_URL", "sqlite:///revu.db"
     ).replace("postgres://", "postgresql://", 1)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connection pool, per worker process (see utils/db_pool.py)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; below the server's idle timeout
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
 
     # Flask
     FLASK_ENV = os.getenv("FLASK_ENV", "development")
@@ -21,15 +27,84 @@ class Config:
     # API
     API_PAGE_SIZE = 20
     API_MAX_PAGE_SIZE = 100
+    # Category listings may ask for bigger pages; above the threshold they are streamed
+    API_STREAM_MAX_PAGE_SIZE = int(os.getenv("API_STREAM_MAX_PAGE_SIZE", "1000"))
+    API_STREAM_THRESHOLD = int(os.getenv("API_STREAM_THRESHOLD", "200"))
+
+    # Catalogue response cache (ETag / 304 on list endpoints)
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") == "1"
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+    RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")  # e.g. redis://... to share across workers
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_VERSION_TTL = float(os.getenv("RESPONSE_CACHE_VERSION_TTL", "2"))
+    RESPONSE_CACHE_MAX_AGE = int(os.getenv("RESPONSE_CACHE_MAX_AGE", "0"))
 
     # External APIs
     BESTBUY_API_KEY = os.getenv("BESTBUY_API_KEY", "")
     SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY", "")
     SERPAPI_MONTHLY_LIMIT = int(os.getenv("SERPAPI_MONTHLY_LIMIT", "250"))
+    QUOTA_CACHE_SECONDS = int(os.getenv("QUOTA_CACHE_SECONDS", "30"))
     REVIEW_CACHE_DAYS = int(os.getenv("REVIEW_CACHE_DAYS", "7"))
+    SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "4"))
+
+    # Background review refresh worker (worker.py)
+    REVIEW_REFRESH_POLL_SECONDS = float(os.getenv("REVIEW_REFRESH_POLL_SECONDS", "5"))
+    REVIEW_REFRESH_STALE_MINUTES = int(os.getenv("REVIEW_REFRESH_STALE_MINUTES", "15"))
+    REVIEW_REFRESH_MAX_ATTEMPTS = int(os.getenv("REVIEW_REFRESH_MAX_ATTEMPTS", "3"))
+    REVIEW_REFRESH_RETRY_MINUTES = int(os.getenv("REVIEW_REFRESH_RETRY_MINUTES", "5"))
+    # How often the worker enqueues viewed products whose reviews are due
+    REVIEW_SCHEDULE_SECONDS = float(os.getenv("REVIEW_SCHEDULE_SECONDS", "300"))
+    # SerpApi calls allowed ahead of an even spread of SERPAPI_MONTHLY_LIMIT over the month
+    REVIEW_REFRESH_BURST = int(os.getenv("REVIEW_REFRESH_BURST", "5"))
+
+    # Per-product review TTL tiers by views per day; REVIEW_CACHE_DAYS applies between the two thresholds
+    REVIEW_HOT_VIEWS_PER_DAY = float(os.getenv("REVIEW_HOT_VIEWS_PER_DAY", "20"))
+    REVIEW_HOT_CACHE_DAYS = float(os.getenv("REVIEW_HOT_CACHE_DAYS", "1"))
+    REVIEW_WARM_VIEWS_PER_DAY = float(os.getenv("REVIEW_WARM_VIEWS_PER_DAY", "1"))
+    REVIEW_COLD_CACHE_DAYS = float(os.getenv("REVIEW_COLD_CACHE_DAYS", "30"))
+    # TTLs shrink for products that keep getting new reviews, down to this
+    REVIEW_MIN_CACHE_HOURS = float(os.getenv("REVIEW_MIN_CACHE_HOURS", "6"))
+    REVIEW_VIEW_HALF_LIFE_DAYS = float(os.getenv("REVIEW_VIEW_HALF_LIFE_DAYS", "7"))
+
+    # Outbound HTTP (pooled keep-alive session shared by SerpApi / Best Buy clients)
+    HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+    HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+    HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+    HTTP_HOST_TIMEOUTS = {
+        "serpapi.com": float(os.getenv("SERPAPI_READ_TIMEOUT", "20")),
+        "api.bestbuy.com": float(os.getenv("BESTBUY_READ_TIMEOUT", "15")),
+    }
 
     # Anthropic Claude API
     ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY", "")
 
+    # Review sentiment analysis (concurrent Claude batches)
+    SENTIMENT_CONCURRENCY = int(os.getenv("SENTIMENT_CONCURRENCY", "4"))
+    SENTIMENT_MAX_RETRIES = int(os.getenv("SENTIMENT_MAX_RETRIES", "3"))
+    SENTIMENT_RETRY_BASE_SECONDS = float(os.getenv("SENTIMENT_RETRY_BASE_SECONDS", "2"))
+    SENTIMENT_CACHE_MAX_ENTRIES = int(os.getenv("SENTIMENT_CACHE_MAX_ENTRIES", "100000"))
+    # Reviews per Claude request are packed up to this many estimated prompt tokens
+    SENTIMENT_BATCH_INPUT_TOKENS = int(os.getenv("SENTIMENT_BATCH_INPUT_TOKENS", "8000"))
+    SENTIMENT_BATCH_MAX_REVIEWS = int(os.getenv("SENTIMENT_BATCH_MAX_REVIEWS", "25"))
+    # Reviews the local lexicon scores at least this confidently skip Claude (above 1 sends all to Claude)
+    LOCAL_SENTIMENT_CONFIDENCE = float(os.getenv("LOCAL_SENTIMENT_CONFIDENCE", "0.6"))
+    # Bulk re-analysis via the Message Batches API (backfill_sentiment.py)
+    SENTIMENT_BACKFILL_REQUESTS_PER_BATCH = int(os.getenv("SENTIMENT_BACKFILL_REQUESTS_PER_BATCH", "1000"))
+    SENTIMENT_BACKFILL_POLL_SECONDS = float(os.getenv("SENTIMENT_BACKFILL_POLL_SECONDS", "60"))
+
+    # Product chat (memoized system prompts, per worker process)
+    CHAT_PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_PROMPT_CACHE_MAX_ENTRIES", "256"))
+    CHAT_MAX_CONCURRENT_STREAMS = int(os.getenv("CHAT_MAX_CONCURRENT_STREAMS", "500"))
+    # Estimated tokens of reviews in the cached system prompt / added per question
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "3000"))
+    CHAT_RELEVANT_TOKEN_BUDGET = int(os.getenv("CHAT_RELEVANT_TOKEN_BUDGET", "1000"))
+
+    # Per-request profiling: send `X-Profile: <secret>` (disabled when empty)
+    PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+    PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "1"))
+    PROFILING_N_PLUS_ONE_THRESHOLD = int(os.getenv("PROFILING_N_PLUS_ONE_THRESHOLD", "3"))
+
     # CORS
     ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*")
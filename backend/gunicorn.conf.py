@@ -0,0 +1,29 @@
+"""
+Gunicorn settings.
+Run: gunicorn -c gunicorn.conf.py app:app
+
+gevent workers by default: a chat SSE stream is a greenlet waiting on
+Claude, not an OS thread, so one process can hold hundreds of open streams
+while still serving catalogue requests. Set GUNICORN_WORKER_CLASS=gthread
+to go back to thread-per-request workers.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))  # gevent only
+threads = int(os.getenv("GUNICORN_THREADS", "2"))  # gthread only
+timeout = 120
+
+
+def post_fork(server, worker):
+    """Make psycopg2 yield to other greenlets while waiting on Postgres."""
+    if worker_class != "gevent":
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning("psycogreen not installed; Postgres queries will block the gevent loop")
+        return
+    patch_psycopg()
@@ -1,6 +1,29 @@
 from models.product import Product
 from models.review import Review
 from models.category import Category
+from models.catalogue_version import CatalogueVersion
 from models.api_usage import ApiUsage
+from models.api_quota import ApiQuota
+from models.review_refresh_job import ReviewRefreshJob
+from models.sentiment_cache import SentimentCacheEntry
+from models.sync_checkpoint import SyncCheckpoint
+from models.product_review_stats import ProductReviewStats
+from models.sentiment_backfill_batch import SentimentBackfillBatch
+from models.product_freshness import ProductFreshness
+from models.stat_counter import StatCounter
 
-__all__ = ["Product", "Review", "Category", "ApiUsage"]
+__all__ = [
+    "Product",
+    "Review",
+    "Category",
+    "CatalogueVersion",
+    "ApiUsage",
+    "ApiQuota",
+    "ReviewRefreshJob",
+    "SentimentCacheEntry",
+    "SyncCheckpoint",
+    "ProductReviewStats",
+    "SentimentBackfillBatch",
+    "ProductFreshness",
+    "StatCounter",
+]
@@ -0,0 +1,19 @@
+from utils.database import db
+
+
+class ApiQuota(db.Model):
+    """Per-month call counter for a rate-limited external API"""
+
+    __tablename__ = "api_quota"
+
+    api_name = db.Column(db.String(50), primary_key=True)
+    period = db.Column(db.String(7), primary_key=True)  # YYYY-MM (UTC)
+    used = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        """Convert quota counter to dictionary"""
+        return {
+            "api_name": self.api_name,
+            "period": self.period,
+            "used": self.used,
+        }
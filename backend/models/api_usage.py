@@ -4,7 +4,7 @@ from utils.database import db
 
 
 class ApiUsage(db.Model):
-    """Track external API usage for rate limiting"""
+    """Append-only audit log of external API calls (quota is enforced by ApiQuota)"""
 
     __tablename__ = "api_usage"
 
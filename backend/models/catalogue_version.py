@@ -0,0 +1,13 @@
+from datetime import datetime
+from utils.database import db
+
+
+class CatalogueVersion(db.Model):
+    """Single-row stamp that changes whenever catalogue data changes"""
+
+    __tablename__ = "catalogue_version"
+
+    id = db.Column(db.Integer, primary_key=True)  # Always 1
+    # Random token rather than a counter, so a recreated table never reuses an old stamp
+    stamp = db.Column(db.String(32), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
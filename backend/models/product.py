@@ -1,5 +1,6 @@
 import uuid
 from datetime import datetime
+from models.product_review_stats import summarize_review_stats
 from utils.database import db
 
 
@@ -26,24 +27,34 @@ class Product(db.Model):
     # Relationships
     category_rel = db.relationship("Category", back_populates="products")
     reviews = db.relationship("Review", back_populates="product", lazy="dynamic", cascade="all, delete-orphan")
+    review_stats = db.relationship("ProductReviewStats", back_populates="product", cascade="all, delete-orphan")
 
-    def to_dict(self, include_reviews=False):
-        """Convert product to dictionary"""
-        data = {
-            "id": self.id,
-            "name": self.name,
-            "description": self.description,
-            "category": self.category,
-            "price": float(self.price) if self.price else 0.0,
-            "rating": round(self.rating, 1) if self.rating else 0.0,
-            "review_count": self.review_count,
-            "image_url": self.image_url,
-            "source_url": self.source_url,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+    def to_dict(self, include_reviews=False, fields=None):
+        """Convert product to dictionary (only `fields`, if given)"""
+        if fields is None:
+            data = {name: serialize(self) for name, serialize in SERIALIZED_FIELDS.items()}
+        else:
+            data = {name: SERIALIZED_FIELDS[name](self) for name in fields}
 
         if include_reviews:
-            data["reviews"] = [review.to_dict() for review in self.reviews.all()]
+            from models.review import Review
+            data["reviews"] = Review.dicts_for_product(self.id)
 
         return data
+
+
+# Public field name -> serializer; also the set of fields clients may select
+SERIALIZED_FIELDS = {
+    "id": lambda p: p.id,
+    "name": lambda p: p.name,
+    "description": lambda p: p.description,
+    "category": lambda p: p.category,
+    "price": lambda p: float(p.price) if p.price else 0.0,
+    "rating": lambda p: round(p.rating, 1) if p.rating else 0.0,
+    "review_count": lambda p: p.review_count,
+    "image_url": lambda p: p.image_url,
+    "source_url": lambda p: p.source_url,
+    "created_at": lambda p: p.created_at.isoformat() if p.created_at else None,
+    "updated_at": lambda p: p.updated_at.isoformat() if p.updated_at else None,
+    "review_stats": lambda p: summarize_review_stats(p.review_stats),
+}
@@ -0,0 +1,31 @@
+from utils.database import db
+
+
+class ProductFreshness(db.Model):
+    """Review refresh scheduling state for one product (services/review_freshness.py)"""
+
+    __tablename__ = "product_freshness"
+
+    product_id = db.Column(
+        db.String(36), db.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True,
+    )
+    # Exponentially decayed view count as of views_counted_at (half-life REVIEW_VIEW_HALF_LIFE_DAYS)
+    view_score = db.Column(db.Float, nullable=False, default=0.0)
+    views_counted_at = db.Column(db.DateTime, nullable=True)
+    # New reviews per day found by recent refreshes (moving average)
+    review_velocity = db.Column(db.Float, nullable=False, default=0.0)
+    # Views per day x (1 + review velocity); orders due refreshes
+    priority = db.Column(db.Float, nullable=False, default=0.0, index=True)
+    # reviews_fetched_at plus the product's TTL
+    next_refresh_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    def to_dict(self):
+        """Convert freshness state to dictionary"""
+        return {
+            "product_id": self.product_id,
+            "view_score": self.view_score,
+            "views_counted_at": self.views_counted_at.isoformat() if self.views_counted_at else None,
+            "review_velocity": self.review_velocity,
+            "priority": self.priority,
+            "next_refresh_at": self.next_refresh_at.isoformat() if self.next_refresh_at else None,
+        }
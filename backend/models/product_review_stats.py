@@ -0,0 +1,79 @@
+import json
+from collections import Counter
+from datetime import datetime
+from utils.database import db
+
+# Equal-width sentiment buckets over 0-1
+SENTIMENT_BUCKETS = 5
+
+# Recurring pros/cons shown per product
+TOP_PHRASES = 5
+
+
+class ProductReviewStats(db.Model):
+    """Review aggregates for one product and source, kept current as reviews are written"""
+
+    __tablename__ = "product_review_stats"
+
+    product_id = db.Column(db.String(36), db.ForeignKey("products.id"), primary_key=True)
+    source = db.Column(db.String(50), primary_key=True)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    sentiment_sum = db.Column(db.Float, nullable=False, default=0.0)
+    sentiment_histogram = db.Column(db.Text)  # JSON array of SENTIMENT_BUCKETS counts
+    star_rating_sum = db.Column(db.Float, nullable=False, default=0.0)
+    star_rating_count = db.Column(db.Integer, nullable=False, default=0)
+    pros_counts = db.Column(db.Text)  # JSON object: phrase -> occurrences
+    cons_counts = db.Column(db.Text)  # JSON object: phrase -> occurrences
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationship
+    product = db.relationship("Product", back_populates="review_stats")
+
+    def get_histogram(self):
+        """Parse the sentiment histogram from JSON text"""
+        if self.sentiment_histogram:
+            return json.loads(self.sentiment_histogram)
+        return [0] * SENTIMENT_BUCKETS
+
+    def get_pros_counts(self):
+        """Parse pro phrase counts from JSON text"""
+        return json.loads(self.pros_counts) if self.pros_counts else {}
+
+    def get_cons_counts(self):
+        """Parse con phrase counts from JSON text"""
+        return json.loads(self.cons_counts) if self.cons_counts else {}
+
+
+def summarize_review_stats(rows):
+    """Combine a product's per-source stats rows into the API summary."""
+    total = 0
+    sentiment_sum = 0.0
+    star_sum = 0.0
+    star_count = 0
+    histogram = [0] * SENTIMENT_BUCKETS
+    by_source = {}
+    pros = Counter()
+    cons = Counter()
+
+    for row in rows:
+        if not row.review_count:
+            continue
+        total += row.review_count
+        sentiment_sum += row.sentiment_sum
+        star_sum += row.star_rating_sum
+        star_count += row.star_rating_count
+        by_source[row.source] = row.review_count
+        for i, count in enumerate(row.get_histogram()):
+            histogram[i] += count
+        pros.update(row.get_pros_counts())
+        cons.update(row.get_cons_counts())
+
+    return {
+        "total": total,
+        "by_source": by_source,
+        "sentiment_histogram": histogram,
+        "average_sentiment": round(sentiment_sum / total, 2) if total else None,
+        "average_star_rating": round(star_sum / star_count, 2) if star_count else None,
+        "top_pros": [phrase for phrase, _ in pros.most_common(TOP_PHRASES)],
+        "top_cons": [phrase for phrase, _ in cons.most_common(TOP_PHRASES)],
+    }
@@ -8,6 +8,10 @@ class Review(db.Model):
     """Review model for storing product reviews"""
 
     __tablename__ = "reviews"
+    __table_args__ = (
+        # Refreshes upsert on this; rows from before fingerprinting have none
+        db.Index("uq_reviews_product_fingerprint", "product_id", "fingerprint", unique=True),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     product_id = db.Column(db.String(36), db.ForeignKey("products.id"), nullable=False, index=True)
@@ -17,7 +21,13 @@ class Review(db.Model):
     source_rating = db.Column(db.Float, nullable=True)  # Original 1-5 star rating from source
     pros = db.Column(db.Text)  # JSON array stored as text
     cons = db.Column(db.Text)  # JSON array stored as text
+    # sentiment_service.ANALYSIS_VERSION that produced sentiment/pros/cons; None for the fallback
+    sentiment_version = db.Column(db.String(16), nullable=True)
     scraped_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # review_service.review_fingerprint(): source, text hash and review date
+    fingerprint = db.Column(db.String(64), nullable=True)
+    # Set when a refresh no longer finds the review at its source; expired reviews are not shown or counted
+    expired_at = db.Column(db.DateTime, nullable=True)
 
     # Relationship
     product = db.relationship("Product", back_populates="reviews")
@@ -60,3 +70,60 @@ class Review(db.Model):
             "cons": self.get_cons(),
             "scraped_at": self.scraped_at.isoformat() if self.scraped_at else None,
         }
+
+    @classmethod
+    def dicts_for_product(cls, product_id):
+        """
+        Serialize all of a product's active (not expired) reviews in one query.
+
+        Reads plain result tuples (no ORM objects or identity map) and has the
+        database splice pros and cons into a single JSON document per row,
+        so each row costs one json.loads instead of two.
+        """
+        pros_cons = (
+            db.literal("[")
+            + db.func.coalesce(cls.pros, "[]")
+            + ","
+            + db.func.coalesce(cls.cons, "[]")
+            + "]"
+        )
+        rows = db.session.execute(
+            db.select(
+                cls.id, cls.product_id, cls.source, cls.text,
+                cls.sentiment_score, cls.scraped_at, pros_cons,
+            ).where(cls.product_id == product_id, cls.expired_at.is_(None))
+        ).all()
+
+        loads = json.loads
+        reviews = []
+        for review_id, prod_id, source, text, sentiment, scraped_at, combined in rows:
+            try:
+                pros_list, cons_list = loads(combined)
+            except (json.JSONDecodeError, ValueError):
+                # Malformed stored JSON: re-read this row and decode each side separately
+                pros, cons = db.session.execute(
+                    db.select(cls.pros, cls.cons).where(cls.id == review_id)
+                ).one()
+                pros_list = _loads_list(pros)
+                cons_list = _loads_list(cons)
+            reviews.append({
+                "id": review_id,
+                "product_id": prod_id,
+                "source": source,
+                "text": text,
+                "sentiment_score": round(sentiment, 2) if sentiment else 0.0,
+                "pros": pros_list,
+                "cons": cons_list,
+                "scraped_at": scraped_at.isoformat() if scraped_at else None,
+            })
+        return reviews
+
+
+def _loads_list(value):
+    """Parse a JSON list stored as text, tolerating bad data"""
+    if not value:
+        return []
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return []
@@ -0,0 +1,37 @@
+import uuid
+from datetime import datetime
+from utils.database import db
+
+
+class ReviewRefreshJob(db.Model):
+    """Pending or running review refresh for a product (one row per product)"""
+
+    __tablename__ = "review_refresh_jobs"
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # Unique so concurrent enqueues for the same product collapse into one job
+    product_id = db.Column(
+        db.String(36), db.ForeignKey("products.id", ondelete="CASCADE"),
+        unique=True, nullable=False, index=True,
+    )
+    status = db.Column(db.String(20), nullable=False, default="pending", index=True)  # pending, running
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    enqueued_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    run_after = db.Column(db.DateTime, nullable=True)  # Retry backoff; None means run now
+    priority = db.Column(db.Float, nullable=False, default=0.0)  # Higher runs first (review_freshness)
+    started_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        """Convert job to dictionary"""
+        return {
+            "id": self.id,
+            "product_id": self.product_id,
+            "status": self.status,
+            "attempts": self.attempts,
+            "priority": self.priority,
+            "last_error": self.last_error,
+            "enqueued_at": self.enqueued_at.isoformat() if self.enqueued_at else None,
+            "run_after": self.run_after.isoformat() if self.run_after else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+        }
@@ -0,0 +1,41 @@
+import json
+from datetime import datetime
+from utils.database import db
+
+
+class SentimentBackfillBatch(db.Model):
+    """A Message Batches API job submitted by the sentiment backfill"""
+
+    __tablename__ = "sentiment_backfill_batches"
+
+    id = db.Column(db.String(64), primary_key=True)  # Anthropic message batch id
+    analysis_version = db.Column(db.String(16), nullable=False)
+    # in_progress, ended (results not yet written), applied, superseded
+    status = db.Column(db.String(20), nullable=False, default="in_progress", index=True)
+    request_map = db.Column(db.Text, nullable=False)  # JSON object: custom_id -> review ids
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+    succeeded = db.Column(db.Integer, nullable=True)
+    errored = db.Column(db.Integer, nullable=True)  # errored, canceled and expired requests
+    reviews_updated = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    ended_at = db.Column(db.DateTime, nullable=True)
+    applied_at = db.Column(db.DateTime, nullable=True)
+
+    def get_request_map(self):
+        """Parse the custom_id -> review ids mapping from JSON text"""
+        return json.loads(self.request_map) if self.request_map else {}
+
+    def to_dict(self):
+        """Convert batch to dictionary"""
+        return {
+            "id": self.id,
+            "analysis_version": self.analysis_version,
+            "status": self.status,
+            "request_count": self.request_count,
+            "succeeded": self.succeeded,
+            "errored": self.errored,
+            "reviews_updated": self.reviews_updated,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "ended_at": self.ended_at.isoformat() if self.ended_at else None,
+            "applied_at": self.applied_at.isoformat() if self.applied_at else None,
+        }
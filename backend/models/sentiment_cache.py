@@ -0,0 +1,16 @@
+from datetime import datetime
+from utils.database import db
+
+
+class SentimentCacheEntry(db.Model):
+    """Cached Claude sentiment analysis, keyed by a hash of the review input"""
+
+    __tablename__ = "sentiment_cache"
+
+    # sha256 of (analysis version, star rating, review text)
+    key = db.Column(db.String(64), primary_key=True)
+    sentiment_score = db.Column(db.Float, nullable=False)
+    pros = db.Column(db.Text)  # JSON array stored as text
+    cons = db.Column(db.Text)  # JSON array stored as text
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
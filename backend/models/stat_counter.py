@@ -0,0 +1,21 @@
+from datetime import datetime
+from utils.database import db
+
+
+class StatCounter(db.Model):
+    """Cumulative counter shared by every web and worker process"""
+
+    __tablename__ = "stat_counters"
+
+    # Dotted name, e.g. "sentiment_cache.hits"
+    name = db.Column(db.String(200), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        """Convert counter to dictionary"""
+        return {
+            "name": self.name,
+            "value": self.value,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
@@ -0,0 +1,13 @@
+from datetime import datetime
+from utils.database import db
+
+
+class SyncCheckpoint(db.Model):
+    """Search query already synced in the current sync.py run (for resuming)"""
+
+    __tablename__ = "sync_checkpoints"
+
+    search_query = db.Column(db.String(200), primary_key=True)
+    category = db.Column(db.String(100), nullable=False)
+    products_found = db.Column(db.Integer, default=0)
+    completed_at = db.Column(db.DateTime, default=datetime.utcnow)
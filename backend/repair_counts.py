@@ -0,0 +1,59 @@
+"""
+Verify (and optionally repair) Category.product_count.
+Run: python repair_counts.py [--repair] [--review-stats]
+
+Counts are kept current by database triggers; this reconciles any drift
+(e.g. from writes on a database without the triggers) in one GROUP BY.
+--review-stats also rebuilds product_review_stats from the reviews table.
+"""
+import argparse
+from app import create_app
+from utils.category_counts import reconcile_category_counts
+from utils.database import db
+
+
+def repair_counts(repair=False):
+    """Report categories whose stored product_count drifted; fix them with repair=True."""
+    app = create_app()
+
+    with app.app_context():
+        with db.engine.begin() as conn:
+            drift = reconcile_category_counts(conn, repair=repair)
+
+        if not drift:
+            print("All category product counts are correct.")
+            return drift
+
+        for slug, (stored, actual) in sorted(drift.items()):
+            print(f"  {slug}: stored {stored}, actual {actual}")
+        if repair:
+            from services.response_cache import bump_catalogue_version
+            bump_catalogue_version()
+            db.session.commit()
+            print(f"Repaired {len(drift)} categories.")
+        else:
+            print(f"{len(drift)} categories drifted. Re-run with --repair to fix.")
+        return drift
+
+
+def rebuild_stats():
+    """Recompute product_review_stats from all reviews."""
+    app = create_app()
+
+    with app.app_context():
+        from services.response_cache import bump_catalogue_version
+        from services.review_stats import rebuild_review_stats
+        written = rebuild_review_stats()
+        bump_catalogue_version()
+        db.session.commit()
+        print(f"Rebuilt review stats ({written} product/source rows).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify category product counts")
+    parser.add_argument("--repair", action="store_true", help="Fix drifted counts")
+    parser.add_argument("--review-stats", action="store_true", help="Rebuild per-product review stats")
+    args = parser.parse_args()
+    repair_counts(repair=args.repair)
+    if args.review_stats:
+        rebuild_stats()
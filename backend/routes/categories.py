@@ -1,13 +1,14 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from models.category import Category
-from models.product import Product
 from schemas.product_schema import CategoryResponse
-import math
+from services.product_listing import ListingArgsError, ProductPage, parse_listing_args
+from services.response_cache import cached_response
 
 categories_bp = Blueprint("categories", __name__, url_prefix="/api/categories")
 
 
 @categories_bp.route("", methods=["GET"])
+@cached_response
 def get_categories():
     """Get all categories"""
     try:
@@ -21,23 +22,37 @@ def get_categories():
 
 
 @categories_bp.route("/<slug>/products", methods=["GET"])
+@cached_response
 def get_category_products(slug):
-    """Get products in a specific category"""
+    """
+    Get products in a specific category.
+
+    Supports the same pagination, sort and field options as /api/products.
+    Pages larger than API_STREAM_THRESHOLD are streamed as they are read.
+    """
     try:
         # Check if category exists
         category = Category.query.filter_by(slug=slug).first()
         if not category:
             return jsonify({"error": "Category not found"}), 404
 
-        # Get products in this category
-        products = Product.query.filter_by(category=slug).order_by(Product.rating.desc()).all()
-        products_data = [product.to_dict() for product in products]
+        try:
+            params = parse_listing_args(
+                request.args,
+                max_limit=current_app.config.get("API_STREAM_MAX_PAGE_SIZE", 1000),
+            )
+            page = ProductPage(params, category=slug)
+        except ListingArgsError as e:
+            return jsonify({"error": str(e)}), 400
+
+        extra = {"category": category.to_dict()}
+        if params["limit"] > current_app.config.get("API_STREAM_THRESHOLD", 200):
+            return Response(
+                stream_with_context(page.iter_json(extra)),
+                mimetype="application/json",
+            )
 
-        return jsonify({
-            "category": category.to_dict(),
-            "products": products_data,
-            "total": len(products_data),
-        }), 200
+        return jsonify(page.to_dict(extra)), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,25 +1,117 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify
+from utils import metrics
 
 health_bp = Blueprint("health", __name__, url_prefix="/api")
 
 
+def _cache_hit_ratios():
+    from services import response_cache, sentiment_cache
+    from services.chat_service import get_prompt_cache_stats
+    return {
+        (("cache", "responses"),): response_cache.get_cache_stats()["hit_ratio"],
+        (("cache", "sentiment"),): sentiment_cache.get_cache_stats(include_entries=False)["hit_ratio"],
+        (("cache", "chat_prompts"),): get_prompt_cache_stats()["hit_ratio"],
+    }
+
+
+def _refresh_queue_depth():
+    from services.refresh_queue import queue_depth
+    return {(): queue_depth()}
+
+
+def _db_pool_connections():
+    from utils.database import db
+    from utils.db_pool import get_pool_stats
+    stats = get_pool_stats(db.engine)
+    return {
+        (("state", key),): stats[key]
+        for key in ("checked_out", "checked_in", "overflow")
+        if key in stats
+    }
+
+
+def _active_chat_streams():
+    from services.chat_service import get_stream_stats
+    return {(): get_stream_stats()["active"]}
+
+
+metrics.register_gauge("cache_hit_ratio", "Process-local cache hit ratio", _cache_hit_ratios)
+metrics.register_gauge("review_refresh_queue_depth", "Pending and running review refresh jobs", _refresh_queue_depth)
+metrics.register_gauge("db_pool_connections", "Database pool connections by state", _db_pool_connections)
+metrics.register_gauge("chat_active_streams", "Open chat streams in this process", _active_chat_streams)
+
+
 @health_bp.route("/health", methods=["GET"])
 def health_check():
     return jsonify({"status": "healthy", "message": "revu-ai backend is running"})
 
 
+@health_bp.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @health_bp.route("/hello", methods=["GET"])
 def hello():
     return jsonify({"message": "Hello from revu-ai!"})
 
 
+@health_bp.route("/db-pool", methods=["GET"])
+def db_pool():
+    """Get database connection pool state and checkout wait counters (this worker process)"""
+    try:
+        from utils.database import db
+        from utils.db_pool import get_pool_stats
+        return jsonify(get_pool_stats(db.engine)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @health_bp.route("/api-usage", methods=["GET"])
 def api_usage():
     """Get SerpApi usage statistics for the current month"""
     try:
-        from services.serpapi_client import SerpApiClient
-        client = SerpApiClient()
-        stats = client.get_usage_stats()
+        from services.review_freshness import refresh_budget
+        from services.serpapi_client import get_serpapi_client
+        stats = get_serpapi_client().get_usage_stats()
+        # Calls the review worker may make now under the even monthly pace
+        stats["paced_remaining"] = max(refresh_budget(), 0)
         return jsonify(stats), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@health_bp.route("/cache-stats", methods=["GET"])
+def cache_stats():
+    """Get hit/miss statistics for the sentiment, response and chat prompt caches"""
+    try:
+        from services import response_cache, sentiment_cache
+        from services.chat_service import get_prompt_cache_stats
+        return jsonify({
+            "sentiment": sentiment_cache.get_cache_stats(),
+            "responses": response_cache.get_cache_stats(),
+            "chat_prompts": get_prompt_cache_stats(),
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@health_bp.route("/chat-stats", methods=["GET"])
+def chat_stats():
+    """Get open/finished chat stream counts (this worker process)"""
+    try:
+        from services.chat_service import get_stream_stats
+        return jsonify(get_stream_stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@health_bp.route("/http-stats", methods=["GET"])
+def http_stats():
+    """Get connection pool reuse statistics for outbound API calls (this process, and all processes combined)"""
+    try:
+        from services.http_client import get_pool_stats
+        return jsonify(get_pool_stats()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,82 +1,39 @@
 import json
+import time
 
-from flask import Blueprint, jsonify, request, Response, stream_with_context
+from flask import Blueprint, jsonify, request, Response
 from models.product import Product
 from models.category import Category
+from services.product_listing import ListingArgsError, ProductPage, parse_listing_args
+from services.response_cache import cached_response
 from schemas.product_schema import ProductResponse, ProductListResponse, ProductDetailResponse
+from utils import metrics
 from utils.database import db
-import math
 
 products_bp = Blueprint("products", __name__, url_prefix="/api/products")
 
+CHAT_METRIC_LABELS = (("api", "anthropic"), ("operation", "chat"))
+
 
 @products_bp.route("", methods=["GET"])
+@cached_response
 def get_products():
-    """Get paginated list of products with optional filtering and sorting"""
+    """
+    Get paginated list of products with optional filtering, sorting and
+    field selection (`fields=id,name,price`).
+
+    Pass `cursor` (empty for the first page) to use keyset pagination; the
+    response then carries `next_cursor` and only counts rows when asked to
+    via `total=exact|approx`.
+    """
     try:
-        # Get and validate query parameters
         try:
-            page = int(request.args.get("page", 1))
-            limit = min(int(request.args.get("limit", 20)), 100)  # Max 100 per page
-        except ValueError:
-            return jsonify({"error": "Invalid page or limit parameter"}), 400
-
-        limit = max(limit, 1)  # Ensure limit is at least 1
-        category = request.args.get("category")
-        sort = request.args.get("sort", "rating_desc")
-        search = request.args.get("q", "").strip()
-
-        # Build query
-        query = Product.query
-
-        # Filter by category
-        if category:
-            query = query.filter(Product.category == category)
-
-        # Filter by search query
-        if search:
-            search_pattern = f"%{search}%"
-            query = query.filter(
-                db.or_(
-                    Product.name.like(search_pattern),
-                    Product.description.like(search_pattern),
-                    Product.category.like(search_pattern),
-                )
-            )
-
-        # Apply sorting
-        if sort == "rating_desc":
-            query = query.order_by(Product.rating.desc())
-        elif sort == "rating_asc":
-            query = query.order_by(Product.rating.asc())
-        elif sort == "price_asc":
-            query = query.order_by(Product.price.asc())
-        elif sort == "price_desc":
-            query = query.order_by(Product.price.desc())
-        elif sort == "newest":
-            query = query.order_by(Product.created_at.desc())
-        else:
-            query = query.order_by(Product.rating.desc())  # Default
-
-        # Get total count
-        total = query.count()
+            params = parse_listing_args(request.args)
+            page = ProductPage(params)
+        except ListingArgsError as e:
+            return jsonify({"error": str(e)}), 400
 
-        # Paginate
-        products = query.paginate(page=page, per_page=limit, error_out=False)
-
-        # Convert to dict
-        products_data = [product.to_dict() for product in products.items]
-
-        # Calculate total pages
-        pages = math.ceil(total / limit) if limit > 0 else 0
-
-        return jsonify({
-            "products": products_data,
-            "total": total,
-            "page": page,
-            "limit": limit,
-            "pages": pages,
-        }), 200
+        return jsonify(page.to_dict()), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -84,24 +41,33 @@ def get_products():
 
 @products_bp.route("/<product_id>", methods=["GET"])
 def get_product(product_id):
-    """Get product detail with reviews (fetches from SerpApi on-demand)"""
+    """Get product detail with cached reviews (stale reviews are refreshed in the background)"""
     try:
         product = Product.query.get(product_id)
 
         if not product:
             return jsonify({"error": "Product not found"}), 404
 
-        # Fetch fresh reviews on-demand for products with Amazon ASINs
+        # Views decide how often the product's reviews are refreshed
+        try:
+            from services.review_freshness import record_view
+            record_view(product.id)
+        except Exception as e:
+            print(f"Product view recording warning for {product_id}: {e}")
+
+        # Queue a background refresh for products with Amazon ASINs
+        refreshing = False
         if product.amazon_asin:
             try:
-                from services.review_service import fetch_reviews_for_product
-                fetch_reviews_for_product(product)
+                from services.refresh_queue import request_review_refresh
+                refreshing = request_review_refresh(product)
             except Exception as e:
                 # Log but don't fail — serve cached data
-                print(f"Review fetch warning for {product_id}: {e}")
+                print(f"Review refresh enqueue warning for {product_id}: {e}")
 
         # Get product with reviews
         product_data = product.to_dict(include_reviews=True)
+        product_data["refreshing"] = refreshing
 
         return jsonify(product_data), 200
 
@@ -137,32 +103,65 @@ def chat_with_product(product_id):
 
     raw_history = body.get("history", [])
 
-    from services.chat_service import build_system_prompt, cap_history, validate_history
+    from services.chat_service import (
+        acquire_stream_slot,
+        cap_history,
+        get_anthropic_client,
+        get_chat_context,
+        record_usage,
+        release_stream_slot,
+        system_blocks,
+        validate_history,
+    )
 
     history, validation_error = validate_history(raw_history)
     if validation_error:
         return jsonify({"error": validation_error}), 400
 
-    product_data = product.to_dict(include_reviews=True)
-    system_prompt = build_system_prompt(product_data)
+    context = get_chat_context(product)
+    system_prompt = context.system_prompt
+    question = context.user_message(user_message, current_app.config.get("CHAT_RELEVANT_TOKEN_BUDGET", 1000))
     capped_history = cap_history(history)
-    messages = capped_history + [{"role": "user", "content": user_message}]
+    messages = capped_history + [{"role": "user", "content": question}]
+
+    if not acquire_stream_slot():
+        return jsonify({"error": "Too many active chats. Please try again shortly."}), 503, {"Retry-After": "5"}
+
+    # The stream doesn't touch the database: return the connection to the pool now
+    # rather than holding it for the whole conversation turn
+    db.session.remove()
+
+    # Anything that stops the stream early (including a client disconnect) is a cancellation
+    state = {"outcome": "cancelled"}
 
     def generate():
+        start = time.perf_counter()
+        first_chunk = True
         try:
-            import anthropic
-            client = anthropic.Anthropic(api_key=api_key)
+            client = get_anthropic_client(api_key)
             with client.messages.stream(
                 model="claude-haiku-4-5-20251001",
                 max_tokens=1024,
-                system=system_prompt,
+                system=system_blocks(system_prompt),
                 messages=messages,
             ) as stream:
                 for text in stream.text_stream:
+                    if first_chunk:
+                        metrics.observe("chat_time_to_first_token_seconds", time.perf_counter() - start)
+                        first_chunk = False
                     yield f"data: {json.dumps({'text': text})}\n\n"
+                record_usage(stream.get_final_message().usage)
+            state["outcome"] = "completed"
+            metrics.observe(
+                "external_api_duration_seconds", time.perf_counter() - start, CHAT_METRIC_LABELS
+            )
             yield "data: [DONE]\n\n"
 
         except Exception as e:
+            # (A client disconnect raises GeneratorExit at a yield instead, and leaving
+            # the `with` block closes the upstream Claude stream.)
+            state["outcome"] = "failed"
+            metrics.inc("external_api_errors_total", CHAT_METRIC_LABELS)
             error_msg = str(e)
             if "authentication" in error_msg.lower() or "api key" in error_msg.lower():
                 error_msg = "Invalid API key. Please check ANTHROPIC_API_KEY."
@@ -175,11 +174,14 @@ def chat_with_product(product_id):
             yield f"data: {json.dumps({'error': error_msg})}\n\n"
             yield "data: [DONE]\n\n"
 
-    return Response(
-        stream_with_context(generate()),
+    response = Response(
+        generate(),
         content_type="text/event-stream",
         headers={
             "X-Accel-Buffering": "no",
             "Cache-Control": "no-cache",
         },
     )
+    # Runs after the server closes the generator, whether or not it was ever started
+    response.call_on_close(lambda: release_stream_slot(state["outcome"]))
+    return response
@@ -1,15 +1,19 @@
 from schemas.product_schema import (
     ProductResponse,
     ProductListResponse,
+    ProductCursorPageResponse,
     ProductDetailResponse,
     ReviewResponse,
+    ReviewStatsResponse,
     CategoryResponse,
 )
 
 __all__ = [
     "ProductResponse",
     "ProductListResponse",
+    "ProductCursorPageResponse",
     "ProductDetailResponse",
     "ReviewResponse",
+    "ReviewStatsResponse",
     "CategoryResponse",
 ]
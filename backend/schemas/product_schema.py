@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 
 
@@ -18,6 +18,18 @@ class ReviewResponse(BaseModel):
         from_attributes = True
 
 
+class ReviewStatsResponse(BaseModel):
+    """Aggregated review stats for a product"""
+
+    total: int = 0
+    by_source: Dict[str, int] = {}
+    sentiment_histogram: List[int] = []
+    average_sentiment: Optional[float] = None
+    average_star_rating: Optional[float] = None
+    top_pros: List[str] = []
+    top_cons: List[str] = []
+
+
 class ProductResponse(BaseModel):
     """Product response schema for list views"""
 
@@ -32,6 +44,7 @@ class ProductResponse(BaseModel):
     source_url: Optional[str] = None
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
+    review_stats: Optional[ReviewStatsResponse] = None
 
     class Config:
         from_attributes = True
@@ -41,6 +54,7 @@ class ProductDetailResponse(ProductResponse):
     """Product detail response with reviews"""
 
     reviews: List[ReviewResponse] = []
+    refreshing: bool = False
 
     class Config:
         from_attributes = True
@@ -56,6 +70,17 @@ class ProductListResponse(BaseModel):
     pages: int
 
 
+class ProductCursorPageResponse(BaseModel):
+    """Keyset-paginated product list response (cursor mode)"""
+
+    products: List[ProductResponse]
+    limit: int
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    total: Optional[int] = None
+    total_approximate: Optional[bool] = None
+
+
 class CategoryResponse(BaseModel):
     """Category response schema"""
 
@@ -0,0 +1,311 @@
+"""
+Synthetic large catalogue for benchmarks.
+Run from backend/: python -m seed_data.bulk_catalogue --products 100000 [--reviews-per-product 10] [--seed 42]
+
+Generates products, reviews and review stats with batched executemany
+inserts (no ORM objects, no per-row flush), deterministically from --seed.
+Rows are generated in worker processes while the main process inserts.
+Names, descriptions and review text are built from the mock_products
+templates plus varied wording, so full-text search and review selection have
+realistic vocabulary. Review counts per product are skewed: most products
+have a handful, a few have hundreds.
+
+Category product counts and the search index are maintained by the
+database triggers, as for any other writer.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from models.category import Category
+from models.product import Product
+from models.product_review_stats import SENTIMENT_BUCKETS, ProductReviewStats
+from models.review import Review
+from seed_data.mock_products import (
+    CATEGORIES,
+    MIXED_REVIEWS,
+    NEGATIVE_REVIEWS,
+    POSITIVE_REVIEWS,
+    PRODUCTS,
+    SOURCES,
+    calculate_rating,
+)
+from utils.database import db
+
+# Products generated (and committed) per round-trip batch
+DEFAULT_BATCH_PRODUCTS = 2000
+
+# No product gets more than this many times the average review count
+MAX_REVIEW_MULTIPLE = 50
+
+BRANDS = [
+    "Acme", "Northwind", "Zenith", "Apex", "Lumina", "Vertex", "Nimbus", "Orion",
+    "Summit", "Keystone", "Evergreen", "Bolt", "Halo", "Pioneer", "Quartz", "Atlas",
+]
+EDITIONS = ["", "Lite", "Plus", "Pro", "Max", "Mini", "2", "3", "X", "SE"]
+COLORS = ["Black", "White", "Graphite", "Silver", "Navy", "Sage", "Coral", "Sand"]
+
+# Extra sentences mixed into review text so reviews aren't exact template copies
+DETAILS = {
+    "positive": [
+        "Battery life is excellent and it charges quickly.",
+        "Setup took less than five minutes.",
+        "The build feels solid and premium.",
+        "Shipping was fast and the packaging was great.",
+        "Customer support answered within a day.",
+        "It is lighter than I expected, easy to carry around.",
+        "I bought a second one as a gift.",
+    ],
+    "mixed": [
+        "The instructions could be clearer.",
+        "It is a little louder than I would like.",
+        "Color is slightly different from the photos.",
+        "Works fine but the app is clunky.",
+        "Good value, though the cable is short.",
+    ],
+    "negative": [
+        "The battery died within a month.",
+        "Returned it after it overheated twice.",
+        "Support never replied to my emails.",
+        "It arrived scratched and missing a part.",
+        "Stopped charging after a few weeks of light use.",
+    ],
+}
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _review_count(rng, average):
+    if average <= 0:
+        return 0
+    return min(int(rng.expovariate(1.0 / average)), average * MAX_REVIEW_MULTIPLE)
+
+
+def _prepare(templates, tone):
+    """Review templates with pros/cons serialized once, not per generated review."""
+    return [
+        (
+            template["text"], template["sentiment"], tone,
+            template.get("pros") or [], template.get("cons") or [],
+            json.dumps(template["pros"]) if template.get("pros") else None,
+            json.dumps(template["cons"]) if template.get("cons") else None,
+        )
+        for template in templates
+    ]
+
+
+PRODUCT_TEMPLATES = [(slug, template) for slug, items in PRODUCTS.items() for template in items]
+
+# Fixed reference time so generated timestamps are reproducible
+GENERATED_AT = datetime(2026, 1, 1)
+
+POSITIVE = _prepare(POSITIVE_REVIEWS, "positive")
+MIXED = _prepare(MIXED_REVIEWS, "mixed")
+NEGATIVE = _prepare(NEGATIVE_REVIEWS, "negative")
+
+
+def _make_reviews(rng, product_id, count, now, stats):
+    """
+    Review rows for one product; folds them into `stats`, keyed by (product_id, source).
+
+    Returns:
+        (template dicts for calculate_rating, review rows)
+    """
+    sentiments = []
+    rows = []
+    for _ in range(count):
+        roll = rng.random()
+        pool = POSITIVE if roll < 0.6 else MIXED if roll < 0.9 else NEGATIVE
+        text, base_sentiment, tone, pros, cons, pros_json, cons_json = rng.choice(pool)
+        extra = rng.sample(DETAILS[tone], rng.randint(0, 3))
+        sentiment = round(max(0.0, min(1.0, base_sentiment + rng.uniform(-0.05, 0.05))), 3)
+        star_rating = float(max(1, min(5, round(sentiment * 5))))
+        source = rng.choice(SOURCES)
+        rows.append({
+            "id": _uuid(rng),
+            "product_id": product_id,
+            "source": source,
+            "text": " ".join([text] + extra) if extra else text,
+            "sentiment_score": sentiment,
+            "source_rating": star_rating,
+            "pros": pros_json,
+            "cons": cons_json,
+            "scraped_at": now - timedelta(days=rng.randint(1, 60)),
+        })
+        sentiments.append({"sentiment": base_sentiment})
+
+        entry = stats.get((product_id, source))
+        if entry is None:
+            entry = stats[(product_id, source)] = [0, 0.0, [0] * SENTIMENT_BUCKETS, 0.0, Counter(), Counter()]
+        entry[0] += 1
+        entry[1] += sentiment
+        entry[2][min(int(sentiment * SENTIMENT_BUCKETS), SENTIMENT_BUCKETS - 1)] += 1
+        entry[3] += star_rating
+        entry[4].update(pros)
+        entry[5].update(cons)
+    return sentiments, rows
+
+
+def _stats_rows(stats, now):
+    """product_review_stats rows from the accumulated (product_id, source) totals."""
+    return [
+        {
+            "product_id": product_id,
+            "source": source,
+            "review_count": count,
+            "sentiment_sum": sentiment_sum,
+            "sentiment_histogram": json.dumps(histogram),
+            "star_rating_sum": star_sum,
+            "star_rating_count": count,
+            "pros_counts": json.dumps(dict(pros)),
+            "cons_counts": json.dumps(dict(cons)),
+            "updated_at": now,
+        }
+        for (product_id, source), (count, sentiment_sum, histogram, star_sum, pros, cons) in stats.items()
+    ]
+
+
+def _generate_batch(seed, first, count, reviews_per_product):
+    """
+    Rows for products first..first+count-1. Seeded per batch so batches can be
+    generated in any order (or process) and still give the same catalogue.
+
+    Returns:
+        (product rows, review rows, product_review_stats rows)
+    """
+    rng = random.Random(f"{seed}:{first}")
+    now = GENERATED_AT
+    product_rows = []
+    review_rows = []
+    stats = {}
+    for n in range(first, first + count):
+        slug, template = rng.choice(PRODUCT_TEMPLATES)
+        brand = rng.choice(BRANDS)
+        edition = rng.choice(EDITIONS)
+        name = f"{brand} {template['name']} {edition} {rng.choice(COLORS)} #{n}".replace("  ", " ")
+        product_id = _uuid(rng)
+        sentiments, reviews = _make_reviews(rng, product_id, _review_count(rng, reviews_per_product), now, stats)
+        created_at = now - timedelta(days=rng.randint(1, 720), seconds=rng.randint(0, 86399))
+        product_rows.append({
+            "id": product_id,
+            "name": name,
+            "description": f"{template['description']}. By {brand}, in {rng.choice(COLORS).lower()}.",
+            "category": slug,
+            "price": round(template["price"] * rng.uniform(0.5, 1.8), 2),
+            "rating": calculate_rating(sentiments),
+            "review_count": len(reviews),
+            "image_url": f"https://placehold.co/400x400/png?text=P{n}",
+            "source_url": f"https://example.com/product/{slug}/{n}",
+            "created_at": created_at,
+            "updated_at": created_at,
+        })
+        review_rows.extend(reviews)
+    return product_rows, review_rows, _stats_rows(stats, now)
+
+
+def _generate_batch_args(args):
+    return _generate_batch(*args)
+
+
+def generate_catalogue(products, reviews_per_product=10, seed=42, batch_products=DEFAULT_BATCH_PRODUCTS,
+                       workers=None, clean=True, progress=None):
+    """
+    Bulk-generate a synthetic catalogue. Needs an app context.
+
+    Row generation runs in a pool of `workers` processes while this process
+    inserts, so the database is the bottleneck rather than Python.
+
+    Args:
+        products: Number of products to create.
+        reviews_per_product: Average reviews per product (skewed distribution).
+        seed: Seed for every random choice; the same seed and batch size
+            always give the same catalogue.
+        workers: Generator processes (default: CPU count; 1 generates inline).
+        clean: Drop and recreate all tables first.
+        progress: Optional callable(products_done, reviews_done).
+
+    Returns:
+        Dict with product and review counts and elapsed seconds.
+    """
+    start = time.perf_counter()
+
+    if clean:
+        db.drop_all()
+        db.create_all()
+        rng = random.Random(seed)
+        with db.engine.begin() as conn:
+            conn.execute(Category.__table__.insert(), [
+                {"id": _uuid(rng), "name": c["name"], "slug": c["slug"], "product_count": 0}
+                for c in CATEGORIES
+            ])
+
+    jobs = [
+        (seed, first, min(batch_products, products - first), reviews_per_product)
+        for first in range(0, products, batch_products)
+    ]
+    workers = workers or os.cpu_count() or 1
+    pool = multiprocessing.get_context("spawn").Pool(workers) if workers > 1 and len(jobs) > 1 else None
+    batches = pool.imap(_generate_batch_args, jobs) if pool else map(_generate_batch_args, jobs)
+
+    total_products = 0
+    total_reviews = 0
+    try:
+        for product_rows, review_rows, stats_rows in batches:
+            with db.engine.begin() as conn:
+                conn.execute(Product.__table__.insert(), product_rows)
+                if review_rows:
+                    conn.execute(Review.__table__.insert(), review_rows)
+                    conn.execute(ProductReviewStats.__table__.insert(), stats_rows)
+            total_products += len(product_rows)
+            total_reviews += len(review_rows)
+            if progress:
+                progress(total_products, total_reviews)
+    finally:
+        if pool:
+            pool.terminate()
+
+    # Fresh planner statistics, as a long-lived database would have
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    return {
+        "products": total_products,
+        "reviews": total_reviews,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a large synthetic catalogue")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--reviews-per-product", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH_PRODUCTS, help="Products per insert batch")
+    parser.add_argument("--workers", type=int, default=None, help="Generator processes (default: CPU count)")
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        print(f"Generating {args.products} products into {db.engine.url.render_as_string(hide_password=True)}...")
+
+        def progress(products, reviews):
+            print(f"  {products} products, {reviews} reviews")
+
+        result = generate_catalogue(
+            args.products, args.reviews_per_product, args.seed, args.batch, args.workers, progress=progress,
+        )
+        rate = result["reviews"] / result["seconds"] if result["seconds"] else 0
+        print(f"Done: {result['products']} products, {result['reviews']} reviews "
+              f"in {result['seconds']}s ({rate:,.0f} reviews/s)")
+
+
+if __name__ == "__main__":
+    main()
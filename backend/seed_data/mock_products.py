@@ -9,6 +9,7 @@ from app import create_app
 from models.category import Category
 from models.product import Product
 from models.review import Review
+from services.review_stats import add_reviews
 from utils.database import db
 
 
@@ -183,7 +184,6 @@ def create_mock_data():
 
         # Create categories
         print("Creating categories...")
-        category_objects = {}
         for cat_data in CATEGORIES:
             category = Category(
                 name=cat_data["name"],
@@ -191,7 +191,6 @@ def create_mock_data():
                 product_count=0
             )
             db.session.add(category)
-            category_objects[cat_data["slug"]] = category
 
         db.session.commit()
         print(f"Created {len(CATEGORIES)} categories")
@@ -237,6 +236,7 @@ def create_mock_data():
                 db.session.flush()  # Get product ID
 
                 # Create reviews
+                reviews = []
                 for review_template in review_templates:
                     review = Review(
                         product_id=product.id,
@@ -248,9 +248,10 @@ def create_mock_data():
                     review.set_pros(review_template.get("pros", []))
                     review.set_cons(review_template.get("cons", []))
                     db.session.add(review)
+                    reviews.append(review)
+                add_reviews(product.id, reviews)
 
-                # Update category product count
-                category_objects[category_slug].product_count += 1
+                # Category product_count is maintained by database triggers
                 total_products += 1
 
         db.session.commit()
@@ -1,6 +1,6 @@
 """Best Buy Products API client"""
-import requests
 from flask import current_app
+from services import http_client
 
 BESTBUY_BASE_URL = "https://api.bestbuy.com/v1"
 
@@ -44,7 +44,7 @@ class BestBuyClient:
         if params:
             default_params.update(params)
 
-        response = requests.get(url, params=default_params, timeout=15)
+        response = http_client.get(url, params=default_params)
         response.raise_for_status()
         return response.json()
 
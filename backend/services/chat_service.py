@@ -1,19 +1,216 @@
-"""Service for building AI chat context and managing conversation limits."""
+"""Service for building AI chat context and managing conversation limits.
+
+The system prompt for a product only changes when its data or reviews do,
+so it is memoized per (product id, updated_at) in an
+in-process LRU and sent as a single block marked as an Anthropic prompt
+cache breakpoint. Follow-up turns in a conversation then reuse the cached
+prefix instead of paying full input-token price for it.
+
+To keep that prefix stable, the system prompt carries a question-independent
+overview of the reviews (balanced by sentiment, deduplicated, within
+CHAT_CONTEXT_TOKEN_BUDGET). Reviews relevant to the current question are
+ranked with BM25 and added to the user turn, after the breakpoint, within
+CHAT_RELEVANT_TOKEN_BUDGET.
+
+Streams use one shared Anthropic client per process and are capped by
+CHAT_MAX_CONCURRENT_STREAMS. Under the gevent worker (gunicorn.conf.py)
+each stream is a greenlet, so hundreds can be open per process.
+"""
+import threading
+from flask import current_app
+from services.response_cache import LRUBackend
+from services.review_selection import ReviewIndex, format_review
+from utils import metrics
 
-MAX_REVIEW_CHARS = 500
 MAX_REVIEWS_IN_CONTEXT = 20
 MAX_HISTORY_MESSAGES = 10
 
+_prompts = None
+_prompts_lock = threading.Lock()
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+_stream_slots = None
+_stream_stats = {"active": 0, "completed": 0, "cancelled": 0, "failed": 0, "rejected": 0}
+
+_stats_lock = threading.Lock()
+_stats = {
+    "hits": 0,
+    "misses": 0,
+    "requests": 0,
+    "cache_read_input_tokens": 0,
+    "cache_creation_input_tokens": 0,
+    "uncached_input_tokens": 0,
+}
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _get_prompt_cache():
+    global _prompts
+    if _prompts is None:
+        with _prompts_lock:
+            if _prompts is None:
+                _prompts = LRUBackend(current_app.config.get("CHAT_PROMPT_CACHE_MAX_ENTRIES", 256))
+    return _prompts
+
+
+def get_anthropic_client(api_key: str):
+    """Return the process-wide Anthropic client for this key (reuses its connection pool)."""
+    client = _clients.get(api_key)
+    if client is None:
+        import anthropic
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = _clients[api_key] = anthropic.Anthropic(api_key=api_key)
+    return client
+
+
+def acquire_stream_slot() -> bool:
+    """Reserve one of CHAT_MAX_CONCURRENT_STREAMS; False when the process is at capacity."""
+    global _stream_slots
+    if _stream_slots is None:
+        with _clients_lock:
+            if _stream_slots is None:
+                _stream_slots = threading.BoundedSemaphore(
+                    current_app.config.get("CHAT_MAX_CONCURRENT_STREAMS", 500)
+                )
+    if not _stream_slots.acquire(blocking=False):
+        _count_stream("rejected")
+        return False
+    _count_stream("active")
+    return True
+
+
+def release_stream_slot(outcome: str) -> None:
+    """Free a stream slot, recording how the stream ended (completed/cancelled/failed)."""
+    with _stats_lock:
+        _stream_stats["active"] -= 1
+        _stream_stats[outcome] += 1
+    _stream_slots.release()
+
+
+def _count_stream(name):
+    with _stats_lock:
+        _stream_stats[name] += 1
+
+
+def get_stream_stats() -> dict:
+    """Process-local counts of open and finished chat streams."""
+    with _stats_lock:
+        return dict(_stream_stats)
+
+
+class ChatContext:
+    """A product's memoized system prompt plus the review index used per question."""
 
-def build_system_prompt(product_data: dict) -> str:
-    """Build a system prompt from product.to_dict(include_reviews=True) output."""
+    def __init__(self, system_prompt, index, overview_ids):
+        self.system_prompt = system_prompt
+        self.index = index
+        self.overview_ids = overview_ids
+
+    def user_message(self, question: str, budget_tokens: int) -> str:
+        """The user's question, preceded by the reviews most relevant to it."""
+        ranking = self.index.relevance_ranking(question)
+        picked = self.index.select(budget_tokens, ranking, exclude=self.overview_ids)
+        if not picked:
+            return question
+        lines = [
+            format_review(self.index.reviews[i], number)
+            for number, i in enumerate(picked, start=len(self.overview_ids) + 1)
+        ]
+        return (
+            "Additional reviews relevant to my question:\n\n"
+            + "\n\n".join(lines)
+            + f"\n\nMy question: {question}"
+        )
+
+
+def get_chat_context(product) -> ChatContext:
+    """Return the product's chat context, building it only when the product or its reviews changed."""
+    # Changed reviews bump updated_at (review_service, sentiment_backfill._refresh_products);
+    # a refresh that changes none keeps it (review_service._mark_fetched)
+    key = (product.id, product.updated_at.isoformat() if product.updated_at else None)
+    cache = _get_prompt_cache()
+    context = cache.get(key)
+    if context is not None:
+        _count("hits")
+        return context
+
+    _count("misses")
+    context = build_chat_context(
+        product.to_dict(include_reviews=True),
+        current_app.config.get("CHAT_CONTEXT_TOKEN_BUDGET", 3000),
+    )
+    cache.set(key, context)
+    return context
+
+
+def system_blocks(system_prompt: str) -> list:
+    """
+    System prompt as content blocks, with a cache breakpoint after the product block.
+    Prompts below the model's minimum cacheable length are simply not cached.
+    """
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+def record_usage(usage) -> None:
+    """Accumulate Anthropic prompt-cache token counts from a response's usage."""
+    tokens = {
+        "input": getattr(usage, "input_tokens", None) or 0,
+        "output": getattr(usage, "output_tokens", None) or 0,
+        "cache_read": getattr(usage, "cache_read_input_tokens", None) or 0,
+        "cache_creation": getattr(usage, "cache_creation_input_tokens", None) or 0,
+    }
+    _count("requests")
+    _count("cache_read_input_tokens", tokens["cache_read"])
+    _count("cache_creation_input_tokens", tokens["cache_creation"])
+    _count("uncached_input_tokens", tokens["input"])
+    for kind, count in tokens.items():
+        metrics.inc("claude_tokens_total", (("operation", "chat"), ("kind", kind)), count)
+
+
+def get_prompt_cache_stats() -> dict:
+    """Process-local prompt memo hit/miss counters and Anthropic cache token totals."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    input_tokens = (
+        stats["cache_read_input_tokens"]
+        + stats["cache_creation_input_tokens"]
+        + stats["uncached_input_tokens"]
+    )
+    stats["token_cache_ratio"] = (
+        round(stats["cache_read_input_tokens"] / input_tokens, 4) if input_tokens else 0.0
+    )
+    prompts = _prompts
+    stats["entries"] = len(prompts) if prompts is not None else 0
+    return stats
+
+
+def build_chat_context(product_data: dict, budget_tokens: int = 3000) -> ChatContext:
+    """Build the chat context from product.to_dict(include_reviews=True) output."""
+    reviews = product_data.get("reviews", [])
+    index = ReviewIndex(reviews)
+    overview_ids = index.select(budget_tokens, index.overview_ranking(), max_reviews=MAX_REVIEWS_IN_CONTEXT)
+    selected = [reviews[i] for i in overview_ids]
+    return ChatContext(build_system_prompt(product_data, selected), index, overview_ids)
+
+
+def build_system_prompt(product_data: dict, selected: list) -> str:
+    """Build a system prompt from product.to_dict() output and the reviews to include."""
     name = product_data.get("name", "Unknown Product")
     description = product_data.get("description") or "No description provided."
     category = product_data.get("category") or "Uncategorized"
     price = product_data.get("price", 0)
     rating = product_data.get("rating", 0)
     review_count = product_data.get("review_count", 0)
-    reviews = product_data.get("reviews", [])
 
     product_block = (
         f"Product: {name}\n"
@@ -23,43 +220,19 @@ def build_system_prompt(product_data: dict) -> str:
         f"Description: {description}"
     )
 
-    sorted_reviews = sorted(
-        reviews,
-        key=lambda r: r.get("sentiment_score", 0.5),
-        reverse=True,
-    )
-    selected = sorted_reviews[:MAX_REVIEWS_IN_CONTEXT]
-
-    review_lines = []
-    for i, review in enumerate(selected, start=1):
-        source = review.get("source", "unknown").upper()
-        sentiment = review.get("sentiment_score", 0.5)
-        text = (review.get("text") or "").strip()
-        if len(text) > MAX_REVIEW_CHARS:
-            text = text[:MAX_REVIEW_CHARS] + "..."
-
-        pros = review.get("pros", [])
-        cons = review.get("cons", [])
-
-        line = f"[Review {i} | Source: {source} | Sentiment: {sentiment:.2f}]\n{text}"
-        if pros:
-            line += f"\nPros: {', '.join(pros)}"
-        if cons:
-            line += f"\nCons: {', '.join(cons)}"
-        review_lines.append(line)
-
+    review_lines = [format_review(review, i) for i, review in enumerate(selected, start=1)]
     reviews_block = "\n\n".join(review_lines) if review_lines else "No reviews available."
 
     return f"""You are a helpful product research assistant for Revu AI, an AI-powered product review aggregator.
 
 You have been given detailed information about a specific product along with real customer reviews. Your job is to help the user understand this product — answer questions about its features, quality, value, common issues, and whether it's a good fit for their needs.
 
-Be concise, honest, and grounded in the review data. If a question cannot be answered from the provided information, say so clearly.
+Be concise, honest, and grounded in the review data. If a question cannot be answered from the provided information, say so clearly. The user's message may include additional reviews selected for their question; treat them like the ones below.
 
 === PRODUCT INFORMATION ===
 {product_block}
 
-=== CUSTOMER REVIEWS ({len(selected)} of {review_count} total) ===
+=== CUSTOMER REVIEWS ({len(selected)} of {review_count} total, balanced across positive, mixed and negative) ===
 {reviews_block}"""
 
 
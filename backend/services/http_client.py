@@ -0,0 +1,157 @@
+"""Shared, pooled HTTP session for external API clients.
+
+One requests.Session per process keeps TCP+TLS connections alive between
+SerpApi / Best Buy calls. Idempotent GETs are retried with jittered
+exponential backoff on 429 and 5xx responses. Per-host request and
+connection counts are also added to the shared counters, so the web
+process can report reuse for calls made by worker.py.
+"""
+import os
+import random
+import threading
+from urllib.parse import urlparse
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from services import shared_counters
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_session = None
+_adapter = None
+_session_pid = None
+_request_counts = {}  # host -> requests made through get()
+_published = {}  # pool key -> (requests, connections) already added to the shared counters
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with randomized backoff so workers don't retry in lockstep."""
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return backoff
+        return backoff * random.uniform(0.5, 1.5)
+
+
+def _build_session():
+    config = current_app.config
+    retry = JitteredRetry(
+        total=config.get("HTTP_MAX_RETRIES", 3),
+        backoff_factor=config.get("HTTP_BACKOFF_FACTOR", 0.5),
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # Callers still see the final response via raise_for_status()
+    )
+    pool_size = config.get("HTTP_POOL_SIZE", 10)
+    adapter = HTTPAdapter(
+        pool_connections=4,  # Distinct hosts kept pooled
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session, adapter
+
+
+def get_session():
+    """Return the process-wide pooled session (rebuilt after a fork)."""
+    global _session, _adapter, _session_pid
+
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _lock:
+        if _session is None or _session_pid != pid:
+            # Sockets inherited from a parent process must not be shared
+            _session, _adapter = _build_session()
+            _session_pid = pid
+            _request_counts.clear()
+            _published.clear()
+    return _session
+
+
+def _timeout_for(host):
+    """(connect, read) timeout for a host, from HTTP_HOST_TIMEOUTS."""
+    config = current_app.config
+    connect = config.get("HTTP_CONNECT_TIMEOUT", 5)
+    read = config.get("HTTP_HOST_TIMEOUTS", {}).get(host, config.get("HTTP_READ_TIMEOUT", 15))
+    return (connect, read)
+
+
+def get(url, params=None):
+    """GET through the pooled session with the host's configured timeout."""
+    session = get_session()
+    host = urlparse(url).hostname or ""
+    with _lock:
+        _request_counts[host] = _request_counts.get(host, 0) + 1
+    try:
+        return session.get(url, params=params, timeout=_timeout_for(host))
+    finally:
+        _publish_pool_counts()
+
+
+def _publish_pool_counts():
+    """Add the pools' new requests and opened connections to the shared counters."""
+    deltas = []
+    with _lock:
+        if _adapter is None:
+            return
+        container = _adapter.poolmanager.pools
+        for key in list(container.keys()):
+            pool = container.get(key)
+            if pool is None:
+                continue
+            seen_requests, seen_connections = _published.get(key, (0, 0))
+            _published[key] = (pool.num_requests, pool.num_connections)
+            deltas.append((pool.host, pool.num_requests - seen_requests, pool.num_connections - seen_connections))
+    for host, requests_sent, connections in deltas:
+        shared_counters.add(f"http_pool.{host}.requests", requests_sent)
+        shared_counters.add(f"http_pool.{host}.connections_opened", connections)
+
+
+def get_pool_stats():
+    """Connection reuse statistics for this process."""
+    with _lock:
+        adapter = _adapter
+        request_counts = dict(_request_counts)
+
+    pools = []
+    if adapter is not None:
+        container = adapter.poolmanager.pools
+        for key in list(container.keys()):
+            pool = container.get(key)
+            if pool is None:
+                continue
+            requests_sent = pool.num_requests
+            connections = pool.num_connections
+            pools.append({
+                "host": pool.host,
+                "requests": requests_sent,  # Includes retries
+                "connections_opened": connections,
+                # The pool queue is pre-filled with None placeholders for unopened slots
+                "idle_connections": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+                "reuse_ratio": round(1 - connections / requests_sent, 4) if requests_sent else 0.0,
+            })
+
+    # Every process (including worker.py, which makes the SerpApi calls)
+    all_processes = {}
+    for name, value in shared_counters.get_counters("http_pool").items():
+        host, _, counter = name.rpartition(".")
+        all_processes.setdefault(host, {"requests": 0, "connections_opened": 0})[counter] = value
+    for totals in all_processes.values():
+        requests_sent = totals["requests"]
+        totals["reuse_ratio"] = round(1 - totals["connections_opened"] / requests_sent, 4) if requests_sent else 0.0
+
+    return {
+        "pid": os.getpid(),
+        "pool_size": current_app.config.get("HTTP_POOL_SIZE", 10),
+        "requests_by_host": request_counts,
+        "pools": pools,
+        "all_processes": all_processes,
+    }
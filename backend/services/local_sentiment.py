@@ -0,0 +1,415 @@
+"""In-process lexicon sentiment and aspect extraction.
+
+A cheap first tier in front of Claude: every review of a product is scored
+at once with NumPy over a flat array of token ids. Words and short phrases
+carry lexicon weights; negators flip the next few words, intensifiers and
+downtoners scale the next one, and words after "but" count more. The
+review's score blends the lexicon polarity with its star rating.
+
+Confidence is high only when the text has enough sentiment words, they
+agree with each other, and they agree with the stars. Reviews below the
+LOCAL_SENTIMENT_CONFIDENCE threshold are the ambiguous ones worth a Claude
+call; the rest keep the local result.
+
+Pros and cons are aspect phrases ("Long battery life", "Poor build
+quality") built from clauses that mention a known aspect. A clause ends at
+sentence punctuation or a comma, and a contrast word starts a new one, so
+"great battery but a terrible screen" yields one pro and one con.
+"""
+import hashlib
+import json
+import re
+import numpy as np
+
+# Word -> weight in [-1, 1]
+LEXICON = {
+    # positive
+    "love": 0.9, "loved": 0.9, "loves": 0.9, "amazing": 0.9, "awesome": 0.9, "excellent": 0.9,
+    "fantastic": 0.9, "perfect": 0.9, "perfectly": 0.8, "outstanding": 0.9, "superb": 0.9,
+    "best": 0.8, "great": 0.7, "wonderful": 0.8, "impressed": 0.7, "impressive": 0.7,
+    "recommend": 0.6, "recommended": 0.6, "happy": 0.6, "pleased": 0.6, "satisfied": 0.5,
+    "good": 0.5, "nice": 0.5, "solid": 0.5, "sturdy": 0.5, "durable": 0.6, "reliable": 0.6,
+    "comfortable": 0.6, "easy": 0.4, "fast": 0.4, "quick": 0.4, "quickly": 0.3, "quiet": 0.4,
+    "premium": 0.5, "beautiful": 0.6, "gorgeous": 0.7, "crisp": 0.5, "clear": 0.4, "bright": 0.3,
+    "long": 0.2, "lightweight": 0.4, "light": 0.2, "compact": 0.3, "smooth": 0.4, "powerful": 0.5,
+    "worth": 0.5, "affordable": 0.4, "cheap": 0.1, "value": 0.3, "favorite": 0.7, "glad": 0.5,
+    "exceeded": 0.7, "flawless": 0.9, "flawlessly": 0.9, "works": 0.2, "worked": 0.2,
+    "decent": 0.3, "fine": 0.2, "okay": 0.1, "ok": 0.1, "helpful": 0.4, "responsive": 0.4,
+    "sleek": 0.5, "stylish": 0.5, "soft": 0.3, "accurate": 0.5, "convenient": 0.5, "enjoy": 0.6,
+    "enjoyed": 0.6, "thrilled": 0.8, "delighted": 0.8, "superior": 0.7, "gift": 0.2,
+    # negative
+    "terrible": -0.9, "horrible": -0.9, "awful": -0.9, "worst": -0.9, "useless": -0.9,
+    "garbage": -0.9, "junk": -0.9, "hate": -0.9, "hated": -0.9, "refund": -0.6, "returned": -0.6,
+    "return": -0.4, "returning": -0.6, "broke": -0.8, "broken": -0.8, "breaks": -0.7,
+    "defective": -0.8, "died": -0.7, "dead": -0.7, "fails": -0.7, "failed": -0.7, "failure": -0.7,
+    "poor": -0.7, "poorly": -0.7, "bad": -0.6, "cheaply": -0.6, "flimsy": -0.6, "fragile": -0.5,
+    "disappointed": -0.7, "disappointing": -0.7, "disappointment": -0.7, "unhappy": -0.6,
+    "frustrating": -0.6, "annoying": -0.5, "difficult": -0.4, "hard": -0.2, "slow": -0.4,
+    "loud": -0.3, "noisy": -0.4, "heavy": -0.2, "overpriced": -0.6, "expensive": -0.3,
+    "overheated": -0.7, "overheats": -0.7, "scratched": -0.5, "missing": -0.4, "leaks": -0.6,
+    "leaked": -0.6, "uncomfortable": -0.6, "unreliable": -0.7, "mediocre": -0.4, "meh": -0.3,
+    "problem": -0.4, "problems": -0.4, "issue": -0.3, "issues": -0.3, "quirks": -0.3,
+    "clunky": -0.4, "confusing": -0.4, "unclear": -0.3, "waste": -0.8, "avoid": -0.7,
+    "misleading": -0.6, "wrong": -0.4, "damaged": -0.6, "stopped": -0.4, "faulty": -0.7,
+    "crashes": -0.6, "lag": -0.4, "laggy": -0.5, "weak": -0.4, "short": -0.2, "regret": -0.7,
+}
+
+# Phrases (2-3 words, matched within a sentence) override their words' weights
+PHRASES = {
+    "highly recommend": 0.9, "would recommend": 0.7, "works great": 0.8, "works well": 0.6,
+    "works perfectly": 0.9, "worth every penny": 0.9, "worth the price": 0.7, "well made": 0.7,
+    "easy to use": 0.6, "easy to set": 0.5, "great value": 0.8, "good value": 0.6,
+    "stopped working": -0.9, "quit working": -0.9, "stopped charging": -0.8, "fell apart": -0.9,
+    "waste of money": -0.9, "not worth": -0.7, "do not buy": -0.9, "dont buy": -0.9,
+    "piece of junk": -0.9, "piece of garbage": -0.9, "fell off": -0.5, "cheaply made": -0.8,
+    "poor quality": -0.8, "low quality": -0.7, "does the job": 0.3, "gets the job done": 0.3,
+    "nothing special": -0.2, "as advertised": 0.4, "as described": 0.4, "could be better": -0.3,
+    "learning curve": -0.2, "never replied": -0.6, "not as advertised": -0.7,
+}
+
+NEGATORS = frozenset(
+    "not no never none nothing neither nor without hardly barely cannot cant dont doesnt didnt "
+    "isnt wasnt arent werent wont wouldnt shouldnt couldnt havent hasnt".split()
+)
+INTENSIFIERS = {
+    "very": 1.5, "really": 1.4, "extremely": 1.7, "super": 1.5, "so": 1.3, "absolutely": 1.6,
+    "incredibly": 1.7, "totally": 1.4, "highly": 1.4, "truly": 1.3, "most": 1.2,
+    "slightly": 0.5, "somewhat": 0.6, "fairly": 0.7, "pretty": 0.8, "bit": 0.6, "little": 0.7,
+}
+CONTRAST = frozenset(["but", "however", "although", "though", "yet"])
+
+# Aspect word -> label used in pros/cons
+ASPECTS = {
+    "battery": "battery life", "charge": "battery life", "charging": "charging",
+    "sound": "sound quality", "audio": "sound quality", "bass": "bass", "volume": "volume",
+    "quality": "quality", "build": "build quality", "material": "materials", "materials": "materials",
+    "design": "design", "look": "design", "looks": "design", "color": "color",
+    "screen": "screen", "display": "display", "picture": "picture quality", "camera": "camera",
+    "price": "price", "value": "value", "money": "value",
+    "shipping": "shipping", "delivery": "shipping", "packaging": "packaging",
+    "support": "customer support", "service": "customer service",
+    "setup": "setup", "instructions": "instructions", "app": "app", "software": "software",
+    "size": "size", "fit": "fit", "weight": "weight", "comfort": "comfort",
+    "performance": "performance", "speed": "speed", "connection": "connection", "bluetooth": "bluetooth",
+    "noise": "noise cancellation", "cable": "cable", "durability": "durability", "smell": "scent",
+    "scent": "scent", "taste": "taste", "texture": "texture", "grip": "grip", "buttons": "buttons",
+}
+
+# Two-word aspects, matched within a clause before single words
+ASPECT_PHRASES = {
+    "sound quality": "sound quality", "audio quality": "sound quality", "call quality": "call quality",
+    "picture quality": "picture quality", "image quality": "picture quality", "video quality": "video quality",
+    "print quality": "print quality", "build quality": "build quality", "battery life": "battery life",
+    "customer service": "customer service", "customer support": "customer support",
+    "noise cancellation": "noise cancellation", "noise canceling": "noise cancellation",
+    "bluetooth connection": "connection", "wifi connection": "connection",
+}
+# Too vague to report when a clause also names a more specific aspect
+GENERIC_ASPECTS = frozenset(["quality"])
+
+# Lexicon words that read naturally in front of an aspect ("Excellent battery life")
+DESCRIPTIVE = frozenset(
+    "amazing awesome excellent fantastic perfect outstanding superb great wonderful impressive good nice "
+    "solid sturdy durable reliable comfortable easy fast quick quiet premium beautiful gorgeous crisp clear "
+    "bright long lightweight compact smooth powerful affordable sleek stylish soft accurate convenient "
+    "superior decent terrible horrible awful poor bad flimsy fragile frustrating annoying difficult hard "
+    "slow loud noisy heavy overpriced expensive uncomfortable unreliable mediocre clunky confusing "
+    "unclear misleading weak short faulty defective laggy disappointing".split()
+)
+
+# Words after this many tokens of a negator are no longer negated
+NEGATION_SCOPE = 3
+NEGATION_FACTOR = -0.7
+# Weight of words following a contrast word in the same sentence
+CONTRAST_WEIGHT = 1.5
+# Lexicon mass at which evidence counts as ~63% certain
+EVIDENCE_SCALE = 1.5
+# Relative weight of the star rating vs the text when both are present
+STAR_WEIGHT = 1.0
+
+MAX_PHRASES = 3
+# A descriptive word names an aspect only within this many tokens of it, in the same clause
+ASPECT_WINDOW = 4
+# Clauses weaker than this don't produce an aspect phrase
+MIN_ASPECT_WEIGHT = 0.2
+
+# Stamped in reviews.sentiment_version for locally scored reviews; changes with the lexicon
+LOCAL_VERSION = "local-" + hashlib.sha256(
+    json.dumps(
+        [LEXICON, PHRASES, sorted(NEGATORS), INTENSIFIERS, ASPECTS, ASPECT_PHRASES, STAR_WEIGHT, "clauses"],
+        sort_keys=True,
+    ).encode()
+).hexdigest()[:10]
+
+SENTENCE_SPLIT = re.compile(r"[.!?;\n]+")
+CLAUSE_SPLIT = re.compile(r",")
+WORD = re.compile(r"[a-z0-9']+")
+
+
+def _build_vocabulary():
+    words = set(LEXICON) | set(NEGATORS) | set(INTENSIFIERS) | CONTRAST | set(ASPECTS)
+    for phrase in list(PHRASES) + list(ASPECT_PHRASES):
+        words.update(phrase.split())
+    vocabulary = {word: i for i, word in enumerate(sorted(words), start=1)}  # 0 = unknown word
+    size = len(vocabulary) + 1
+
+    weight = np.zeros(size)
+    negator = np.zeros(size, dtype=bool)
+    contrast = np.zeros(size, dtype=bool)
+    descriptive = np.zeros(size, dtype=bool)
+    scale = np.ones(size)
+    aspect = np.full(size, -1, dtype=np.int64)
+    aspect_labels = sorted(set(ASPECTS.values()) | set(ASPECT_PHRASES.values()))
+    for word, i in vocabulary.items():
+        weight[i] = LEXICON.get(word, 0.0)
+        negator[i] = word in NEGATORS
+        contrast[i] = word in CONTRAST
+        descriptive[i] = word in DESCRIPTIVE
+        scale[i] = INTENSIFIERS.get(word, 1.0)
+        if word in ASPECTS:
+            aspect[i] = aspect_labels.index(ASPECTS[word])
+
+    # Phrases as base-`size` codes of their word ids, sorted for searchsorted, per length
+    phrases = {}
+    for n in (3, 2):
+        items = sorted(
+            (_code([vocabulary[w] for w in phrase.split()], size), w)
+            for phrase, w in PHRASES.items() if len(phrase.split()) == n
+        )
+        phrases[n] = (np.array([c for c, _ in items], dtype=np.int64), np.array([w for _, w in items]))
+    aspect_items = sorted(
+        (_code([vocabulary[w] for w in phrase.split()], size), aspect_labels.index(label))
+        for phrase, label in ASPECT_PHRASES.items()
+    )
+    aspect_phrases = (
+        np.array([c for c, _ in aspect_items], dtype=np.int64),
+        np.array([label for _, label in aspect_items], dtype=np.int64),
+    )
+    generic = np.zeros(size, dtype=bool)
+    for word in GENERIC_ASPECTS:
+        generic[vocabulary[word]] = True
+    return (vocabulary, size, weight, negator, contrast, descriptive, scale, aspect, aspect_labels, phrases,
+            aspect_phrases, generic)
+
+
+def _code(ids, size):
+    code = 0
+    for i in ids:
+        code = code * size + i
+    return code
+
+
+(_VOCABULARY, _SIZE, _WEIGHT, _NEGATOR, _CONTRAST, _DESCRIPTIVE, _SCALE, _ASPECT,
+ _ASPECT_LABELS, _PHRASES, _ASPECT_PHRASES, _GENERIC) = _build_vocabulary()
+_WORDS = {i: word for word, i in _VOCABULARY.items()}
+
+
+def _tokenize(review_texts):
+    """Flat token ids with their review and (global) sentence and clause index."""
+    contrast = {i for word, i in _VOCABULARY.items() if word in CONTRAST}
+    ids = []
+    docs = []
+    sentences = []
+    clauses = []
+    sentence = 0
+    clause = 0
+    for doc, review in enumerate(review_texts):
+        text = (review.get("text") or "").lower().replace("’", "'")
+        for part in SENTENCE_SPLIT.split(text):
+            found = False
+            for piece in CLAUSE_SPLIT.split(part):
+                words = [_VOCABULARY.get(w.replace("'", ""), 0) for w in WORD.findall(piece)]
+                if not words:
+                    continue
+                for n, word in enumerate(words):
+                    if n and word in contrast:
+                        clause += 1
+                    clauses.append(clause)
+                clause += 1
+                found = True
+                ids.extend(words)
+                docs.extend([doc] * len(words))
+                sentences.extend([sentence] * len(words))
+            if found:
+                sentence += 1
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array(docs, dtype=np.int64),
+        np.array(sentences, dtype=np.int64),
+        np.array(clauses, dtype=np.int64),
+        clause,
+    )
+
+
+def _token_weights(ids, sentences):
+    """Per-token weights after phrases, negation, intensifiers and contrast."""
+    weights = _WEIGHT[ids]
+    consumed = np.zeros(len(ids), dtype=bool)
+
+    # Longest phrases first; a phrase's weight sits on its last word
+    for n, (codes, phrase_weights) in _PHRASES.items():
+        if len(ids) < n or not len(codes):
+            continue
+        span = len(ids) - n + 1
+        code = np.zeros(span, dtype=np.int64)
+        same = np.ones(span, dtype=bool)
+        free = np.ones(span, dtype=bool)
+        for k in range(n):
+            code = code * _SIZE + ids[k:k + span]
+            same &= sentences[k:k + span] == sentences[:span]
+            free &= ~consumed[k:k + span]
+        pos = np.minimum(np.searchsorted(codes, code), len(codes) - 1)
+        hit = (codes[pos] == code) & same & free
+        starts = np.flatnonzero(hit)
+        for k in range(n):
+            weights[starts + k] = 0.0
+            consumed[starts + k] = True
+        weights[starts + n - 1] = phrase_weights[pos[starts]]
+
+    # A negator inside a phrase ("not worth") is already part of the phrase's weight
+    negators = _NEGATOR[ids] & ~consumed
+    negated = np.zeros(len(ids), dtype=bool)
+    for k in range(1, NEGATION_SCOPE + 1):
+        if len(ids) > k:
+            negated[k:] |= negators[:-k] & (sentences[:-k] == sentences[k:])
+    weights = np.where(negated, weights * NEGATION_FACTOR, weights)
+
+    if len(ids) > 1:
+        same = sentences[:-1] == sentences[1:]
+        weights[1:] *= np.where(same, _SCALE[ids[:-1]], 1.0)
+
+    # Words after the last "but" of their sentence count more
+    positions = np.arange(len(ids))
+    last_contrast = np.maximum.accumulate(np.where(_CONTRAST[ids], positions, -1)) if len(ids) else positions
+    after = (last_contrast >= 0) & (sentences[np.maximum(last_contrast, 0)] == sentences) & (last_contrast < positions)
+    weights = np.where(after, weights * CONTRAST_WEIGHT, weights)
+    return np.clip(weights, -1.5, 1.5), negated
+
+
+def _star_polarity(review_texts):
+    """Star rating mapped to [-1, 1], and whether each review has one."""
+    stars = np.array([
+        float(r["star_rating"]) if isinstance(r.get("star_rating"), (int, float)) else np.nan
+        for r in review_texts
+    ])
+    has_star = ~np.isnan(stars)
+    polarity = np.where(has_star, (np.clip(np.nan_to_num(stars, nan=3.0), 1, 5) - 3) / 2, 0.0)
+    return polarity, has_star
+
+
+def _aspects(ids, clauses, clause_count):
+    """Per-token aspect label index (-1 for none), after two-word aspects and generic ones."""
+    aspect = _ASPECT[ids].copy()
+    codes, labels = _ASPECT_PHRASES
+    if len(ids) > 1 and len(codes):
+        code = ids[:-1] * _SIZE + ids[1:]
+        pos = np.minimum(np.searchsorted(codes, code), len(codes) - 1)
+        starts = np.flatnonzero((codes[pos] == code) & (clauses[:-1] == clauses[1:]))
+        # The label sits on the second word; the first no longer counts on its own
+        aspect[starts] = -1
+        aspect[starts + 1] = labels[pos[starts]]
+        matched = np.zeros(len(ids), dtype=bool)
+        matched[starts + 1] = True
+    else:
+        matched = np.zeros(len(ids), dtype=bool)
+
+    # A bare "quality" only counts when its clause names nothing more specific
+    mentions = np.bincount(clauses[aspect >= 0], minlength=clause_count)
+    generic = _GENERIC[ids] & ~matched & (aspect >= 0)
+    aspect[generic & (mentions[clauses] > 1)] = -1
+    return aspect
+
+
+def _aspect_phrases(ids, docs, clauses, clause_count, weights, negated, count):
+    """(pros, cons) lists per review from aspect mentions in polar clauses."""
+    pros = [[] for _ in range(count)]
+    cons = [[] for _ in range(count)]
+    aspect = _aspects(ids, clauses, clause_count)
+    aspect_positions = np.flatnonzero(aspect >= 0)
+    if not len(aspect_positions):
+        return pros, cons
+
+    clause_score = np.bincount(clauses, weights=weights, minlength=clause_count)
+
+    # Non-negated descriptive words by position, per direction
+    candidates = {
+        sign: np.flatnonzero(_DESCRIPTIVE[ids] & ~negated & (np.sign(weights) == sign))
+        for sign in (1, -1)
+    }
+
+    def nearest_word(position, sign):
+        """Closest descriptive word of this polarity in the aspect's clause (the later one on a tie)."""
+        positions = candidates[sign]
+        i = np.searchsorted(positions, position)
+        best = None
+        for candidate in positions[max(i - 1, 0):i + 1].tolist():
+            distance = abs(candidate - position)
+            if clauses[candidate] != clauses[position] or distance > ASPECT_WINDOW:
+                continue
+            if best is None or distance <= abs(best - position):
+                best = candidate
+        return ids[best] if best is not None else None
+
+    strength = np.abs(clause_score[clauses[aspect_positions]])
+    aspect_positions = aspect_positions[strength >= MIN_ASPECT_WEIGHT]
+    # Per review, strongest clauses first
+    order = np.lexsort((-np.abs(clause_score[clauses[aspect_positions]]), docs[aspect_positions]))
+    aspect_positions = aspect_positions[order]
+    for position, doc, clause, label_index in zip(
+        aspect_positions.tolist(),
+        docs[aspect_positions].tolist(),
+        clauses[aspect_positions].tolist(),
+        aspect[aspect_positions].tolist(),
+    ):
+        sign = 1 if clause_score[clause] > 0 else -1
+        target = pros[doc] if sign > 0 else cons[doc]
+        label = _ASPECT_LABELS[label_index]
+        word = nearest_word(position, sign)
+        phrase = f"{_WORDS[word].capitalize()} {label}" if word else f"{'Good' if sign > 0 else 'Poor'} {label}"
+        if len(target) < MAX_PHRASES and not any(p.endswith(label) for p in pros[doc] + cons[doc]):
+            target.append(phrase)
+    return pros, cons
+
+
+def score_reviews(review_texts):
+    """
+    Score a product's reviews locally, all at once.
+
+    Args:
+        review_texts: List of dicts with "id", "text", "star_rating" keys.
+
+    Returns:
+        List (in input order) of dicts with "id", "sentiment_score", "pros",
+        "cons" and "confidence" (0-1) keys.
+    """
+    count = len(review_texts)
+    if not count:
+        return []
+
+    ids, docs, sentences, clauses, clause_count = _tokenize(review_texts)
+    weights, negated = _token_weights(ids, sentences)
+
+    total = np.bincount(docs, weights=weights, minlength=count)
+    mass = np.bincount(docs, weights=np.abs(weights), minlength=count)
+    lexicon = total / (mass + 1.0)  # shrinks towards neutral on little evidence
+    stars, has_star = _star_polarity(review_texts)
+
+    combined = (lexicon + STAR_WEIGHT * stars) / (1.0 + STAR_WEIGHT * has_star)
+    scores = np.round(np.clip((combined + 1) / 2, 0.0, 1.0), 3)
+
+    evidence = 1 - np.exp(-mass / EVIDENCE_SCALE)
+    purity = np.divide(np.abs(total), mass, out=np.zeros(count), where=mass > 0)
+    agreement = np.where(has_star, 1 - np.abs(lexicon - stars) / 2, 0.5)
+    confidence = np.round(evidence * purity * agreement, 3)
+
+    pros, cons = _aspect_phrases(ids, docs, clauses, clause_count, weights, negated, count)
+    return [
+        {
+            "id": review["id"],
+            "sentiment_score": float(scores[i]),
+            "pros": pros[i],
+            "cons": cons[i],
+            "confidence": float(confidence[i]),
+        }
+        for i, review in enumerate(review_texts)
+    ]
@@ -0,0 +1,242 @@
+"""Shared product listing query builder.
+
+Used by GET /api/products and GET /api/categories/<slug>/products so both
+support the same filtering, sorting, offset or cursor pagination, and field
+selection. ProductPage can build a response dict or stream the JSON
+incrementally for large pages.
+"""
+import json
+import math
+from flask import current_app
+from sqlalchemy.orm import load_only, selectinload
+from models.category import Category
+from models.product import Product, SERIALIZED_FIELDS
+from utils.pagination import (
+    InvalidCursorError,
+    capped_count,
+    decode_cursor,
+    encode_cursor,
+    estimated_table_rows,
+    keyset_query,
+)
+from utils.search_index import apply_search
+
+# Sort name -> (column, descending). Ties are broken by id in the same direction.
+SORT_COLUMNS = {
+    "rating_desc": (Product.rating, True),
+    "rating_asc": (Product.rating, False),
+    "price_asc": (Product.price, False),
+    "price_desc": (Product.price, True),
+    "newest": (Product.created_at, True),
+}
+DEFAULT_SORT = "rating_desc"
+
+TOTAL_MODES = ("exact", "approx", "none")
+
+# Selectable fields that are relationships rather than columns
+RELATIONSHIP_FIELDS = ("review_stats",)
+
+# Rows fetched per round-trip when streaming
+STREAM_CHUNK_SIZE = 100
+
+
+class ListingArgsError(ValueError):
+    """Raised for invalid listing query parameters (maps to HTTP 400)."""
+    pass
+
+
+def parse_listing_args(args, max_limit=None):
+    """
+    Parse and validate listing query parameters.
+
+    Returns:
+        Dict with page, limit, sort, search, category, cursor, total_mode, fields.
+
+    Raises:
+        ListingArgsError on invalid input.
+    """
+    if max_limit is None:
+        max_limit = current_app.config.get("API_MAX_PAGE_SIZE", 100)
+    default_limit = current_app.config.get("API_PAGE_SIZE", 20)
+
+    try:
+        page = max(int(args.get("page", 1)), 1)
+        limit = min(int(args.get("limit", default_limit)), max_limit)
+    except ValueError:
+        raise ListingArgsError("Invalid page or limit parameter")
+    limit = max(limit, 1)  # Ensure limit is at least 1
+
+    cursor = args.get("cursor")
+    total_mode = args.get("total", "none" if cursor is not None else "exact")
+    if total_mode not in TOTAL_MODES:
+        raise ListingArgsError(f"total must be one of: {', '.join(TOTAL_MODES)}")
+
+    fields = None
+    raw_fields = args.get("fields", "").strip()
+    if raw_fields:
+        fields = [f.strip() for f in raw_fields.split(",") if f.strip()]
+        unknown = [f for f in fields if f not in SERIALIZED_FIELDS]
+        if unknown:
+            raise ListingArgsError(f"Unknown fields: {', '.join(unknown)}")
+        if "id" not in fields:
+            fields.insert(0, "id")
+
+    return {
+        "page": page,
+        "limit": limit,
+        "sort": args.get("sort", DEFAULT_SORT),
+        "search": args.get("q", "").strip(),
+        "category": args.get("category"),
+        "cursor": cursor,
+        "total_mode": total_mode,
+        "fields": fields,
+    }
+
+
+def build_product_query(category=None, search=""):
+    """
+    Base product query with category and search filters.
+
+    Returns:
+        (query, relevance_order): relevance_order is None unless a full-text
+        search ranked the results.
+    """
+    query = Product.query
+
+    if category:
+        query = query.filter(Product.category == category)
+
+    relevance_order = None
+    if search:
+        query, relevance_order = apply_search(query, search)
+
+    return query, relevance_order
+
+
+class ProductPage:
+    """One page of a product listing, in offset or cursor mode."""
+
+    def __init__(self, params, category=None):
+        self.params = params
+        self.category = category or params["category"]
+        self.limit = params["limit"]
+        self.cursor_mode = params["cursor"] is not None
+        self.has_more = False
+        self._last = None
+
+        base_query, relevance_order = build_product_query(self.category, params["search"])
+        self._base_query = base_query
+
+        sort = params["sort"]
+        if self.cursor_mode and sort == "relevance":
+            raise ListingArgsError("sort=relevance does not support cursor pagination")
+        if sort == "relevance" and relevance_order is None:
+            sort = DEFAULT_SORT
+        if sort != "relevance" and sort not in SORT_COLUMNS:
+            sort = DEFAULT_SORT
+        self.sort = sort
+
+        query = base_query
+        fields = params["fields"]
+        if fields:
+            columns = {getattr(Product, name) for name in fields if name not in RELATIONSHIP_FIELDS}
+            if sort in SORT_COLUMNS:
+                columns.add(SORT_COLUMNS[sort][0])
+            query = query.options(load_only(*columns))
+        if not fields or "review_stats" in fields:
+            # One IN (...) query per chunk of products, not one per product
+            query = query.options(selectinload(Product.review_stats))
+
+        if self.cursor_mode:
+            column, descending = SORT_COLUMNS[sort]
+            try:
+                position = decode_cursor(params["cursor"], sort) if params["cursor"] else None
+            except InvalidCursorError as e:
+                raise ListingArgsError(str(e))
+            # One extra row tells us whether there is a next page
+            self._query = keyset_query(query, column, Product.id, descending, position).limit(self.limit + 1)
+        else:
+            if sort == "relevance":
+                query = query.order_by(relevance_order, Product.rating.desc(), Product.id.desc())
+            else:
+                column, descending = SORT_COLUMNS[sort]
+                if descending:
+                    query = query.order_by(column.desc(), Product.id.desc())
+                else:
+                    query = query.order_by(column.asc(), Product.id.asc())
+            self._query = query.limit(self.limit).offset((params["page"] - 1) * self.limit)
+
+    def _total(self):
+        """(total, approximate) for the filtered listing, per the requested total mode."""
+        mode = self.params["total_mode"]
+        if mode == "exact":
+            return self._base_query.order_by(None).count(), False
+        if mode == "approx":
+            if self.params["search"]:
+                return capped_count(self._base_query)
+            if self.category:
+                category = Category.query.filter_by(slug=self.category).first()
+                return (category.product_count if category else 0), True
+            return estimated_table_rows(Product.__tablename__), True
+        return None, None
+
+    def iter_products(self):
+        """Yield serialized products for this page, fetching rows in chunks."""
+        fields = self.params["fields"]
+        for index, product in enumerate(self._query.yield_per(STREAM_CHUNK_SIZE)):
+            if index >= self.limit:
+                self.has_more = True
+                break
+            self._last = product
+            yield product.to_dict(fields=fields)
+
+    def metadata(self):
+        """Pagination metadata; call after iter_products() is exhausted."""
+        total, approximate = self._total()
+
+        if not self.cursor_mode:
+            return {
+                "total": total,
+                "page": self.params["page"],
+                "limit": self.limit,
+                "pages": math.ceil(total / self.limit) if total is not None else None,
+            }
+
+        next_cursor = None
+        if self.has_more and self._last is not None:
+            column = SORT_COLUMNS[self.sort][0]
+            next_cursor = encode_cursor(self.sort, getattr(self._last, column.key), self._last.id)
+
+        meta = {
+            "limit": self.limit,
+            "next_cursor": next_cursor,
+            "has_more": self.has_more,
+        }
+        if total is not None:
+            meta["total"] = total
+            meta["total_approximate"] = approximate
+        return meta
+
+    def to_dict(self, extra=None):
+        """Build the whole response body in memory."""
+        data = dict(extra or {})
+        data["products"] = list(self.iter_products())
+        data.update(self.metadata())
+        return data
+
+    def iter_json(self, extra=None):
+        """Stream the response body as JSON text chunks, one product at a time."""
+        yield "{"
+        for key, value in (extra or {}).items():
+            yield f"{json.dumps(key)}:{json.dumps(value)},"
+
+        yield '"products":['
+        first = True
+        for product in self.iter_products():
+            yield ("" if first else ",") + json.dumps(product)
+            first = False
+        yield "]"
+
+        for key, value in self.metadata().items():
+            yield f",{json.dumps(key)}:{json.dumps(value)}"
+        yield "}"
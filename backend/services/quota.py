@@ -0,0 +1,212 @@
+"""Monthly quota counters for rate-limited external APIs.
+
+A call slot is reserved *before* the HTTP request with a single conditional
+UPDATE (used = used + 1 WHERE used < cap), so concurrent workers can never
+overshoot the limit. The api_usage table is kept as an append-only audit
+log, written in batches.
+"""
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models.api_quota import ApiQuota
+from models.api_usage import ApiUsage
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# Flush the audit buffer when it reaches this many rows or this age
+AUDIT_BATCH_SIZE = 20
+AUDIT_FLUSH_SECONDS = 60
+
+_lock = threading.Lock()
+_known_periods = set()
+_usage_cache = {}  # (api_name, period) -> (used, expires_at)
+
+_audit_buffer = []
+_audit_engine = None
+_audit_oldest = None
+
+
+def current_period(now=None):
+    """Quota period for a timestamp, as YYYY-MM (UTC)."""
+    return (now or datetime.utcnow()).strftime("%Y-%m")
+
+
+def _month_start(period):
+    return datetime.strptime(period, "%Y-%m")
+
+
+def _ensure_period_row(api_name, period):
+    """
+    Create the counter row for a period, seeded from the audit log.
+    Returns True if this call created it.
+    """
+    if (api_name, period) in _known_periods:
+        return False
+    created = False
+    try:
+        with db.engine.begin() as conn:
+            exists = conn.execute(
+                db.select(ApiQuota.used).where(
+                    ApiQuota.api_name == api_name, ApiQuota.period == period
+                )
+            ).first()
+            if not exists:
+                # Carry over calls logged before the counter existed
+                seed = conn.execute(
+                    db.select(db.func.count()).select_from(ApiUsage).where(
+                        ApiUsage.api_name == api_name,
+                        ApiUsage.called_at >= _month_start(period),
+                    )
+                ).scalar()
+                conn.execute(
+                    ApiQuota.__table__.insert(),
+                    {"api_name": api_name, "period": period, "used": seed or 0},
+                )
+                created = True
+    except IntegrityError:
+        pass  # Another worker created it first
+    with _lock:
+        _known_periods.add((api_name, period))
+    return created
+
+
+def _cache_usage(api_name, period, used):
+    ttl = current_app.config.get("QUOTA_CACHE_SECONDS", 30)
+    with _lock:
+        _usage_cache[(api_name, period)] = (used, time.monotonic() + ttl)
+
+
+def reserve(api_name, cap):
+    """
+    Atomically reserve one call slot for this month.
+    Returns the period the slot was reserved in (pass it to release()), or
+    None if the cap is reached.
+    """
+    period = current_period()
+    _ensure_period_row(api_name, period)
+    reserved = _reserve_in(api_name, period, cap)
+    if not reserved:
+        # The row may have been deleted since it was cached (sync.py --clean)
+        with _lock:
+            _known_periods.discard((api_name, period))
+        if _ensure_period_row(api_name, period):
+            reserved = _reserve_in(api_name, period, cap)
+    return period if reserved else None
+
+
+def _reserve_in(api_name, period, cap):
+    """One conditional UPDATE; True if a slot was taken."""
+    stmt = (
+        db.update(ApiQuota)
+        .where(
+            ApiQuota.api_name == api_name,
+            ApiQuota.period == period,
+            ApiQuota.used < cap,
+        )
+        .values(used=ApiQuota.used + 1)
+    )
+
+    with db.engine.begin() as conn:
+        if conn.dialect.update_returning:
+            used = conn.execute(stmt.returning(ApiQuota.used)).scalar()
+            reserved = used is not None
+        else:
+            reserved = conn.execute(stmt).rowcount == 1
+            used = None
+
+    if used is not None:
+        _cache_usage(api_name, period, used)
+    else:
+        with _lock:
+            _usage_cache.pop((api_name, period), None)
+    return reserved
+
+
+def release(api_name, period):
+    """Give back a slot reserved in `period` (e.g. the HTTP call failed before being billed)."""
+    with db.engine.begin() as conn:
+        conn.execute(
+            db.update(ApiQuota)
+            .where(
+                ApiQuota.api_name == api_name,
+                ApiQuota.period == period,
+                ApiQuota.used > 0,
+            )
+            .values(used=ApiQuota.used - 1)
+        )
+    with _lock:
+        _usage_cache.pop((api_name, period), None)
+
+
+def get_usage(api_name):
+    """Calls used this month, served from a short-lived process-local cache."""
+    period = current_period()
+    with _lock:
+        cached = _usage_cache.get((api_name, period))
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+
+    _ensure_period_row(api_name, period)
+    used = db.session.query(ApiQuota.used).filter(
+        ApiQuota.api_name == api_name,
+        ApiQuota.period == period,
+    ).scalar() or 0
+    _cache_usage(api_name, period, used)
+    return used
+
+
+def record_call(api_name, endpoint, product_id=None):
+    """Buffer an audit log row; rows are written to api_usage in batches."""
+    global _audit_engine, _audit_oldest
+
+    with _lock:
+        _audit_engine = db.engine
+        if not _audit_buffer:
+            _audit_oldest = time.monotonic()
+        _audit_buffer.append({
+            "api_name": api_name,
+            "endpoint": endpoint,
+            "product_id": product_id,
+            "called_at": datetime.utcnow(),
+        })
+        due = (
+            len(_audit_buffer) >= AUDIT_BATCH_SIZE
+            or time.monotonic() - _audit_oldest >= AUDIT_FLUSH_SECONDS
+        )
+
+    if due:
+        flush_audit_log()
+
+
+def flush_audit_log():
+    """Write buffered audit rows to api_usage in a single batch."""
+    global _audit_oldest
+
+    with _lock:
+        rows = list(_audit_buffer)
+        _audit_buffer.clear()
+        _audit_oldest = None
+        engine = _audit_engine
+    if not rows or engine is None:
+        return
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(ApiUsage.__table__.insert(), rows)
+    except Exception as e:
+        logger.warning("Failed to write %d API usage audit rows: %s", len(rows), e)
+
+
+def reset_caches():
+    """Forget cached counters (e.g. after the quota tables are cleared)."""
+    with _lock:
+        _known_periods.clear()
+        _usage_cache.clear()
+
+
+atexit.register(flush_audit_log)
@@ -0,0 +1,181 @@
+"""Database-backed queue for background review refreshes.
+
+GET /api/products/<id> only enqueues here; worker.py drains the queue.
+Jobs are unique per product, so repeated enqueues collapse into one refresh.
+Jobs run highest priority first and only while review_freshness.refresh_budget()
+allows; worker.py also enqueues viewed products that are due (schedule_due_refreshes).
+"""
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models.product import Product
+from models.review_refresh_job import ReviewRefreshJob
+from services import review_freshness
+from services.review_service import fetch_reviews_for_product, reviews_are_stale
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+
+def has_pending_refresh(product_id):
+    """Return True if a refresh job for the product is pending or running."""
+    return db.session.query(
+        ReviewRefreshJob.query.filter_by(product_id=product_id).exists()
+    ).scalar()
+
+
+def enqueue_review_refresh(product_id, priority=0.0):
+    """
+    Queue a review refresh for a product.
+    Returns True once a job exists for the product (new or already queued).
+    """
+    # Insert on a separate connection so a duplicate doesn't roll back the request session
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                ReviewRefreshJob.__table__.insert(),
+                {"product_id": product_id, "priority": priority},
+            )
+    except IntegrityError:
+        pass  # Already queued
+    return True
+
+
+def request_review_refresh(product):
+    """
+    Enqueue a refresh if the product's cached reviews are stale.
+    Returns True while a refresh is pending for the product.
+    """
+    if has_pending_refresh(product.id):
+        return True
+    if not reviews_are_stale(product):
+        return False
+    return enqueue_review_refresh(product.id, review_freshness.refresh_priority(product))
+
+
+def queue_depth():
+    """Number of pending and running refresh jobs."""
+    return ReviewRefreshJob.query.count()
+
+
+def schedule_due_refreshes():
+    """
+    Enqueue viewed products whose reviews are due, as many as the paced
+    SerpApi budget has room for beyond the jobs already queued.
+    Returns the number of jobs enqueued.
+    """
+    slots = review_freshness.refresh_budget() - queue_depth()
+    due = review_freshness.due_products(slots)
+    for product_id, priority in due:
+        enqueue_review_refresh(product_id, priority)
+    return len(due)
+
+
+def claim_next_job():
+    """
+    Claim the highest priority, then oldest, pending job (or a running job whose worker appears dead).
+    Returns the claimed job, or None if the queue is empty.
+    """
+    now = datetime.utcnow()
+    stale_minutes = current_app.config.get("REVIEW_REFRESH_STALE_MINUTES", 15)
+    stale_cutoff = now - timedelta(minutes=stale_minutes)
+
+    candidates = (
+        ReviewRefreshJob.query.filter(
+            db.or_(
+                db.and_(
+                    ReviewRefreshJob.status == "pending",
+                    db.or_(ReviewRefreshJob.run_after.is_(None), ReviewRefreshJob.run_after <= now),
+                ),
+                db.and_(
+                    ReviewRefreshJob.status == "running",
+                    ReviewRefreshJob.started_at < stale_cutoff,
+                ),
+            )
+        )
+        .order_by(ReviewRefreshJob.priority.desc(), ReviewRefreshJob.enqueued_at)
+        .limit(10)
+        .all()
+    )
+
+    for candidate in candidates:
+        # Compare-and-swap on (status, attempts) so two workers can't claim the same job
+        claimed = ReviewRefreshJob.query.filter(
+            ReviewRefreshJob.id == candidate.id,
+            ReviewRefreshJob.status == candidate.status,
+            ReviewRefreshJob.attempts == candidate.attempts,
+        ).update(
+            {
+                "status": "running",
+                "started_at": datetime.utcnow(),
+                "attempts": candidate.attempts + 1,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        if claimed == 1:
+            db.session.refresh(candidate)
+            return candidate
+
+    return None
+
+
+def complete_job(job):
+    """Remove a finished job from the queue."""
+    ReviewRefreshJob.query.filter_by(id=job.id).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def fail_job(job, error):
+    """Return a failed job to the queue with backoff, or drop it after REVIEW_REFRESH_MAX_ATTEMPTS."""
+    max_attempts = current_app.config.get("REVIEW_REFRESH_MAX_ATTEMPTS", 3)
+    retry_minutes = current_app.config.get("REVIEW_REFRESH_RETRY_MINUTES", 5)
+    if job.attempts >= max_attempts:
+        logger.warning(
+            "Dropping review refresh for product %s after %d attempts: %s",
+            job.product_id, job.attempts, error,
+        )
+        complete_job(job)
+        return
+
+    ReviewRefreshJob.query.filter_by(id=job.id).update(
+        {
+            "status": "pending",
+            "started_at": None,
+            "run_after": datetime.utcnow() + timedelta(minutes=retry_minutes * job.attempts),
+            "last_error": str(error)[:1000],
+        },
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def process_next_job():
+    """
+    Claim and run one refresh job.
+    Returns True if a job was processed, False if the queue was empty or
+    this month's paced SerpApi budget is used up for now.
+    """
+    if review_freshness.refresh_budget() <= 0:
+        return False
+
+    job = claim_next_job()
+    if not job:
+        return False
+
+    product = db.session.get(Product, job.product_id)
+    if not product:
+        complete_job(job)
+        return True
+
+    try:
+        fetch_reviews_for_product(product)
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Review refresh failed for product %s: %s", job.product_id, e)
+        fail_job(job, e)
+        return True
+
+    complete_job(job)
+    return True
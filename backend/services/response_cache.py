@@ -0,0 +1,229 @@
+"""HTTP response cache for catalogue endpoints.
+
+Responses are cached by (path, normalized query args, catalogue stamp). The
+stamp lives in the catalogue_version table and is replaced by
+bump_catalogue_version() whenever sync.py or a review refresh changes
+catalogue data, which invalidates every cached response at once across
+all worker processes. Responses carry a strong ETag so clients and CDNs
+can revalidate with If-None-Match and get a 304.
+
+The default backend is an in-process LRU. A shared backend (Redis, via
+RESPONSE_CACHE_URL) can be configured, and set_backend() lets tests
+substitute a local stand-in.
+"""
+import hashlib
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from flask import Response, current_app, make_response, request
+from werkzeug.http import http_date, parse_date
+from models.catalogue_version import CatalogueVersion
+from utils.database import db
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+_stamp_cache = {"value": None, "expires": 0.0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+class LRUBackend:
+    """Thread-safe in-process LRU cache."""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl=None):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    """Shared cache in Redis, so all worker processes reuse each other's responses."""
+
+    def __init__(self, url, prefix="revu:response:"):
+        import redis  # Optional dependency, only needed when RESPONSE_CACHE_URL is set
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return pickle.loads(raw) if raw else None
+
+    def set(self, key, entry, ttl=None):
+        self._client.set(self._prefix + key, pickle.dumps(entry), ex=ttl)
+
+
+def get_backend():
+    """Return the configured cache backend (created on first use)."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = current_app.config.get("RESPONSE_CACHE_URL", "")
+                if url:
+                    _backend = RedisBackend(url)
+                else:
+                    _backend = LRUBackend(current_app.config.get("RESPONSE_CACHE_MAX_ENTRIES", 512))
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the cache backend (e.g. a local stand-in for a shared cache in tests)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _new_stamp():
+    return uuid.uuid4().hex
+
+
+def get_catalogue_version():
+    """
+    Current catalogue (stamp, updated_at), cached in-process for
+    RESPONSE_CACHE_VERSION_TTL seconds.
+    """
+    now = time.monotonic()
+    if _stamp_cache["value"] is not None and _stamp_cache["expires"] > now:
+        return _stamp_cache["value"]
+
+    row = db.session.get(CatalogueVersion, 1)
+    if row is None:
+        row = CatalogueVersion(id=1, stamp=_new_stamp(), updated_at=datetime.utcnow())
+        db.session.add(row)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            row = db.session.get(CatalogueVersion, 1)
+
+    value = (row.stamp, row.updated_at)
+    _stamp_cache["value"] = value
+    _stamp_cache["expires"] = now + current_app.config.get("RESPONSE_CACHE_VERSION_TTL", 2)
+    return value
+
+
+def bump_catalogue_version():
+    """
+    Invalidate all cached catalogue responses.
+    Runs in the current session; the caller's commit publishes the new stamp.
+    """
+    stamp = _new_stamp()
+    now = datetime.utcnow()
+    updated = CatalogueVersion.query.filter_by(id=1).update(
+        {"stamp": stamp, "updated_at": now}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(CatalogueVersion(id=1, stamp=stamp, updated_at=now))
+    _stamp_cache["value"] = None
+
+
+def _cache_key(stamp):
+    args = sorted(
+        (key, value)
+        for key, values in request.args.lists()
+        for value in values
+        if value != ""
+    )
+    raw = f"{request.path}?{args!r}@{stamp}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _not_modified(etag, last_modified):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return etag in candidates or "*" in candidates
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since:
+        since = parse_date(if_modified_since)
+        if since is None:
+            return False
+        return last_modified.replace(microsecond=0) <= since.replace(tzinfo=None)
+    return False
+
+
+def _build_response(entry, status=None):
+    body, mimetype, etag, last_modified = entry
+    if status == 304:
+        response = Response(status=304)
+    else:
+        response = Response(body, status=200, mimetype=mimetype)
+    response.headers["ETag"] = etag
+    response.headers["Last-Modified"] = http_date(last_modified)
+    max_age = current_app.config.get("RESPONSE_CACHE_MAX_AGE", 0)
+    response.headers["Cache-Control"] = f"public, max-age={max_age}, must-revalidate"
+    return response
+
+
+def cached_response(view):
+    """Cache a catalogue view's 200 responses and answer conditional requests with 304."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get("RESPONSE_CACHE_ENABLED", True):
+            return view(*args, **kwargs)
+
+        stamp, updated_at = get_catalogue_version()
+        key = _cache_key(stamp)
+        backend = get_backend()
+
+        entry = backend.get(key)
+        if entry is not None:
+            _count("hits")
+        else:
+            _count("misses")
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            entry = (body, response.mimetype, etag, updated_at)
+            backend.set(key, entry, ttl=current_app.config.get("RESPONSE_CACHE_TTL", 3600))
+
+        if _not_modified(entry[2], entry[3]):
+            _count("not_modified")
+            return _build_response(entry, status=304)
+        return _build_response(entry)
+
+    return wrapper
+
+
+def get_cache_stats():
+    """Process-local response cache counters."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    backend = _backend
+    if isinstance(backend, LRUBackend):
+        stats["entries"] = len(backend)
+    return stats
@@ -0,0 +1,272 @@
+"""Per-product review freshness: TTL tiers, refresh priority and quota pacing.
+
+GET /api/products/<id> always serves the stored reviews straight away and
+only queues a background refresh when they are stale (stale-while-
+revalidate). It also records the view in a process-local buffer, written
+to product_freshness in batches as an exponentially decayed count.
+
+A product's TTL comes from its tier by views per day: hot products
+(REVIEW_HOT_VIEWS_PER_DAY) keep reviews for REVIEW_HOT_CACHE_DAYS, warm
+ones for REVIEW_CACHE_DAYS, and the rest for REVIEW_COLD_CACHE_DAYS. The
+TTL is shortened for products whose refreshes keep finding new reviews.
+Priority (views per day x (1 + review velocity)) orders the refresh
+queue. refresh_budget() paces SerpApi calls so SERPAPI_MONTHLY_LIMIT is
+spread evenly over the month rather than spent in its first days.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from math import log
+from flask import current_app
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+from models.product import Product
+from models.product_freshness import ProductFreshness
+from models.review_refresh_job import ReviewRefreshJob
+from services import quota
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# Write buffered views when this many are pending or the oldest is this old
+VIEW_FLUSH_SIZE = 100
+VIEW_FLUSH_SECONDS = 60
+
+# Weight of the latest refresh in the review velocity moving average
+VELOCITY_SMOOTHING = 0.5
+
+_lock = threading.Lock()
+_view_buffer = Counter()
+_view_oldest = None
+_view_engine = None
+_view_settings = None
+
+
+def _settings():
+    config = current_app.config
+    return {
+        "hot_views": config.get("REVIEW_HOT_VIEWS_PER_DAY", 20),
+        "hot_days": config.get("REVIEW_HOT_CACHE_DAYS", 1),
+        "warm_views": config.get("REVIEW_WARM_VIEWS_PER_DAY", 1),
+        "warm_days": config.get("REVIEW_CACHE_DAYS", 7),
+        "cold_days": config.get("REVIEW_COLD_CACHE_DAYS", 30),
+        "min_hours": config.get("REVIEW_MIN_CACHE_HOURS", 6),
+        "half_life_days": config.get("REVIEW_VIEW_HALF_LIFE_DAYS", 7),
+    }
+
+
+def _decayed(score, counted_at, now, half_life_days):
+    """A decayed view score carried forward to `now`."""
+    if not score or counted_at is None:
+        return 0.0
+    days = max((now - counted_at).total_seconds() / 86400, 0.0)
+    return score * 0.5 ** (days / half_life_days)
+
+
+def views_per_day(score, counted_at, now, settings):
+    """Estimated current view rate from a decayed view score."""
+    # A steady rate r accumulates to r * half_life / ln 2
+    return _decayed(score, counted_at, now, settings["half_life_days"]) * log(2) / settings["half_life_days"]
+
+
+def cache_ttl(rate, velocity, settings):
+    """How long a product's reviews stay fresh, from its view rate tier and review velocity."""
+    if rate >= settings["hot_views"]:
+        days = settings["hot_days"]
+    elif rate >= settings["warm_views"]:
+        days = settings["warm_days"]
+    else:
+        days = settings["cold_days"]
+    return max(timedelta(days=days / (1 + velocity)), timedelta(hours=settings["min_hours"]))
+
+
+def _schedule(score, counted_at, velocity, fetched_at, now, settings):
+    """priority and next_refresh_at column values."""
+    rate = views_per_day(score, counted_at, now, settings)
+    return {
+        "priority": rate * (1 + velocity),
+        "next_refresh_at": fetched_at + cache_ttl(rate, velocity, settings) if fetched_at else now,
+    }
+
+
+def record_view(product_id):
+    """Count a product page view; written to the database in batches."""
+    global _view_oldest, _view_engine, _view_settings
+
+    with _lock:
+        _view_engine = db.engine
+        _view_settings = _view_settings or _settings()
+        if not _view_buffer:
+            _view_oldest = time.monotonic()
+        _view_buffer[product_id] += 1
+        due = (
+            sum(_view_buffer.values()) >= VIEW_FLUSH_SIZE
+            or time.monotonic() - _view_oldest >= VIEW_FLUSH_SECONDS
+        )
+
+    if due:
+        flush_views()
+
+
+def flush_views():
+    """Fold buffered views into product_freshness: one SELECT, one INSERT, one UPDATE."""
+    global _view_oldest
+
+    with _lock:
+        counts = dict(_view_buffer)
+        _view_buffer.clear()
+        _view_oldest = None
+        engine = _view_engine
+        settings = _view_settings
+    if not counts or engine is None:
+        return
+
+    table = ProductFreshness.__table__
+    for attempt in range(2):
+        now = datetime.utcnow()
+        try:
+            with engine.begin() as conn:
+                existing = {
+                    row.product_id: row for row in conn.execute(
+                        db.select(
+                            Product.id.label("product_id"), Product.reviews_fetched_at,
+                            ProductFreshness.view_score, ProductFreshness.views_counted_at,
+                            ProductFreshness.review_velocity, ProductFreshness.product_id.label("tracked"),
+                        )
+                        .select_from(Product)
+                        .outerjoin(ProductFreshness, ProductFreshness.product_id == Product.id)
+                        .where(Product.id.in_(list(counts)))
+                    )
+                }
+                inserts = []
+                updates = []
+                for product_id, views in counts.items():
+                    row = existing.get(product_id)
+                    if row is None:
+                        continue  # Product deleted since the view
+                    velocity = row.review_velocity or 0.0
+                    score = _decayed(row.view_score, row.views_counted_at, now, settings["half_life_days"]) + views
+                    values = {
+                        "view_score": score,
+                        "views_counted_at": now,
+                        **_schedule(score, now, velocity, row.reviews_fetched_at, now, settings),
+                    }
+                    if row.tracked is None:
+                        inserts.append({"product_id": product_id, "review_velocity": 0.0, **values})
+                    else:
+                        updates.append({"b_product_id": product_id, **values})
+                if inserts:
+                    conn.execute(table.insert(), inserts)
+                if updates:
+                    conn.execute(
+                        table.update().where(table.c.product_id == bindparam("b_product_id")),
+                        updates,
+                    )
+            return
+        except IntegrityError:
+            # Another process inserted one of these products first; its row is there now
+            if attempt:
+                logger.warning("Dropped %d buffered product views after a conflicting insert", sum(counts.values()))
+        except Exception as e:
+            logger.warning("Failed to write %d buffered product views: %s", sum(counts.values()), e)
+            return
+
+
+def record_refresh(product, fetched_at, previous_fetched_at, new_reviews=None):
+    """
+    Update a product's review velocity and next refresh after a fetch.
+    new_reviews is None when the fetch found nothing to compare (no ASIN,
+    rate limited). Runs in the current session; the caller commits.
+    """
+    settings = _settings()
+    row = db.session.get(ProductFreshness, product.id)
+    if row is None:
+        row = ProductFreshness(product_id=product.id, view_score=0.0, review_velocity=0.0)
+        db.session.add(row)
+
+    if new_reviews is not None and previous_fetched_at is not None:
+        days = max((fetched_at - previous_fetched_at).total_seconds() / 86400, 1 / 24)
+        row.review_velocity = (
+            VELOCITY_SMOOTHING * new_reviews / days + (1 - VELOCITY_SMOOTHING) * (row.review_velocity or 0.0)
+        )
+    for column, value in _schedule(
+        row.view_score, row.views_counted_at, row.review_velocity or 0.0, fetched_at, fetched_at, settings,
+    ).items():
+        setattr(row, column, value)
+
+
+def review_ttl(product):
+    """The product's current review TTL."""
+    settings = _settings()
+    row = db.session.get(ProductFreshness, product.id)
+    if row is None:
+        return cache_ttl(0.0, 0.0, settings)
+    rate = views_per_day(row.view_score, row.views_counted_at, datetime.utcnow(), settings)
+    return cache_ttl(rate, row.review_velocity or 0.0, settings)
+
+
+def is_stale(product):
+    """True if the product's reviews have outlived its TTL (or were never fetched)."""
+    if not product.reviews_fetched_at:
+        return True
+    return product.reviews_fetched_at <= datetime.utcnow() - review_ttl(product)
+
+
+def refresh_priority(product):
+    """Queue priority for a refresh of this product."""
+    row = db.session.get(ProductFreshness, product.id)
+    if row is None:
+        return 0.0
+    rate = views_per_day(row.view_score, row.views_counted_at, datetime.utcnow(), _settings())
+    return rate * (1 + (row.review_velocity or 0.0))
+
+
+def refresh_budget(now=None):
+    """
+    SerpApi calls that may be made now: SERPAPI_MONTHLY_LIMIT spread evenly
+    over the month plus REVIEW_REFRESH_BURST, minus calls already used.
+    Zero or less means refreshes should wait.
+    """
+    now = now or datetime.utcnow()
+    limit = current_app.config.get("SERPAPI_MONTHLY_LIMIT", 250)
+    burst = current_app.config.get("REVIEW_REFRESH_BURST", 5)
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    elapsed = (now - month_start) / (month_end - month_start)
+    paced = min(limit, int(limit * elapsed) + burst)
+    return paced - quota.get_usage("serpapi")
+
+
+def due_products(limit, now=None):
+    """
+    Viewed products with an ASIN whose reviews are due and that have no
+    refresh queued, highest priority first.
+
+    Returns:
+        List of (product_id, priority).
+    """
+    if limit <= 0:
+        return []
+    now = now or datetime.utcnow()
+    queued = db.select(ReviewRefreshJob.id).where(ReviewRefreshJob.product_id == ProductFreshness.product_id)
+    return [
+        (product_id, priority)
+        for product_id, priority in db.session.execute(
+            db.select(ProductFreshness.product_id, ProductFreshness.priority)
+            .join(Product, Product.id == ProductFreshness.product_id)
+            .where(
+                ProductFreshness.next_refresh_at <= now,
+                ProductFreshness.view_score > 0,
+                Product.amazon_asin.isnot(None),
+                ~queued.exists(),
+            )
+            .order_by(ProductFreshness.priority.desc())
+            .limit(limit)
+        )
+    ]
+
+
+atexit.register(flush_views)
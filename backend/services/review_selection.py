@@ -0,0 +1,173 @@
+"""Review selection for chat context.
+
+Picks which of a product's reviews go into a Claude prompt under a token
+budget: near-duplicates are dropped, picks alternate between positive,
+mixed and negative reviews so the model sees both sides, and a per-product
+BM25 index ranks reviews by lexical relevance to the user's question.
+"""
+import math
+import re
+from collections import Counter
+
+MAX_REVIEW_CHARS = 500
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reviews sharing this fraction of word 3-grams count as duplicates
+DUPLICATE_JACCARD = 0.8
+
+POSITIVE_THRESHOLD = 0.6
+NEGATIVE_THRESHOLD = 0.4
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in is it its me my of on or so "
+    "that the their them this to was were will with you your what how does do did can".split()
+)
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [t for t in re.findall(r"\w+", (text or "").lower()) if t not in STOPWORDS]
+
+
+def estimate_tokens(text):
+    """Rough Claude token count (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _review_text(review):
+    text = (review.get("text") or "").strip()
+    if len(text) > MAX_REVIEW_CHARS:
+        text = text[:MAX_REVIEW_CHARS] + "..."
+    return text
+
+
+def format_review(review, number):
+    """Render one review for the prompt."""
+    source = review.get("source", "unknown").upper()
+    sentiment = review.get("sentiment_score", 0.5)
+    line = f"[Review {number} | Source: {source} | Sentiment: {sentiment:.2f}]\n{_review_text(review)}"
+    if review.get("pros"):
+        line += f"\nPros: {', '.join(review['pros'])}"
+    if review.get("cons"):
+        line += f"\nCons: {', '.join(review['cons'])}"
+    return line
+
+
+def _shingles(text):
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) < 3:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _sentiment_bucket(review):
+    sentiment = review.get("sentiment_score", 0.5)
+    if sentiment >= POSITIVE_THRESHOLD:
+        return 0
+    if sentiment < NEGATIVE_THRESHOLD:
+        return 2
+    return 1
+
+
+class ReviewIndex:
+    """In-memory BM25 index over one product's reviews."""
+
+    def __init__(self, reviews):
+        self.reviews = reviews
+        self._docs = [
+            Counter(tokenize(" ".join([r.get("text") or ""] + r.get("pros", []) + r.get("cons", []))))
+            for r in reviews
+        ]
+        self._lengths = [sum(doc.values()) for doc in self._docs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freq = Counter()
+        for doc in self._docs:
+            doc_freq.update(doc.keys())
+        n = len(self._docs)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()
+        }
+        self._shingles = [_shingles(r.get("text")) for r in reviews]
+
+    def scores(self, query):
+        """BM25 score of every review for `query` (same order as the reviews)."""
+        terms = [t for t in tokenize(query) if t in self._idf]
+        if not terms:
+            return [0.0] * len(self._docs)
+        results = []
+        for doc, length in zip(self._docs, self._lengths):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / (self._avg_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term, 0)
+                if tf:
+                    score += self._idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            results.append(score)
+        return results
+
+    def is_duplicate(self, i, chosen):
+        """True if review i's text is a near-duplicate of any chosen review."""
+        a = self._shingles[i]
+        for j in chosen:
+            b = self._shingles[j]
+            union = len(a | b)
+            if union and len(a & b) / union >= DUPLICATE_JACCARD:
+                return True
+        return False
+
+    def select(self, budget_tokens, ranking, exclude=(), max_reviews=None):
+        """
+        Fill `budget_tokens` with reviews, taking the best-ranked review from
+        each sentiment bucket in turn and skipping near-duplicates.
+
+        Args:
+            ranking: Review indexes, best first; unlisted reviews are not considered.
+            exclude: Indexes already in the prompt (also used for duplicate checks).
+
+        Returns:
+            Selected review indexes in pick order.
+        """
+        queues = {0: [], 1: [], 2: []}
+        for i in ranking:
+            if i not in exclude:
+                queues[_sentiment_bucket(self.reviews[i])].append(i)
+
+        chosen = []
+        seen = list(exclude)
+        used = 0
+        while any(queues.values()):
+            for bucket in (0, 1, 2):
+                queue = queues[bucket]
+                while queue:
+                    i = queue.pop(0)
+                    if self.is_duplicate(i, seen):
+                        continue
+                    cost = estimate_tokens(format_review(self.reviews[i], 0))
+                    if used + cost > budget_tokens:
+                        continue  # Too big for what's left; a shorter one may still fit
+                    chosen.append(i)
+                    seen.append(i)
+                    used += cost
+                    break
+                if max_reviews and len(chosen) >= max_reviews:
+                    return chosen
+        return chosen
+
+    def overview_ranking(self):
+        """Reviews ordered by how much they say: pros/cons mentioned, then length."""
+        return sorted(
+            range(len(self.reviews)),
+            key=lambda i: (
+                len(self.reviews[i].get("pros", [])) + len(self.reviews[i].get("cons", [])),
+                len(self.reviews[i].get("text") or ""),
+            ),
+            reverse=True,
+        )
+
+    def relevance_ranking(self, query):
+        """Indexes of reviews matching `query`, most relevant first."""
+        scores = self.scores(query)
+        return [i for i in sorted(range(len(scores)), key=lambda i: scores[i], reverse=True) if scores[i] > 0]
@@ -1,29 +1,146 @@
-"""Service for fetching and caching product reviews from SerpApi"""
+"""Service for fetching and caching product reviews from SerpApi.
+
+A refresh diffs the fetched reviews against the stored ones by fingerprint
+(source, text hash, review date). New reviews and reviews whose star rating
+changed are analyzed and upserted, reviews no longer listed are
+soft-expired (expired_at), and unchanged reviews keep their rows, ids and
+analysis. Each kind of write is a single bulk statement.
+"""
+import hashlib
+import json
 import logging
-from datetime import datetime, timedelta
+import uuid
+from datetime import datetime
 from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.product import Product
 from models.review import Review
-from services.serpapi_client import SerpApiClient
-from services.sentiment_service import analyze_reviews
+from services import review_freshness
+from services.local_sentiment import LOCAL_VERSION, score_reviews
+from services.response_cache import bump_catalogue_version
+from services.review_stats import apply_product_totals, replace_source
+from services.serpapi_client import get_serpapi_client
+from services.sentiment_service import ANALYSIS_VERSION, analyze_reviews
+from utils import metrics
 from utils.database import db
 
 logger = logging.getLogger(__name__)
 
+# Rows per upsert statement
+UPSERT_BATCH_SIZE = 500
+
+# Columns refreshed when a fetched review matches a stored fingerprint
+UPSERT_UPDATE_COLUMNS = ("source_rating", "sentiment_score", "pros", "cons", "sentiment_version", "expired_at")
+
+
+def reviews_are_stale(product):
+    """Return True if the product's cached reviews are older than its TTL (see review_freshness)."""
+    return review_freshness.is_stale(product)
+
+
+def review_fingerprint(source, text, date):
+    """Stable identity of a scraped review: its source, text (whitespace-normalized) hash and date."""
+    text_hash = hashlib.sha256(" ".join((text or "").split()).encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{source}\x1f{text_hash}\x1f{date or ''}".encode("utf-8")).hexdigest()
+
+
+def _mark_fetched(product, new_reviews=None):
+    """
+    Record a fetch that changed nothing the product shows. updated_at is kept,
+    so memoized chat prompts and cached responses stay valid.
+    """
+    now = datetime.utcnow()
+    review_freshness.record_refresh(product, now, product.reviews_fetched_at, new_reviews)
+    db.session.execute(
+        update(Product)
+        .where(Product.id == product.id)
+        .values(reviews_fetched_at=now, updated_at=Product.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _analyze(product, review_inputs):
+    """
+    Score reviews locally and send only the ambiguous ones to Claude.
+
+    Returns:
+        List of (result, sentiment_version) in input order. Reviews Claude
+        didn't answer keep the local estimate with no version, so the
+        backfill picks them up.
+    """
+    local_results = score_reviews(review_inputs)
+    threshold = current_app.config.get("LOCAL_SENTIMENT_CONFIDENCE", 0.6)
+    ambiguous = [
+        inp for inp, local in zip(review_inputs, local_results)
+        if local["confidence"] < threshold
+    ]
+
+    # Attempt AI sentiment analysis (returns None on failure)
+    ai_results = None
+    if ambiguous:
+        try:
+            ai_results = analyze_reviews(ambiguous)
+        except Exception as e:
+            logger.warning("AI sentiment analysis failed for product %s: %s", product.id, e)
+    ai_lookup = {result["id"]: result for result in ai_results or []}
+
+    analyzed = []
+    tiers = {"claude": 0, "local": 0, "fallback": 0}
+    for inp, local in zip(review_inputs, local_results):
+        ai = ai_lookup.get(inp["id"])
+        if ai:
+            analyzed.append((ai, ANALYSIS_VERSION))
+            tiers["claude"] += 1
+        elif local["confidence"] >= threshold:
+            analyzed.append((local, LOCAL_VERSION))
+            tiers["local"] += 1
+        else:
+            analyzed.append((local, None))
+            tiers["fallback"] += 1
+
+    for tier, count in tiers.items():
+        if count:
+            metrics.inc("sentiment_reviews_total", (("tier", tier),), count)
+    return analyzed
+
+
+def _upsert_reviews(rows):
+    """Insert review rows, or update the stored review with the same (product, fingerprint)."""
+    dialect = db.engine.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        table = Review.__table__
+        for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+            stmt = insert(table).values(rows[i:i + UPSERT_BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.product_id, table.c.fingerprint],
+                set_={column: stmt.excluded[column] for column in UPSERT_UPDATE_COLUMNS},
+            )
+            db.session.execute(stmt)
+    else:
+        # No portable upsert: fall back to the ORM
+        for row in rows:
+            review = Review.query.filter_by(product_id=row["product_id"], fingerprint=row["fingerprint"]).first()
+            if review:
+                for column in UPSERT_UPDATE_COLUMNS:
+                    setattr(review, column, row[column])
+            else:
+                db.session.add(Review(**row))
+
 
 def fetch_reviews_for_product(product):
     """
     Fetch Amazon reviews for a product if cache is stale.
     Returns True if new reviews were fetched, False if using cache.
     """
-    cache_days = current_app.config.get("REVIEW_CACHE_DAYS", 7)
-
     # Check if reviews are fresh enough
-    if product.reviews_fetched_at:
-        cache_cutoff = datetime.utcnow() - timedelta(days=cache_days)
-        if product.reviews_fetched_at > cache_cutoff:
-            return False  # Cache is still fresh
+    if not reviews_are_stale(product):
+        return False  # Cache is still fresh
 
-    client = SerpApiClient()
+    client = get_serpapi_client()
 
     # Step 1: If we don't have an ASIN, search Amazon for one
     asin = product.amazon_asin
@@ -34,82 +151,122 @@ def fetch_reviews_for_product(product):
             db.session.commit()
         else:
             # Rate limited or no results — mark as attempted
-            product.reviews_fetched_at = datetime.utcnow()
-            db.session.commit()
+            _mark_fetched(product)
             return False
 
     # Step 2: Fetch reviews using ASIN
     raw_reviews = client.get_amazon_reviews(asin, product.id)
     if not raw_reviews:
         # Rate limited or no reviews — mark as attempted
-        product.reviews_fetched_at = datetime.utcnow()
-        db.session.commit()
+        _mark_fetched(product)
         return False
 
-    # Step 3: Delete old Amazon reviews for this product
-    Review.query.filter_by(product_id=product.id, source="amazon").delete()
+    # Step 3: Fingerprint the fetched reviews (the first of any duplicates wins)
+    fetched = {}
+    for raw in raw_reviews:
+        text = raw.get("text", raw.get("title", "No review text"))
+        fetched.setdefault(review_fingerprint("amazon", text, raw.get("date")), (text, raw.get("rating")))
 
-    # Step 4: Prepare reviews for AI analysis
-    review_inputs = []
-    for idx, raw in enumerate(raw_reviews):
-        review_inputs.append({
-            "id": idx,
-            "text": raw.get("text", raw.get("title", "No review text")),
-            "star_rating": raw.get("rating", 3),
-        })
+    # Step 4: Diff against the stored Amazon reviews
+    stored = db.session.execute(
+        db.select(
+            Review.id, Review.fingerprint, Review.text, Review.source_rating, Review.sentiment_score,
+            Review.pros, Review.cons, Review.sentiment_version, Review.scraped_at, Review.expired_at,
+        ).where(Review.product_id == product.id, Review.source == "amazon")
+    ).all()
+    by_fingerprint = {row.fingerprint: row for row in stored if row.fingerprint}
 
-    # Step 5: Attempt AI sentiment analysis (returns None on failure)
-    ai_results = None
-    try:
-        ai_results = analyze_reviews(review_inputs)
-    except Exception as e:
-        logger.warning("AI sentiment analysis failed for product %s: %s", product.id, e)
-
-    # Build lookup from AI results (keyed by index)
-    ai_lookup = {}
-    if ai_results:
-        for result in ai_results:
-            ai_lookup[result["id"]] = result
-
-    # Step 6: Create Review objects with AI or fallback data
-    for idx, raw in enumerate(raw_reviews):
-        star_rating = raw.get("rating")
-        review_text = raw.get("text", raw.get("title", "No review text"))
-
-        ai = ai_lookup.get(idx)
-        if ai:
-            sentiment = ai["sentiment_score"]
-            pros = ai["pros"]
-            cons = ai["cons"]
-        else:
-            # Fallback: star-rating-based sentiment (original formula)
-            sentiment = SerpApiClient.convert_sentiment(star_rating)
-            pros = [raw.get("title", "Positive review")] if sentiment > 0.6 else []
-            cons = [raw.get("title", "Negative review")] if sentiment < 0.3 else []
-
-        review = Review(
-            product_id=product.id,
-            source="amazon",
-            text=review_text,
-            sentiment_score=sentiment,
-            source_rating=float(star_rating) if star_rating else None,
-        )
-        review.set_pros(pros)
-        review.set_cons(cons)
-        db.session.add(review)
+    changed = []  # (fingerprint, text, star rating): new, or star rating changed; needs analysis
+    revived = []  # stored rows listed again with the same rating
+    for fingerprint, (text, star_rating) in fetched.items():
+        row = by_fingerprint.get(fingerprint)
+        if row is None or row.source_rating != (float(star_rating) if star_rating else None):
+            changed.append((fingerprint, text, star_rating))
+        elif row.expired_at is not None:
+            revived.append(row)
+    # Reviews from before fingerprinting have none and are replaced once
+    expired_ids = [
+        row.id for row in stored
+        if row.expired_at is None and (row.fingerprint is None or row.fingerprint not in fetched)
+    ]
 
-    # Step 7: Update product metadata and recalculate rating
-    product.reviews_fetched_at = datetime.utcnow()
-    db.session.flush()
+    if not changed and not revived and not expired_ids:
+        _mark_fetched(product, new_reviews=0)
+        return True
 
-    all_reviews = Review.query.filter_by(product_id=product.id, source="amazon").all()
-    product.review_count = len(all_reviews)
+    # Step 5: Analyze only the new and re-rated reviews
+    analyzed = _analyze(product, [
+        # Unrated reviews are analyzed as 3 stars but stored without a rating
+        {"id": idx, "text": text, "star_rating": star_rating if star_rating is not None else 3}
+        for idx, (_, text, star_rating) in enumerate(changed)
+    ])
 
-    if all_reviews:
-        avg_sentiment = sum(r.sentiment_score for r in all_reviews) / len(all_reviews)
-        product.rating = round(avg_sentiment * 10, 1)
-    else:
-        product.rating = 0.0
+    # Step 6: One upsert for new, re-rated and revived reviews; one update soft-expiring the rest
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": str(uuid.uuid4()),
+            "product_id": product.id,
+            "source": "amazon",
+            "text": text,
+            "fingerprint": fingerprint,
+            "sentiment_score": result["sentiment_score"],
+            "source_rating": float(star_rating) if star_rating else None,
+            "pros": json.dumps(result["pros"]) if result["pros"] else None,
+            "cons": json.dumps(result["cons"]) if result["cons"] else None,
+            "sentiment_version": version,
+            "scraped_at": now,
+            "expired_at": None,
+        }
+        for (fingerprint, text, star_rating), (result, version) in zip(changed, analyzed)
+    ]
+    rows.extend(
+        {
+            "id": row.id,
+            "product_id": product.id,
+            "source": "amazon",
+            "text": row.text,
+            "fingerprint": row.fingerprint,
+            "sentiment_score": row.sentiment_score,
+            "source_rating": row.source_rating,
+            "pros": row.pros,
+            "cons": row.cons,
+            "sentiment_version": row.sentiment_version,
+            "scraped_at": row.scraped_at,
+            "expired_at": None,
+        }
+        for row in revived
+    )
+    if rows:
+        _upsert_reviews(rows)
+    if expired_ids:
+        db.session.execute(
+            update(Review)
+            .where(Review.id.in_(expired_ids))
+            .values(expired_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    # Step 7: Recompute the source's stats from its active reviews, then the product's rating and count
+    written = {row["fingerprint"] for row in rows}
+    active = [
+        Review(sentiment_score=row.sentiment_score, source_rating=row.source_rating, pros=row.pros, cons=row.cons)
+        for row in stored
+        if row.expired_at is None and row.fingerprint in fetched and row.fingerprint not in written
+    ]
+    active.extend(
+        Review(sentiment_score=row["sentiment_score"], source_rating=row["source_rating"],
+               pros=row["pros"], cons=row["cons"])
+        for row in rows
+    )
+    replace_source(product.id, "amazon", active)
+    # Only comparable once the stored reviews carry fingerprints
+    new_reviews = sum(fingerprint not in by_fingerprint for fingerprint, _, _ in changed) if by_fingerprint else None
+    review_freshness.record_refresh(product, now, product.reviews_fetched_at, new_reviews)
+    product.reviews_fetched_at = now
+    # Rating and count cover every source, as in the sentiment backfill
+    apply_product_totals(product)
 
+    bump_catalogue_version()
     db.session.commit()
     return True
@@ -0,0 +1,144 @@
+"""Incremental maintenance of product_review_stats.
+
+Writers call add_reviews() when they insert reviews and replace_source()
+with a source's full set of active reviews after changing it (as a SerpApi
+refresh does), so aggregates are updated from the reviews being written rather
+than by re-reading the reviews table. rebuild_review_stats() recomputes
+everything from reviews, for backfills and repair.
+"""
+import json
+from collections import Counter
+from models.product_review_stats import SENTIMENT_BUCKETS, ProductReviewStats
+from models.review import Review
+from utils.database import db
+
+# Distinct pro/con phrases kept per product and source
+MAX_PHRASES = 200
+
+
+def _bucket(sentiment):
+    sentiment = max(0.0, min(1.0, sentiment or 0.0))
+    return min(int(sentiment * SENTIMENT_BUCKETS), SENTIMENT_BUCKETS - 1)
+
+
+def _normalize(phrase):
+    return " ".join(str(phrase).split())
+
+
+def _merge_phrases(stored, phrases):
+    counts = Counter(stored)
+    counts.update(p for p in (_normalize(p) for p in phrases) if p)
+    return dict(counts.most_common(MAX_PHRASES))
+
+
+def _get_row(product_id, source):
+    row = db.session.get(ProductReviewStats, (product_id, source))
+    if row is None:
+        row = ProductReviewStats(
+            product_id=product_id,
+            source=source,
+            review_count=0,
+            sentiment_sum=0.0,
+            star_rating_sum=0.0,
+            star_rating_count=0,
+        )
+        db.session.add(row)
+    return row
+
+
+def _apply(row, reviews):
+    histogram = row.get_histogram()
+    pros = []
+    cons = []
+    for review in reviews:
+        sentiment = review.sentiment_score or 0.0
+        row.review_count += 1
+        row.sentiment_sum += sentiment
+        histogram[_bucket(sentiment)] += 1
+        if review.source_rating:
+            row.star_rating_sum += review.source_rating
+            row.star_rating_count += 1
+        pros.extend(review.get_pros())
+        cons.extend(review.get_cons())
+
+    row.sentiment_histogram = json.dumps(histogram)
+    row.pros_counts = json.dumps(_merge_phrases(row.get_pros_counts(), pros))
+    row.cons_counts = json.dumps(_merge_phrases(row.get_cons_counts(), cons))
+
+
+def add_reviews(product_id, reviews):
+    """
+    Fold newly written Review objects into the product's stats.
+    Runs in the current session; the caller commits.
+    """
+    by_source = {}
+    for review in reviews:
+        by_source.setdefault(review.source, []).append(review)
+    for source, source_reviews in by_source.items():
+        _apply(_get_row(product_id, source), source_reviews)
+
+
+def replace_source(product_id, source, reviews):
+    """
+    Reset one source's stats to exactly `reviews` (its active reviews after a refresh).
+    Runs in the current session; the caller commits.
+
+    Returns:
+        The ProductReviewStats row for the source.
+    """
+    row = _get_row(product_id, source)
+    row.review_count = 0
+    row.sentiment_sum = 0.0
+    row.star_rating_sum = 0.0
+    row.star_rating_count = 0
+    row.sentiment_histogram = None
+    row.pros_counts = None
+    row.cons_counts = None
+    _apply(row, reviews)
+    return row
+
+
+def apply_product_totals(product, rows=None):
+    """
+    Set product.review_count and product.rating (0-10) from its stats rows,
+    across every source. rows defaults to all of the product's rows.
+    Runs in the current session; the caller commits.
+    """
+    if rows is None:
+        rows = ProductReviewStats.query.filter_by(product_id=product.id).all()
+    total = sum(row.review_count for row in rows)
+    product.review_count = total
+    product.rating = round(sum(row.sentiment_sum for row in rows) / total * 10, 1) if total else 0.0
+
+
+def rebuild_review_stats():
+    """
+    Recompute every product's stats from the reviews table (expired reviews excluded).
+
+    Returns:
+        Number of (product, source) rows written.
+    """
+    ProductReviewStats.query.delete()
+
+    written = 0
+    current = None
+    batch = []
+    query = (
+        Review.query.filter(Review.expired_at.is_(None))
+        .order_by(Review.product_id, Review.source)
+        .yield_per(1000)
+    )
+    for review in query:
+        key = (review.product_id, review.source)
+        if key != current and batch:
+            _apply(_get_row(*current), batch)
+            written += 1
+            batch = []
+        current = key
+        batch.append(review)
+    if batch:
+        _apply(_get_row(*current), batch)
+        written += 1
+
+    db.session.commit()
+    return written
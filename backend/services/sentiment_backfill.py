@@ -0,0 +1,394 @@
+"""Bulk sentiment re-analysis through the Message Batches API.
+
+After a prompt, tool schema or model change every review whose
+sentiment_version differs from ANALYSIS_VERSION is out of date. Instead of
+one synchronous messages.create per packed batch of reviews, the backfill
+submits them as Message Batches (half price, no rate-limit juggling), polls
+until they end, and writes the results back to the reviews in bulk.
+
+Each submitted batch is recorded in sentiment_backfill_batches with the
+review ids behind every request, so an interrupted backfill resumes by
+polling and applying its open batches instead of resubmitting them.
+Reviews whose analysis is already in the sentiment cache are updated
+directly without a request. Reviews the local lexicon scored confidently
+(sentiment_version LOCAL_VERSION) are left alone, as they are on refresh.
+"""
+import json
+import logging
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, or_, update
+from models.product import Product
+from models.product_review_stats import ProductReviewStats
+from models.review import Review
+from models.sentiment_backfill_batch import SentimentBackfillBatch
+from services import sentiment_cache
+from services.local_sentiment import LOCAL_VERSION
+from services.response_cache import bump_catalogue_version
+from services.review_stats import apply_product_totals, replace_source
+from services.sentiment_service import (
+    ANALYSIS_VERSION,
+    SentimentAnalysisError,
+    SentimentOutputError,
+    build_request_params,
+    combine_results,
+    match_results,
+    pack_reviews,
+    split_oversized,
+)
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ("in_progress", "ended")
+
+# Reviews read per query while collecting pending work
+SCAN_CHUNK_SIZE = 1000
+
+# Rows per bulk UPDATE / IN (...) clause
+WRITE_CHUNK_SIZE = 500
+
+
+def _star_rating(value):
+    """The star rating as review_service passes it to Claude (ints stay ints, so cache keys match)."""
+    if value is None:
+        return 3
+    return int(value) if float(value).is_integer() else value
+
+
+def _review_input(review_id, text, source_rating):
+    return {"id": review_id, "text": text, "star_rating": _star_rating(source_rating)}
+
+
+def _open_review_ids():
+    """Review ids already waiting in a submitted batch."""
+    ids = set()
+    for batch in SentimentBackfillBatch.query.filter(SentimentBackfillBatch.status.in_(OPEN_STATUSES)):
+        for review_ids in batch.get_request_map().values():
+            ids.update(review_ids)
+    return ids
+
+
+def _is_pending(version):
+    return and_(
+        Review.expired_at.is_(None),
+        or_(Review.sentiment_version.is_(None), Review.sentiment_version.notin_([version, LOCAL_VERSION])),
+    )
+
+
+def iter_pending_reviews(version=ANALYSIS_VERSION, exclude=frozenset()):
+    """Yield review inputs ("id", "text", "star_rating") whose analysis is not `version` (or local), by id."""
+    last_id = ""
+    while True:
+        rows = db.session.execute(
+            db.select(Review.id, Review.text, Review.source_rating)
+            .where(_is_pending(version), Review.id > last_id)
+            .order_by(Review.id)
+            .limit(SCAN_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return
+        for review_id, text, source_rating in rows:
+            if review_id not in exclude:
+                yield _review_input(review_id, text, source_rating)
+        last_id = rows[-1][0]
+
+
+def count_pending_reviews(version=ANALYSIS_VERSION):
+    """Number of reviews whose analysis is not `version` (or local)."""
+    return db.session.query(Review.id).filter(_is_pending(version)).count()
+
+
+def write_results(inputs, results, version, store=True):
+    """
+    Bulk-write analysis results to their reviews, then refresh the affected
+    products' review stats and ratings. Reviews deleted since submission
+    (e.g. replaced by a refresh) are skipped.
+
+    Args:
+        inputs: Review inputs keyed by review id ("id", "text", "star_rating").
+        results: Parsed results whose "id" is a review id.
+        store: Also add the results to the sentiment cache.
+
+    Returns:
+        Number of reviews updated.
+    """
+    results = [r for r in results if r["id"] in inputs]
+    existing = {}
+    ids = [r["id"] for r in results]
+    for i in range(0, len(ids), WRITE_CHUNK_SIZE):
+        chunk = ids[i:i + WRITE_CHUNK_SIZE]
+        existing.update(db.session.execute(
+            db.select(Review.id, Review.product_id).where(Review.id.in_(chunk))
+        ).all())
+
+    rows = [
+        {
+            "id": r["id"],
+            "sentiment_score": r["sentiment_score"],
+            "pros": json.dumps(r["pros"]) if r["pros"] else None,
+            "cons": json.dumps(r["cons"]) if r["cons"] else None,
+            "sentiment_version": version,
+        }
+        for r in results if r["id"] in existing
+    ]
+    for i in range(0, len(rows), WRITE_CHUNK_SIZE):
+        db.session.execute(update(Review), rows[i:i + WRITE_CHUNK_SIZE])
+
+    if store and version == ANALYSIS_VERSION:
+        sentiment_cache.store(list(inputs.values()), results, version)
+    _refresh_products({existing[row["id"]] for row in rows})
+    return len(rows)
+
+
+def _refresh_products(product_ids):
+    """Recompute review stats, review_count and rating for products whose reviews changed."""
+    product_ids = list(product_ids)
+    now = datetime.utcnow()
+    for i in range(0, len(product_ids), WRITE_CHUNK_SIZE):
+        chunk = product_ids[i:i + WRITE_CHUNK_SIZE]
+        products = Product.query.filter(Product.id.in_(chunk)).all()
+        # Loaded up front so replace_source() and the totals don't query per product
+        stats = {}
+        for row in ProductReviewStats.query.filter(ProductReviewStats.product_id.in_(chunk)):
+            stats.setdefault(row.product_id, {})[row.source] = row
+        reviews = {}
+        for review in Review.query.filter(Review.product_id.in_(chunk), Review.expired_at.is_(None)):
+            reviews.setdefault(review.product_id, {}).setdefault(review.source, []).append(review)
+
+        for product in products:
+            rows = stats.get(product.id, {})
+            for source, source_reviews in reviews.get(product.id, {}).items():
+                rows[source] = replace_source(product.id, source, source_reviews)
+            apply_product_totals(product, list(rows.values()))
+            # Set even when the totals round the same: the chat prompt is memoized per updated_at
+            product.updated_at = now
+
+
+def apply_cached(pending):
+    """
+    Write results already in the sentiment cache. The caller commits.
+
+    Returns:
+        (inputs still needing Claude, number of reviews updated from the cache)
+    """
+    cached = sentiment_cache.lookup(pending, ANALYSIS_VERSION)
+    updated = 0
+    if cached:
+        updated = write_results({r["id"]: r for r in pending}, list(cached.values()), ANALYSIS_VERSION, store=False)
+    return [r for r in pending if r["id"] not in cached], updated
+
+
+def submit_batch(client, packed):
+    """
+    Submit one Message Batch with a request per group of `packed` (the
+    pack_reviews() output: review inputs grouped by estimated tokens, long
+    reviews split across groups).
+
+    Returns:
+        The committed SentimentBackfillBatch row.
+    """
+    requests = []
+    request_map = {}
+    for n, chunk in enumerate(packed):
+        custom_id = f"r{n}"
+        # The prompt numbers reviews 0..n-1; request_map turns them back into review ids
+        prompt_inputs = [dict(r, id=index) for index, r in enumerate(chunk)]
+        requests.append({"custom_id": custom_id, "params": build_request_params(prompt_inputs)})
+        request_map[custom_id] = [r["id"] for r in chunk]
+
+    response = client.messages.batches.create(requests=requests)
+    batch = SentimentBackfillBatch(
+        id=response.id,
+        analysis_version=ANALYSIS_VERSION,
+        status="in_progress",
+        request_map=json.dumps(request_map),
+        request_count=len(requests),
+    )
+    db.session.add(batch)
+    db.session.commit()
+    logger.info("Submitted sentiment batch %s (%d requests)", batch.id, len(requests))
+    return batch
+
+
+def check_batch(client, batch):
+    """
+    Refresh a batch's status from the API; applies its results once it has ended.
+
+    Returns:
+        True once the batch is finished (applied or superseded).
+    """
+    if batch.status == "in_progress":
+        remote = client.messages.batches.retrieve(batch.id)
+        if remote.processing_status != "ended":
+            return False
+        batch.status = "ended"
+        batch.ended_at = datetime.utcnow()
+        db.session.commit()
+
+    if batch.status == "ended":
+        apply_batch(client, batch)
+    return batch.status in ("applied", "superseded")
+
+
+def apply_batch(client, batch):
+    """Write an ended batch's results to its reviews and mark it applied."""
+    if batch.analysis_version != ANALYSIS_VERSION:
+        # The prompt or model changed since submission; these reviews are pending again anyway
+        batch.status = "superseded"
+        db.session.commit()
+        return
+
+    request_map = batch.get_request_map()
+    inputs = {}
+    results = []
+    succeeded = 0
+    errored = 0
+    for entry in client.messages.batches.results(batch.id):
+        review_ids = request_map.get(entry.custom_id)
+        if review_ids is None:
+            continue
+        if entry.result.type != "succeeded":
+            errored += 1
+            continue
+        try:
+            results.extend(match_results(entry.result.message, [{"id": review_id} for review_id in review_ids]))
+            succeeded += 1
+        except SentimentOutputError as e:
+            # Truncated or incomplete output: keep what was answered, the rest stays pending
+            logger.warning("Batch %s request %s: %s", batch.id, entry.custom_id, e)
+            results.extend(e.partial)
+            errored += 1
+        except SentimentAnalysisError as e:
+            logger.warning("Batch %s request %s: %s", batch.id, entry.custom_id, e)
+            errored += 1
+    results = combine_results(results, [{"id": rid} for ids in request_map.values() for rid in ids])
+
+    # Re-read the reviews for the sentiment cache keys (text and rating as submitted)
+    ids = [r["id"] for r in results]
+    for i in range(0, len(ids), WRITE_CHUNK_SIZE):
+        for review_id, text, source_rating in db.session.execute(
+            db.select(Review.id, Review.text, Review.source_rating).where(Review.id.in_(ids[i:i + WRITE_CHUNK_SIZE]))
+        ):
+            inputs[review_id] = _review_input(review_id, text, source_rating)
+
+    updated = write_results(inputs, results, batch.analysis_version)
+    batch.status = "applied"
+    batch.succeeded = succeeded
+    batch.errored = errored
+    batch.reviews_updated = updated
+    batch.applied_at = datetime.utcnow()
+    bump_catalogue_version()
+    db.session.commit()
+    logger.info(
+        "Applied sentiment batch %s: %d requests succeeded, %d failed, %d reviews updated",
+        batch.id, succeeded, errored, updated,
+    )
+
+
+def _batch_cut(packed, requests_per_batch):
+    """
+    Number of leading groups to send as one batch: requests_per_batch, moved
+    back so that no split review has parts in two batches (each batch's
+    results are combined on their own).
+    """
+    def splits_review(cut):
+        return 0 < cut < len(packed) and packed[cut - 1][-1]["id"] == packed[cut][0]["id"]
+
+    cut = min(requests_per_batch, len(packed))
+    while splits_review(cut):
+        cut -= 1
+    if cut == 0:
+        # One review needs more requests than a batch holds: send it whole
+        cut = requests_per_batch
+        while splits_review(cut):
+            cut += 1
+    return cut
+
+
+def submit_pending(client, max_batches=None, requests_per_batch=None):
+    """
+    Submit batches for every pending review not already in an open batch,
+    after writing any results the sentiment cache already has.
+
+    Returns:
+        (submitted SentimentBackfillBatch rows, reviews updated from the cache)
+    """
+    if requests_per_batch is None:
+        requests_per_batch = current_app.config.get("SENTIMENT_BACKFILL_REQUESTS_PER_BATCH", 1000)
+
+    requests_per_batch = max(1, requests_per_batch)
+    submitted = []
+    from_cache = 0
+    waiting = []
+    pending = iter_pending_reviews(exclude=_open_review_ids())
+    while True:
+        chunk = [r for _, r in zip(range(SCAN_CHUNK_SIZE), pending)]
+        if chunk:
+            uncached, updated = apply_cached(chunk)
+            if updated:
+                bump_catalogue_version()
+            db.session.commit()
+            waiting.extend(uncached)
+            from_cache += updated
+
+        # Send full batches; the reviews of a partial one wait for the next scan (or the end)
+        packed = pack_reviews(split_oversized(waiting))
+        while packed and (len(packed) >= requests_per_batch or not chunk):
+            if max_batches is not None and len(submitted) >= max_batches:
+                return submitted, from_cache
+            cut = _batch_cut(packed, requests_per_batch)
+            submitted.append(submit_batch(client, packed[:cut]))
+            packed = packed[cut:]
+        by_id = {r["id"]: r for r in waiting}
+        waiting = list({r["id"]: by_id[r["id"]] for group in packed for r in group}.values())
+        if not chunk:
+            return submitted, from_cache
+
+
+def run_backfill(client, wait=True, poll_seconds=None, max_batches=None, requests_per_batch=None,
+                 batch_ids=None):
+    """
+    Resume open batches, submit the remaining pending reviews, and (with
+    wait) poll until every batch has been applied.
+
+    Args:
+        batch_ids: Only resume these batches (submits nothing new).
+
+    Returns:
+        Dict with batch counts, reviews updated from batch results and from the cache.
+    """
+    if poll_seconds is None:
+        poll_seconds = current_app.config.get("SENTIMENT_BACKFILL_POLL_SECONDS", 60)
+
+    open_batches = SentimentBackfillBatch.query.filter(SentimentBackfillBatch.status.in_(OPEN_STATUSES))
+    if batch_ids:
+        open_batches = open_batches.filter(SentimentBackfillBatch.id.in_(batch_ids))
+    batches = open_batches.order_by(SentimentBackfillBatch.created_at).all()
+    resumed = len(batches)
+
+    submitted = []
+    from_cache = 0
+    if not batch_ids:
+        submitted, from_cache = submit_pending(client, max_batches, requests_per_batch)
+        batches.extend(submitted)
+
+    finished = []
+    while batches:
+        still_open = []
+        for batch in batches:
+            (finished if check_batch(client, batch) else still_open).append(batch)
+        batches = still_open
+        if not batches or not wait:
+            break
+        time.sleep(poll_seconds)
+
+    return {
+        "resumed": resumed,
+        "submitted": len(submitted),
+        "applied": sum(1 for b in finished if b.status == "applied"),
+        "open": len(batches),
+        "reviews_updated": sum(b.reviews_updated or 0 for b in finished),
+        "reviews_from_cache": from_cache,
+    }
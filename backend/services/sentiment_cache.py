@@ -0,0 +1,171 @@
+"""Persistent, content-addressed cache of Claude sentiment results.
+
+Entries are keyed by a hash of (analysis version, star rating, review text),
+so unchanged reviews skip Claude on refresh and a prompt/model change
+invalidates everything automatically.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.sentiment_cache import SentimentCacheEntry
+from services import shared_counters
+from utils.database import db
+
+# Max keys per IN (...) clause (SQLite's default variable limit is 999)
+LOOKUP_CHUNK_SIZE = 500
+
+# Only bump last_used_at on hits older than this, so reads don't write every time
+TOUCH_INTERVAL = timedelta(days=1)
+
+# Hit/miss counters are shared: analysis runs in worker.py, /api/cache-stats on the web process
+STATS = ("hits", "misses", "stores", "evictions")
+
+
+def _count(name, amount=1):
+    shared_counters.add(f"sentiment_cache.{name}", amount)
+
+
+def cache_key(text, star_rating, version):
+    """Hash a review input into a cache key."""
+    payload = f"{version}\x1f{star_rating}\x1f{text}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def lookup(review_texts, version):
+    """
+    Look up cached results for a list of review inputs.
+
+    Args:
+        review_texts: List of dicts with "id", "text", "star_rating" keys.
+        version: Analysis version string (prompt/model fingerprint).
+
+    Returns:
+        Dict of input id -> result dict ("id", "sentiment_score", "pros", "cons").
+    """
+    keys_by_id = {
+        r["id"]: cache_key(r["text"], r["star_rating"], version)
+        for r in review_texts
+    }
+    unique_keys = list(set(keys_by_id.values()))
+
+    entries = {}
+    for i in range(0, len(unique_keys), LOOKUP_CHUNK_SIZE):
+        chunk = unique_keys[i:i + LOOKUP_CHUNK_SIZE]
+        for entry in SentimentCacheEntry.query.filter(SentimentCacheEntry.key.in_(chunk)):
+            entries[entry.key] = entry
+
+    results = {}
+    stale_keys = []
+    touch_cutoff = datetime.utcnow() - TOUCH_INTERVAL
+    for review_id, key in keys_by_id.items():
+        entry = entries.get(key)
+        if not entry:
+            continue
+        results[review_id] = {
+            "id": review_id,
+            "sentiment_score": entry.sentiment_score,
+            "pros": json.loads(entry.pros) if entry.pros else [],
+            "cons": json.loads(entry.cons) if entry.cons else [],
+        }
+        if entry.last_used_at and entry.last_used_at < touch_cutoff:
+            stale_keys.append(key)
+
+    if stale_keys:
+        SentimentCacheEntry.query.filter(
+            SentimentCacheEntry.key.in_(stale_keys[:LOOKUP_CHUNK_SIZE])
+        ).update({"last_used_at": datetime.utcnow()}, synchronize_session=False)
+
+    _count("hits", len(results))
+    _count("misses", len(review_texts) - len(results))
+    return results
+
+
+def store(review_texts, results, version):
+    """
+    Add fresh Claude results to the cache.
+
+    Rows are added to the current session; the caller's commit persists them.
+    """
+    inputs_by_id = {r["id"]: r for r in review_texts}
+    now = datetime.utcnow()
+
+    rows = {}
+    for result in results:
+        review = inputs_by_id.get(result.get("id"))
+        if not review:
+            continue
+        key = cache_key(review["text"], review["star_rating"], version)
+        rows[key] = {
+            "key": key,
+            "sentiment_score": result["sentiment_score"],
+            "pros": json.dumps(result["pros"]) if result["pros"] else None,
+            "cons": json.dumps(result["cons"]) if result["cons"] else None,
+            "created_at": now,
+            "last_used_at": now,
+        }
+    if not rows:
+        return
+
+    # Keys another worker cached in the meantime are left as they are
+    stored = 0
+    values = list(rows.values())
+    dialect = db.engine.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        for i in range(0, len(values), LOOKUP_CHUNK_SIZE):
+            stmt = insert(SentimentCacheEntry.__table__).values(values[i:i + LOOKUP_CHUNK_SIZE])
+            stored += db.session.execute(stmt.on_conflict_do_nothing(index_elements=["key"])).rowcount
+    else:
+        # No portable insert-or-ignore: skip the keys that already exist
+        existing = set()
+        keys = list(rows)
+        for i in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            chunk = keys[i:i + LOOKUP_CHUNK_SIZE]
+            existing.update(
+                key for (key,) in db.session.query(SentimentCacheEntry.key).filter(
+                    SentimentCacheEntry.key.in_(chunk)
+                )
+            )
+        new_rows = [row for key, row in rows.items() if key not in existing]
+        if new_rows:
+            db.session.execute(SentimentCacheEntry.__table__.insert(), new_rows)
+        stored = len(new_rows)
+    _count("stores", stored)
+
+    evict()
+
+
+def evict():
+    """Trim the cache to SENTIMENT_CACHE_MAX_ENTRIES, dropping least recently used entries."""
+    max_entries = current_app.config.get("SENTIMENT_CACHE_MAX_ENTRIES", 100000)
+    total = SentimentCacheEntry.query.count()
+    # 10% headroom so eviction runs in occasional large sweeps, not on every store
+    if total <= max_entries * 1.1:
+        return
+
+    excess = total - max_entries
+    oldest = (
+        db.session.query(SentimentCacheEntry.key)
+        .order_by(SentimentCacheEntry.last_used_at.asc())
+        .limit(excess)
+        .subquery()
+    )
+    SentimentCacheEntry.query.filter(
+        SentimentCacheEntry.key.in_(db.select(oldest.c.key))
+    ).delete(synchronize_session=False)
+    _count("evictions", excess)
+
+
+def get_cache_stats(include_entries=True):
+    """Hit/miss counters across all processes plus (optionally) the current entry count."""
+    counters = shared_counters.get_counters("sentiment_cache")
+    stats = {name: counters.get(name, 0) for name in STATS}
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    if include_entries:
+        stats["entries"] = SentimentCacheEntry.query.count()
+    stats["max_entries"] = current_app.config.get("SENTIMENT_CACHE_MAX_ENTRIES", 100000)
+    return stats
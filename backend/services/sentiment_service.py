@@ -1,11 +1,35 @@
 """AI-powered sentiment analysis and pros/cons extraction using Claude API."""
+import hashlib
+import json
 import logging
+import random
+import re
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 import anthropic
 from flask import current_app
+from services import sentiment_cache
+from services.review_selection import estimate_tokens
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
-BATCH_SIZE = 10
+MAX_OUTPUT_TOKENS = 2048
+
+# Output is packed to this fraction of MAX_OUTPUT_TOKENS, leaving room for estimate error
+OUTPUT_HEADROOM = 0.75
+
+# Estimated tool output per review: id, score and up to 3+3 short phrases
+OUTPUT_TOKENS_PER_REVIEW = 90
+
+# Per-review prompt overhead (the "[Review n] (Star rating: x/5)" line)
+INPUT_TOKENS_PER_REVIEW = 15
+
+# Reviews longer than this are split into parts analyzed separately
+MAX_REVIEW_TOKENS = 1500
+
+SENTIMENT_MODEL = "claude-haiku-4-5-20251001"
 
 SYSTEM_PROMPT = (
     "You are a product review analyst. Analyze each customer review and determine:\n"
@@ -58,11 +82,46 @@ ANALYSIS_TOOL = {
 }
 
 
+# Fingerprint of everything that shapes the analysis; cached results from an
+# older prompt, tool schema or model are never reused.
+ANALYSIS_VERSION = hashlib.sha256(
+    json.dumps([SENTIMENT_MODEL, SYSTEM_PROMPT, ANALYSIS_TOOL], sort_keys=True).encode("utf-8")
+).hexdigest()[:16]
+
+
 class SentimentAnalysisError(Exception):
     """Raised when AI sentiment analysis fails."""
     pass
 
 
+class SentimentOutputError(SentimentAnalysisError):
+    """Raised when Claude's output was truncated or didn't cover every review in the batch."""
+
+    def __init__(self, message, partial=(), missing=()):
+        super().__init__(message)
+        self.partial = list(partial)  # Results for the reviews that were answered
+        self.missing = list(missing)  # Inputs still needing analysis
+
+
+class SentimentRateLimitError(SentimentAnalysisError):
+    """Raised when a batch was rejected by Claude's rate limiter and can be retried."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after_seconds(error):
+    """Read the retry-after header from an Anthropic RateLimitError, if present."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
 def _build_prompt(reviews):
     """Build the user message for a batch of reviews."""
     lines = ["Analyze the following product reviews:\n"]
@@ -74,12 +133,18 @@ def _build_prompt(reviews):
 
 
 def _parse_response(reviews_data):
-    """Validate and normalize structured output from Claude."""
+    """Validate and normalize structured output from Claude (malformed items are skipped)."""
     results = []
     for item in reviews_data:
+        if not isinstance(item, dict):
+            continue
+        try:
+            sentiment = float(item.get("sentiment_score", 0.5))
+        except (TypeError, ValueError):
+            continue
         result = {
             "id": item.get("id"),
-            "sentiment_score": max(0.0, min(1.0, float(item.get("sentiment_score", 0.5)))),
+            "sentiment_score": max(0.0, min(1.0, sentiment)),
             "pros": [],
             "cons": [],
         }
@@ -93,73 +158,358 @@ def _parse_response(reviews_data):
     return results
 
 
-def analyze_reviews_batch(review_texts):
+def build_request_params(review_texts):
+    """Messages API parameters for analyzing one batch (shared by the sync and Batches paths)."""
+    return {
+        "model": SENTIMENT_MODEL,
+        "max_tokens": MAX_OUTPUT_TOKENS,
+        "system": SYSTEM_PROMPT,
+        "messages": [{"role": "user", "content": _build_prompt(review_texts)}],
+        "tools": [ANALYSIS_TOOL],
+        "tool_choice": {"type": "tool", "name": "submit_review_analysis"},
+    }
+
+
+def parse_analysis(message):
     """
-    Analyze a batch of reviews (up to BATCH_SIZE) using Claude Haiku.
+    Extract the analysis results from a Claude message.
+
+    Raises:
+        SentimentAnalysisError if the message has no analysis tool call.
+    """
+    for block in message.content:
+        if block.type == "tool_use" and block.name == "submit_review_analysis":
+            reviews = block.input.get("reviews", []) if isinstance(block.input, dict) else []
+            return _parse_response(reviews if isinstance(reviews, list) else [])
+
+    raise SentimentOutputError("No tool_use block found in Claude response")
 
-    Args:
-        review_texts: List of dicts with "id", "text", "star_rating" keys.
+
+def match_results(message, review_texts):
+    """
+    Map a response for a prompt numbered 0..n-1 back to the inputs' ids.
 
     Returns:
-        List of dicts with "id", "sentiment_score", "pros", "cons" keys.
+        Results keyed by the original review ids, in input order.
 
     Raises:
-        SentimentAnalysisError on any failure.
+        SentimentOutputError if the output was truncated, had no analysis
+        tool call or skipped reviews; its partial/missing attributes say
+        which reviews were answered.
+    """
+    if getattr(message, "stop_reason", None) == "max_tokens":
+        # The tool call was cut off mid-JSON; none of it can be trusted
+        raise SentimentOutputError("Claude response hit max_tokens", missing=review_texts)
+
+    try:
+        items = parse_analysis(message)
+    except SentimentOutputError as e:
+        # No analysis at all: every review in the batch still needs one
+        raise SentimentOutputError(str(e), missing=review_texts) from e
+
+    answered = {}
+    for item in items:
+        index = item["id"]
+        if isinstance(index, int) and 0 <= index < len(review_texts) and index not in answered:
+            answered[index] = dict(item, id=review_texts[index]["id"])
+
+    results = [answered[i] for i in sorted(answered)]
+    if len(answered) < len(review_texts):
+        missing = [r for i, r in enumerate(review_texts) if i not in answered]
+        raise SentimentOutputError(
+            f"Claude response covered {len(answered)} of {len(review_texts)} reviews",
+            partial=results, missing=missing,
+        )
+    return results
+
+
+def _split_text(text, max_chars):
+    """Split text into parts of at most max_chars, at sentence boundaries where possible."""
+    parts = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        while len(sentence) > max_chars:
+            # A single overlong sentence: cut at the last space before the limit
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            parts.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_oversized(review_texts, max_tokens=MAX_REVIEW_TOKENS):
+    """
+    Split reviews longer than max_tokens into several inputs sharing the
+    review's id; combine_results() merges their results again.
+    """
+    inputs = []
+    for review in review_texts:
+        text = review["text"] or ""
+        if estimate_tokens(text) <= max_tokens:
+            inputs.append(review)
+            continue
+        for part in _split_text(text, max_tokens * 4):
+            inputs.append(dict(review, text=part))
+    return inputs
+
+
+def pack_reviews(review_texts, input_budget=None, max_reviews=None):
+    """
+    Group reviews into request batches by estimated tokens: each batch's
+    prompt stays within input_budget and its tool output within
+    OUTPUT_HEADROOM of MAX_OUTPUT_TOKENS. Input order is kept.
+
+    Returns:
+        List of batches (lists of review inputs).
+    """
+    if input_budget is None:
+        input_budget = current_app.config.get("SENTIMENT_BATCH_INPUT_TOKENS", 8000)
+    if max_reviews is None:
+        max_reviews = current_app.config.get("SENTIMENT_BATCH_MAX_REVIEWS", 25)
+    max_reviews = max(1, min(max_reviews, int(MAX_OUTPUT_TOKENS * OUTPUT_HEADROOM) // OUTPUT_TOKENS_PER_REVIEW))
+
+    batches = []
+    current = []
+    used = 0
+    for review in review_texts:
+        cost = estimate_tokens(review["text"] or "") + INPUT_TOKENS_PER_REVIEW
+        if current and (used + cost > input_budget or len(current) >= max_reviews):
+            batches.append(current)
+            current = []
+            used = 0
+        current.append(review)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def combine_results(results, inputs=None):
     """
+    Merge results that share an id (parts of a split review), keeping
+    first-seen order. With `inputs` (the split_oversized() output), a review
+    missing the result for any of its parts is left out rather than judged
+    on part of its text.
+    """
+    combined = {}
+    counts = {}
+    for result in results:
+        existing = combined.get(result["id"])
+        if existing is None:
+            combined[result["id"]] = dict(result, pros=list(result["pros"]), cons=list(result["cons"]))
+            counts[result["id"]] = 1
+            continue
+        n = counts[result["id"]]
+        existing["sentiment_score"] = (existing["sentiment_score"] * n + result["sentiment_score"]) / (n + 1)
+        counts[result["id"]] = n + 1
+        for key in ("pros", "cons"):
+            for phrase in result[key]:
+                if len(existing[key]) < 3 and phrase not in existing[key]:
+                    existing[key].append(phrase)
+    if inputs is not None:
+        parts = Counter(r["id"] for r in inputs)
+        return [r for r in combined.values() if counts[r["id"]] >= parts[r["id"]]]
+    return list(combined.values())
+
+
+def _get_client():
+    """Create a Claude client from app config."""
     api_key = current_app.config.get("ANTHROPIC_API_KEY", "")
     if not api_key:
         raise SentimentAnalysisError("ANTHROPIC_API_KEY not configured")
+    return anthropic.Anthropic(api_key=api_key)
+
 
-    client = anthropic.Anthropic(api_key=api_key)
-    user_prompt = _build_prompt(review_texts)
+def analyze_reviews_batch(review_texts, client=None):
+    """
+    Analyze one packed batch of reviews (see pack_reviews) using Claude Haiku.
+
+    Args:
+        review_texts: List of dicts with "id", "text", "star_rating" keys.
+        client: Optional shared anthropic.Anthropic client (safe to use from
+            worker threads, which have no Flask app context).
+
+    Returns:
+        List of dicts with "id", "sentiment_score", "pros", "cons" keys.
+
+    Raises:
+        SentimentRateLimitError if Claude rate limited the batch.
+        SentimentOutputError if the output was truncated or incomplete.
+        SentimentAnalysisError on any other failure.
+    """
+    if client is None:
+        client = _get_client()
 
+    # Reviews are numbered by position in the prompt, whatever their ids
+    prompt_inputs = [dict(r, id=i) for i, r in enumerate(review_texts)]
     try:
-        response = client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=2048,
-            system=SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": user_prompt}],
-            tools=[ANALYSIS_TOOL],
-            tool_choice={"type": "tool", "name": "submit_review_analysis"},
-        )
+        with metrics.timed(
+            "external_api_duration_seconds",
+            (("api", "anthropic"), ("operation", "sentiment")),
+            error_counter="external_api_errors_total",
+        ):
+            response = client.messages.create(**build_request_params(prompt_inputs))
     except anthropic.APIConnectionError as e:
         raise SentimentAnalysisError(f"Could not connect to Claude API: {e}")
     except anthropic.RateLimitError as e:
-        raise SentimentAnalysisError(f"Claude API rate limit reached: {e}")
+        raise SentimentRateLimitError(
+            f"Claude API rate limit reached: {e}", retry_after=_retry_after_seconds(e)
+        )
     except anthropic.AuthenticationError as e:
         raise SentimentAnalysisError(f"Invalid Anthropic API key: {e}")
     except Exception as e:
         raise SentimentAnalysisError(f"Claude API call failed: {e}")
 
-    for block in response.content:
-        if block.type == "tool_use" and block.name == "submit_review_analysis":
-            return _parse_response(block.input.get("reviews", []))
+    metrics.inc("claude_tokens_total", (("operation", "sentiment"), ("kind", "input")), response.usage.input_tokens)
+    metrics.inc("claude_tokens_total", (("operation", "sentiment"), ("kind", "output")), response.usage.output_tokens)
 
-    raise SentimentAnalysisError("No tool_use block found in Claude response")
+    return match_results(response, review_texts)
+
+
+def _run_batches(client, batches, concurrency):
+    """
+    Run the given batches on a bounded thread pool. A batch whose output was
+    truncated or incomplete keeps the reviews that were answered and the
+    rest are retried as two halves; a single review that still fails is
+    left out (its caller falls back for that review only).
+
+    Returns:
+        (results, rate_limited, retry_after): rate_limited lists batches to retry.
+
+    Raises:
+        SentimentAnalysisError if any batch fails for a reason other than
+        rate limiting or bad output.
+    """
+    results = []
+    rate_limited = []
+    retry_after = None
+
+    pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(batches))))
+    try:
+        futures = {pool.submit(analyze_reviews_batch, batch, client): batch for batch in batches}
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = futures.pop(future)
+                try:
+                    results.extend(future.result())
+                except SentimentRateLimitError as e:
+                    rate_limited.append(batch)
+                    if e.retry_after is not None:
+                        retry_after = max(retry_after or 0, e.retry_after)
+                except SentimentOutputError as e:
+                    results.extend(e.partial)
+                    missing = e.missing
+                    if len(missing) > 1:
+                        half = len(missing) // 2
+                        logger.info("Sentiment batch output incomplete (%s); retrying %d reviews as halves",
+                                    e, len(missing))
+                        for part in (missing[:half], missing[half:]):
+                            futures[pool.submit(analyze_reviews_batch, part, client)] = part
+                    else:
+                        logger.warning("Sentiment analysis failed for %d review(s): %s", len(missing), e)
+    finally:
+        # On a hard failure, don't start batches whose results will be discarded
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return results, rate_limited, retry_after
 
 
 def analyze_reviews(review_texts):
     """
-    Public entry point. Splits reviews into batches, analyzes each.
+    Public entry point. Serves unchanged reviews from the sentiment cache and
+    sends only new or changed ones to Claude.
 
     Returns:
-        Combined results list on success, or None if any batch fails
-        (signaling caller to use fallback for ALL reviews).
+        Combined results list (in input order) on success, or None if any
+        batch fails (signaling caller to use fallback for ALL reviews).
+        Reviews Claude's output never covered are missing from the list;
+        the caller falls back for just those.
     """
     if not review_texts:
         return []
 
+    cached = sentiment_cache.lookup(review_texts, ANALYSIS_VERSION)
+    misses = [r for r in review_texts if r["id"] not in cached]
+
+    fresh = {}
+    if misses:
+        fresh_results = _analyze_uncached(misses)
+        if fresh_results is None:
+            return None
+        sentiment_cache.store(misses, fresh_results, ANALYSIS_VERSION)
+        fresh = {result["id"]: result for result in fresh_results}
+
     all_results = []
-    for i in range(0, len(review_texts), BATCH_SIZE):
-        batch = review_texts[i:i + BATCH_SIZE]
+    for r in review_texts:
+        result = cached.get(r["id"]) or fresh.get(r["id"])
+        if result:
+            all_results.append(result)
+    return all_results
+
+
+def _analyze_uncached(review_texts):
+    """
+    Pack reviews into token-budgeted batches (splitting very long ones) and
+    analyze them concurrently with Claude (up to SENTIMENT_CONCURRENCY at a time).
+
+    Rate-limited batches are retried with exponential backoff, keeping the
+    results of batches that already succeeded.
+
+    Returns:
+        Combined results list on success, or None if a batch fails outright
+        or stays rate limited. Reviews whose output couldn't be parsed even
+        on their own are left out.
+    """
+    concurrency = current_app.config.get("SENTIMENT_CONCURRENCY", 4)
+    max_retries = current_app.config.get("SENTIMENT_MAX_RETRIES", 3)
+    retry_base = current_app.config.get("SENTIMENT_RETRY_BASE_SECONDS", 2.0)
+
+    try:
+        client = _get_client()
+    except SentimentAnalysisError as e:
+        logger.warning("AI sentiment analysis unavailable, falling back: %s", e)
+        return None
+
+    inputs = split_oversized(review_texts)
+    pending = pack_reviews(inputs)
+    all_results = []
+
+    for attempt in range(max_retries + 1):
         try:
-            batch_results = analyze_reviews_batch(batch)
-            all_results.extend(batch_results)
+            results, pending, retry_after = _run_batches(client, pending, concurrency)
         except SentimentAnalysisError as e:
-            logger.warning(
-                "AI sentiment batch %d-%d failed, falling back: %s",
-                i, i + len(batch), e,
-            )
+            logger.warning("AI sentiment batch failed, falling back: %s", e)
             return None
 
-    return all_results
+        all_results.extend(results)
+        if not pending:
+            break
+
+        if attempt < max_retries:
+            delay = retry_base * (2 ** attempt) * random.uniform(0.5, 1.5)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+            logger.info(
+                "Retrying %d rate-limited sentiment batch(es) in %.1fs",
+                len(pending), delay,
+            )
+            time.sleep(delay)
+    else:
+        logger.warning(
+            "%d AI sentiment batch(es) still rate limited after %d retries, falling back",
+            len(pending), max_retries,
+        )
+        return None
+
+    return combine_results(all_results, inputs)
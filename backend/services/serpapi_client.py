@@ -1,57 +1,52 @@
 """SerpApi client for Amazon product search and review fetching"""
-import requests
-from datetime import datetime
+import threading
 from flask import current_app
-from models.api_usage import ApiUsage
-from utils.database import db
+from services import http_client, quota
+from utils import metrics
 
 SERPAPI_BASE_URL = "https://serpapi.com/search"
 
+# Calls kept in reserve below SERPAPI_MONTHLY_LIMIT
+QUOTA_BUFFER = 10
+
+_clients = {}
+_clients_lock = threading.Lock()
+
 
 class SerpApiClient:
     def __init__(self, api_key=None):
         self.api_key = api_key or current_app.config.get("SERPAPI_API_KEY", "")
 
-    def _get_monthly_usage(self):
-        """Count SerpApi calls this month"""
-        now = datetime.utcnow()
-        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        return ApiUsage.query.filter(
-            ApiUsage.api_name == "serpapi",
-            ApiUsage.called_at >= month_start,
-        ).count()
-
-    def _can_make_request(self):
-        """Check if we're within the monthly limit (with 10-call buffer)"""
+    def _reserve_call(self):
+        """Reserve a call slot within the monthly limit (with 10-call buffer); returns its period or None"""
         limit = current_app.config.get("SERPAPI_MONTHLY_LIMIT", 250)
-        usage = self._get_monthly_usage()
-        return usage < (limit - 10)
-
-    def _log_usage(self, endpoint, product_id=None):
-        """Log an API call for tracking"""
-        usage = ApiUsage(
-            api_name="serpapi",
-            endpoint=endpoint,
-            product_id=product_id,
-        )
-        db.session.add(usage)
-        db.session.commit()
+        return quota.reserve("serpapi", limit - QUOTA_BUFFER)
 
     def _request(self, params, product_id=None):
         """Make an authenticated SerpApi request with usage tracking"""
         if not self.api_key:
             raise ValueError("SERPAPI_API_KEY not configured")
 
-        if not self._can_make_request():
+        period = self._reserve_call()
+        if not period:
             return None  # Rate limited
 
         params["api_key"] = self.api_key
         endpoint = params.get("engine", "unknown")
 
-        response = requests.get(SERPAPI_BASE_URL, params=params, timeout=20)
-        response.raise_for_status()
-
-        self._log_usage(endpoint, product_id)
+        try:
+            with metrics.timed(
+                "external_api_duration_seconds",
+                (("api", "serpapi"), ("operation", endpoint)),
+                error_counter="external_api_errors_total",
+            ):
+                response = http_client.get(SERPAPI_BASE_URL, params=params)
+                response.raise_for_status()
+        except Exception:
+            quota.release("serpapi", period)
+            raise
+
+        quota.record_call("serpapi", endpoint, product_id)
         return response.json()
 
     def search_amazon_products(self, query, product_id=None):
@@ -148,7 +143,7 @@ class SerpApiClient:
     def get_usage_stats(self):
         """Return current month's usage statistics"""
         limit = current_app.config.get("SERPAPI_MONTHLY_LIMIT", 250)
-        usage = self._get_monthly_usage()
+        usage = quota.get_usage("serpapi")
         return {
             "used": usage,
             "limit": limit,
@@ -162,3 +157,13 @@ class SerpApiClient:
             return 0.5
         rating = max(1, min(5, float(star_rating)))
         return round((rating - 1) / 4.0, 2)
+
+
+def get_serpapi_client():
+    """Return the process-wide SerpApiClient for the configured API key."""
+    api_key = current_app.config.get("SERPAPI_API_KEY", "")
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.setdefault(api_key, SerpApiClient(api_key))
+    return client
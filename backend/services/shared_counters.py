@@ -0,0 +1,108 @@
+"""Cumulative counters shared across web and worker processes.
+
+Stats kept in process memory are invisible to the web process when the
+work happens in worker.py. Counters added here are buffered per process
+and folded into the stat_counters table in batches (value = value + delta),
+so any process can read the totals.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models.stat_counter import StatCounter
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# Flush the buffer when it holds this many distinct counters or is this old
+FLUSH_SIZE = 50
+FLUSH_SECONDS = 30
+
+_lock = threading.Lock()
+_buffer = Counter()
+_engine = None
+_oldest = None
+
+
+def add(name, amount=1):
+    """Add to a shared counter; written to the database in batches."""
+    global _engine, _oldest
+
+    if not amount:
+        return
+    with _lock:
+        _engine = db.engine
+        if not _buffer:
+            _oldest = time.monotonic()
+        _buffer[name] += amount
+        due = len(_buffer) >= FLUSH_SIZE or time.monotonic() - _oldest >= FLUSH_SECONDS
+
+    if due:
+        flush()
+
+
+def flush():
+    """Fold buffered deltas into stat_counters in one statement."""
+    global _oldest
+
+    with _lock:
+        deltas = dict(_buffer)
+        _buffer.clear()
+        _oldest = None
+        engine = _engine
+    if not deltas or engine is None:
+        return
+
+    now = datetime.utcnow()
+    table = StatCounter.__table__
+    try:
+        with engine.begin() as conn:
+            dialect = conn.dialect.name
+            if dialect in ("sqlite", "postgresql"):
+                insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+                stmt = insert(table).values([
+                    {"name": name, "value": value, "updated_at": now} for name, value in deltas.items()
+                ])
+                conn.execute(stmt.on_conflict_do_update(
+                    index_elements=[table.c.name],
+                    set_={"value": table.c.value + stmt.excluded.value, "updated_at": stmt.excluded.updated_at},
+                ))
+            else:
+                for name, value in deltas.items():
+                    updated = conn.execute(
+                        table.update()
+                        .where(table.c.name == name)
+                        .values(value=table.c.value + value, updated_at=now)
+                    ).rowcount
+                    if not updated:
+                        conn.execute(table.insert(), {"name": name, "value": value, "updated_at": now})
+    except Exception as e:
+        logger.warning("Failed to write %d shared counters: %s", len(deltas), e)
+
+
+def get_counters(prefix):
+    """
+    Totals of the counters named "<prefix>.*", including this process's unflushed deltas.
+
+    Returns:
+        Dict of name (without the prefix) -> value.
+    """
+    start = f"{prefix}."
+    totals = Counter({
+        name[len(start):]: value
+        for name, value in db.session.query(StatCounter.name, StatCounter.value).filter(
+            StatCounter.name.startswith(start, autoescape=True)
+        )
+    })
+    with _lock:
+        for name, value in _buffer.items():
+            if name.startswith(start):
+                totals[name[len(start):]] += value
+    return dict(totals)
+
+
+atexit.register(flush)
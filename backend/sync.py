@@ -1,16 +1,22 @@
 """
 Sync script to populate products from Amazon via SerpApi.
-Run: python sync.py [--clean] [--limit N]
+Run: python sync.py [--clean] [--limit N] [--restart] [--concurrency N]
 
 Each search query costs 1 SerpApi call (~20 results per call).
 Default config uses ~10 queries = ~10 of your 250 monthly calls.
 """
 import argparse
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app import create_app
 from models.product import Product
 from models.category import Category
-from services.serpapi_client import SerpApiClient
+from models.sync_checkpoint import SyncCheckpoint
+from services.response_cache import bump_catalogue_version
+from services.serpapi_client import get_serpapi_client
 from utils.database import db
 
 
@@ -91,6 +97,12 @@ CATEGORY_SEARCHES = {
     ],
 }
 
+# Rows per bulk upsert statement / ASIN lookup
+UPSERT_BATCH_SIZE = 500
+
+# Columns refreshed when a synced ASIN already exists
+UPSERT_UPDATE_COLUMNS = ("name", "price", "rating", "review_count", "image_url", "source_url", "updated_at")
+
 # All categories to ensure exist (even those without search queries yet)
 ALL_CATEGORIES = {
     "electronics": "Electronics",
@@ -111,6 +123,11 @@ def run_migrations():
         "ALTER TABLE products ADD COLUMN amazon_asin VARCHAR(20)",
         "ALTER TABLE products ADD COLUMN reviews_fetched_at DATETIME",
         "ALTER TABLE reviews ADD COLUMN source_rating FLOAT",
+        "ALTER TABLE reviews ADD COLUMN sentiment_version VARCHAR(16)",
+        "ALTER TABLE reviews ADD COLUMN fingerprint VARCHAR(64)",
+        "ALTER TABLE reviews ADD COLUMN expired_at DATETIME",
+        "ALTER TABLE review_refresh_jobs ADD COLUMN priority FLOAT NOT NULL DEFAULT 0",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_reviews_product_fingerprint ON reviews (product_id, fingerprint)",
         "ALTER TABLE products ALTER COLUMN name TYPE VARCHAR(500)",
         "ALTER TABLE products ALTER COLUMN source_url TYPE TEXT",
     ]
@@ -145,8 +162,115 @@ def convert_amazon_rating(rating):
     return round(float(rating) * 2.0, 1)
 
 
-def sync_products(limit_per_query=10, clean=False):
-    """Sync products from Amazon via SerpApi"""
+def parse_search_results(products, category_slug, limit_per_query):
+    """
+    Turn SerpApi search results into product rows.
+
+    Returns:
+        (rows, skipped): rows are dicts ready for upsert_products().
+    """
+    rows = []
+    skipped = 0
+    for p in products[:limit_per_query]:
+        asin = p.get("asin")
+        if not asin:
+            continue
+
+        title = p.get("title", "").strip()[:500]
+        if not title:
+            continue
+
+        price = p.get("price")
+
+        # Skip products without a price
+        if not price or price <= 0:
+            skipped += 1
+            continue
+
+        rows.append({
+            "amazon_asin": asin,
+            "name": title,
+            "category": category_slug,
+            "price": price,
+            "rating": convert_amazon_rating(p.get("rating")),
+            "review_count": p.get("reviews_count") or 0,
+            "image_url": p.get("image", ""),
+            "source_url": p.get("link", ""),
+        })
+    return rows, skipped
+
+
+def upsert_products(rows):
+    """
+    Insert or update product rows by ASIN in bulk.
+    New products keep the category of the query that found them first.
+
+    Returns:
+        (inserted, updated)
+    """
+    if not rows:
+        return 0, 0
+
+    # One IN (...) lookup per batch instead of one query per product
+    asins = list(rows)
+    existing = set()
+    for i in range(0, len(asins), UPSERT_BATCH_SIZE):
+        chunk = asins[i:i + UPSERT_BATCH_SIZE]
+        existing.update(
+            asin for (asin,) in db.session.query(Product.amazon_asin).filter(
+                Product.amazon_asin.in_(chunk)
+            )
+        )
+
+    now = datetime.utcnow()
+    values = []
+    for asin, row in rows.items():
+        values.append({
+            **row,
+            "id": str(uuid.uuid4()),
+            "description": "",  # Filled when reviews are fetched
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    dialect = db.engine.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        table = Product.__table__
+        for i in range(0, len(values), UPSERT_BATCH_SIZE):
+            stmt = insert(table).values(values[i:i + UPSERT_BATCH_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.amazon_asin],
+                set_={column: stmt.excluded[column] for column in UPSERT_UPDATE_COLUMNS},
+            )
+            db.session.execute(stmt)
+    else:
+        # No portable upsert: fall back to the ORM
+        for value in values:
+            product = Product.query.filter_by(amazon_asin=value["amazon_asin"]).first()
+            if product:
+                for column in UPSERT_UPDATE_COLUMNS:
+                    setattr(product, column, value[column])
+            else:
+                db.session.add(Product(**value))
+
+    return len(rows) - len(existing), len(existing)
+
+
+def _search(app, client, query):
+    """Run one SerpApi search on a worker thread."""
+    with app.app_context():
+        return client.search_amazon_products(query)
+
+
+def sync_products(limit_per_query=10, clean=False, restart=False, concurrency=None):
+    """
+    Sync products from Amazon via SerpApi.
+
+    Searches run concurrently (each still reserves a slot from the monthly
+    quota). Completed queries are checkpointed, so re-running after an
+    interrupted sync skips them; pass restart=True to ignore checkpoints.
+    """
     app = create_app()
 
     with app.app_context():
@@ -156,98 +280,109 @@ def sync_products(limit_per_query=10, clean=False):
             print("Cleaning existing data...")
             from models.review import Review
             from models.api_usage import ApiUsage
+            from models.api_quota import ApiQuota
+            from models.review_refresh_job import ReviewRefreshJob
+            from models.product_review_stats import ProductReviewStats
+            from models.product_freshness import ProductFreshness
+            from services import quota
+            ReviewRefreshJob.query.delete()
+            ProductFreshness.query.delete()
+            ProductReviewStats.query.delete()
             Review.query.delete()
             Product.query.delete()
             Category.query.delete()
             ApiUsage.query.delete()
+            ApiQuota.query.delete()
+            SyncCheckpoint.query.delete()
             db.session.commit()
+            quota.reset_caches()
         else:
             run_migrations()
 
+        if restart:
+            SyncCheckpoint.query.delete()
+            db.session.commit()
+
         ensure_categories()
 
-        client = SerpApiClient()
+        if concurrency is None:
+            concurrency = app.config.get("SYNC_CONCURRENCY", 4)
+
+        done = {c.search_query for c in SyncCheckpoint.query.all()}
+        pending = [
+            (category_slug, query)
+            for category_slug, queries in CATEGORY_SEARCHES.items()
+            for query in queries
+            if query not in done
+        ]
+        if done:
+            print(f"Resuming: skipping {len(done)} already-synced queries")
+
+        client = get_serpapi_client()
         total_synced = 0
         total_updated = 0
         total_skipped = 0
         api_calls = 0
 
-        for category_slug, queries in CATEGORY_SEARCHES.items():
-            category_name = ALL_CATEGORIES.get(category_slug, category_slug)
-            print(f"\n{'='*50}")
-            print(f"Category: {category_name}")
-
-            for query in queries:
-                print(f"\n  Searching: \"{query}\"")
-                api_calls += 1
-
-                try:
-                    products = client.search_amazon_products(query)
-                except Exception as e:
-                    print(f"  Error: {e}")
-                    continue
-
-                if not products:
-                    print("  No results (possibly rate limited)")
-                    continue
-
-                # Limit results per query
-                products = products[:limit_per_query]
-                print(f"  Found {len(products)} products")
-
-                for p in products:
-                    asin = p.get("asin")
-                    if not asin:
-                        continue
-
-                    title = p.get("title", "").strip()[:500]
-                    if not title:
-                        continue
-
-                    price = p.get("price")
-                    rating = convert_amazon_rating(p.get("rating"))
-                    reviews_count = p.get("reviews_count") or 0
-                    image_url = p.get("image", "")
-                    link = p.get("link", "")
-
-                    # Skip products without a price
-                    if not price or price <= 0:
-                        total_skipped += 1
-                        continue
-
-                    # Upsert by ASIN
-                    existing = Product.query.filter_by(amazon_asin=asin).first()
-                    if existing:
-                        existing.name = title
-                        existing.price = price
-                        existing.rating = rating
-                        existing.review_count = reviews_count
-                        existing.image_url = image_url
-                        existing.source_url = link
-                        existing.updated_at = datetime.utcnow()
-                        total_updated += 1
-                    else:
-                        product = Product(
-                            name=title,
-                            description="",  # Filled when reviews are fetched
-                            category=category_slug,
-                            price=price,
-                            rating=rating,
-                            review_count=reviews_count,
-                            image_url=image_url,
-                            source_url=link,
-                            amazon_asin=asin,
-                        )
-                        db.session.add(product)
-                        total_synced += 1
-
-                db.session.commit()
-
-        # Update category product counts
-        for slug in ALL_CATEGORIES:
-            cat = Category.query.filter_by(slug=slug).first()
-            if cat:
-                cat.product_count = Product.query.filter_by(category=slug).count()
+        # Each query's rows and checkpoint are committed together as it completes,
+        # so an interrupted sync never repeats a finished query nor checkpoints
+        # one whose products weren't written
+        handled = set()
+
+        def save(future):
+            nonlocal total_synced, total_updated, total_skipped, api_calls
+            category_slug, query = futures[future]
+            api_calls += 1
+            print(f"\n  [{ALL_CATEGORIES.get(category_slug, category_slug)}] \"{query}\"")
+
+            try:
+                products = future.result()
+            except Exception as e:
+                print(f"  Error: {e}")
+                return
+
+            if not products:
+                print("  No results (possibly rate limited)")
+                return
+
+            rows, skipped = parse_search_results(products, category_slug, limit_per_query)
+            total_skipped += skipped
+            print(f"  Found {len(rows)} products")
+
+            inserted, updated = upsert_products({row["amazon_asin"]: row for row in rows})
+            total_synced += inserted
+            total_updated += updated
+            db.session.add(SyncCheckpoint(search_query=query, category=category_slug, products_found=len(rows)))
+            bump_catalogue_version()
+            db.session.commit()
+
+        pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        futures = {
+            pool.submit(_search, app, client, query): (category_slug, query)
+            for category_slug, query in pending
+        }
+        try:
+            for future in as_completed(futures):
+                save(future)
+                handled.add(future)
+        except KeyboardInterrupt:
+            # Don't spend quota on queued searches; keep the ones already paid for
+            print("\nInterrupted: cancelling queued searches and saving finished ones...")
+            db.session.rollback()
+            pool.shutdown(wait=True, cancel_futures=True)
+            for future in futures:
+                if future not in handled and future.done() and not future.cancelled():
+                    save(future)
+                    handled.add(future)
+            raise
+        pool.shutdown()
+
+        # Category product counts are maintained by database triggers
+        bump_catalogue_version()
+
+        # Every query succeeded: the next run starts from scratch
+        if SyncCheckpoint.query.count() >= sum(len(q) for q in CATEGORY_SEARCHES.values()):
+            SyncCheckpoint.query.delete()
         db.session.commit()
 
         # Print summary
@@ -265,8 +400,9 @@ def sync_products(limit_per_query=10, clean=False):
         print(f"\nSerpApi monthly usage: {usage['used']}/{usage['limit']} ({usage['remaining']} remaining)")
 
         print(f"\nProducts by category:")
+        counts = {c.slug: c.product_count for c in Category.query.all()}
         for slug, name in ALL_CATEGORIES.items():
-            count = Product.query.filter_by(category=slug).count()
+            count = counts.get(slug) or 0
             if count > 0:
                 print(f"  {name}: {count}")
 
@@ -281,8 +417,16 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Sync products from Amazon via SerpApi")
     parser.add_argument("--clean", action="store_true", help="Clear existing data first")
     parser.add_argument("--limit", type=int, default=15, help="Max products per search query (default: 15)")
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints from an interrupted run")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Concurrent SerpApi searches (default: SYNC_CONCURRENCY)")
     args = parser.parse_args()
 
     print("Starting Amazon product sync via SerpApi...")
-    sync_products(limit_per_query=args.limit, clean=args.clean)
+    sync_products(
+        limit_per_query=args.limit,
+        clean=args.clean,
+        restart=args.restart,
+        concurrency=args.concurrency,
+    )
     print("\nDone! Run 'python app.py' to start the server.")
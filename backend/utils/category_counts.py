@@ -0,0 +1,127 @@
+"""Incrementally maintained Category.product_count.
+
+Triggers on products adjust categories.product_count on insert, delete and
+category change, so the count stays correct for every writer (API, sync.py,
+seed scripts, bulk SQL) without recounting. reconcile_category_counts()
+checks for drift with a single GROUP BY and can repair it. Other dialects
+have no triggers and rely on the repair command.
+"""
+import logging
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+SQLITE_COUNT_TRIGGERS = {
+    "products_category_count_ai": """CREATE TRIGGER IF NOT EXISTS products_category_count_ai
+        AFTER INSERT ON products WHEN new.category IS NOT NULL BEGIN
+        UPDATE categories SET product_count = coalesce(product_count, 0) + 1 WHERE slug = new.category;
+    END""",
+    "products_category_count_ad": """CREATE TRIGGER IF NOT EXISTS products_category_count_ad
+        AFTER DELETE ON products WHEN old.category IS NOT NULL BEGIN
+        UPDATE categories SET product_count = coalesce(product_count, 0) - 1 WHERE slug = old.category;
+    END""",
+    "products_category_count_au": """CREATE TRIGGER IF NOT EXISTS products_category_count_au
+        AFTER UPDATE OF category ON products WHEN old.category IS NOT new.category BEGIN
+        UPDATE categories SET product_count = coalesce(product_count, 0) - 1 WHERE slug = old.category;
+        UPDATE categories SET product_count = coalesce(product_count, 0) + 1 WHERE slug = new.category;
+    END""",
+}
+
+POSTGRES_COUNT_DDL = [
+    """CREATE OR REPLACE FUNCTION products_category_count() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.category IS NOT DISTINCT FROM NEW.category THEN
+            RETURN NULL;
+        END IF;
+        IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.category IS NOT NULL THEN
+            UPDATE categories SET product_count = coalesce(product_count, 0) - 1 WHERE slug = OLD.category;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.category IS NOT NULL THEN
+            UPDATE categories SET product_count = coalesce(product_count, 0) + 1 WHERE slug = NEW.category;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS products_category_count ON products",
+    """CREATE TRIGGER products_category_count
+        AFTER INSERT OR DELETE OR UPDATE OF category ON products
+        FOR EACH ROW EXECUTE FUNCTION products_category_count()""",
+]
+
+RECOUNT_SQL = """
+    SELECT c.slug, coalesce(c.product_count, 0), coalesce(p.n, 0)
+    FROM categories c
+    LEFT JOIN (SELECT category, count(*) AS n FROM products GROUP BY category) p
+        ON p.category = c.slug
+"""
+
+REPAIR_SQL = """
+    UPDATE categories SET product_count = (
+        SELECT count(*) FROM products WHERE products.category = categories.slug
+    )
+"""
+
+
+def _triggers_exist(connection):
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        found = connection.exec_driver_sql(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'products_category_count_%'"
+        ).scalar()
+        return found == len(SQLITE_COUNT_TRIGGERS)
+    if dialect == "postgresql":
+        return connection.exec_driver_sql(
+            "SELECT 1 FROM pg_trigger WHERE tgname = 'products_category_count'"
+        ).first() is not None
+    return False
+
+
+def install_count_triggers(connection):
+    """Create the product_count triggers for this dialect if missing (idempotent)."""
+    dialect = connection.dialect.name
+    existed = _triggers_exist(connection)
+
+    if dialect == "sqlite":
+        for sql in SQLITE_COUNT_TRIGGERS.values():
+            connection.exec_driver_sql(sql)
+    elif dialect == "postgresql":
+        if existed:
+            return
+        for sql in POSTGRES_COUNT_DDL:
+            connection.exec_driver_sql(sql)
+    else:
+        logger.warning(
+            "No product_count triggers for %s; run repair_counts.py after bulk changes", dialect
+        )
+        return
+
+    if not existed:
+        # Counts written before the triggers existed may be stale
+        reconcile_category_counts(connection, repair=True)
+
+
+def reconcile_category_counts(connection, repair=False):
+    """
+    Compare stored product counts with the products table in one GROUP BY.
+
+    Returns:
+        Dict of slug -> (stored, actual) for categories that drifted.
+    """
+    drift = {
+        slug: (stored, actual)
+        for slug, stored, actual in connection.exec_driver_sql(RECOUNT_SQL)
+        if stored != actual
+    }
+    if repair and drift:
+        connection.exec_driver_sql(REPAIR_SQL)
+    return drift
+
+
+def _after_create(target, connection, **kw):
+    install_count_triggers(connection)
+
+
+def register_count_triggers(products_table):
+    """Install the triggers whenever create_all() creates the products table."""
+    if not event.contains(products_table, "after_create", _after_create):
+        event.listen(products_table, "after_create", _after_create)
@@ -5,11 +5,24 @@ db = SQLAlchemy()
 
 def init_db(app):
     """Initialize database with Flask app"""
+    from utils.db_pool import engine_options
+
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
     db.init_app(app)
 
     with app.app_context():
         # Import models to register them
-        from models import product, review, category  # noqa
+        import models  # noqa
+        from utils.category_counts import install_count_triggers, register_count_triggers
+        from utils.search_index import install_search_index, register_search_index
+
+        register_search_index(models.Product.__table__)
+        register_count_triggers(models.Product.__table__)
 
         # Create all tables
         db.create_all()
+
+        # Full-text index and count triggers for tables created before they existed
+        with db.engine.begin() as conn:
+            install_search_index(conn)
+            install_count_triggers(conn)
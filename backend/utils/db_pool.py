@@ -0,0 +1,86 @@
+"""Database connection pool settings and metrics.
+
+engine_options() turns the DB_POOL_* settings into SQLAlchemy engine
+options. Pooled databases (anything but in-memory SQLite) get an
+InstrumentedQueuePool, which counts
+checkouts, time spent waiting for a connection, overflow connections and
+checkout timeouts so pool exhaustion is visible on /api/db-pool.
+"""
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+_stats_lock = threading.Lock()
+_stats = {
+    "checkouts": 0,
+    "waits": 0,  # checkouts that had to wait for a connection
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+    "timeouts": 0,
+    "overflow_opened": 0,
+}
+
+# Checkouts slower than this count as having waited
+WAIT_THRESHOLD_SECONDS = 0.001
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout waits, overflow and timeouts."""
+
+    def _do_get(self):
+        overflow_before = self._overflow
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with _stats_lock:
+                _stats["timeouts"] += 1
+            raise
+        waited = time.perf_counter() - start
+
+        with _stats_lock:
+            _stats["checkouts"] += 1
+            if waited >= WAIT_THRESHOLD_SECONDS:
+                _stats["waits"] += 1
+                _stats["wait_seconds_total"] += waited
+                _stats["wait_seconds_max"] = max(_stats["wait_seconds_max"], waited)
+            if self._overflow > overflow_before and self._overflow > 0:
+                _stats["overflow_opened"] += 1
+        return connection
+
+
+def engine_options(config):
+    """SQLAlchemy engine options for the configured database."""
+    options = {
+        "pool_pre_ping": config.get("DB_POOL_PRE_PING", True),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),
+    }
+    uri = config["SQLALCHEMY_DATABASE_URI"]
+    if not (uri in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in uri):
+        options.update({
+            "poolclass": InstrumentedQueuePool,
+            "pool_size": config.get("DB_POOL_SIZE", 5),
+            "max_overflow": config.get("DB_MAX_OVERFLOW", 10),
+            "pool_timeout": config.get("DB_POOL_TIMEOUT", 30),
+        })
+    return options
+
+
+def get_pool_stats(engine):
+    """Current pool state plus cumulative checkout counters (this worker process)."""
+    pool = engine.pool
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["wait_seconds_total"] = round(stats["wait_seconds_total"], 4)
+    stats["wait_seconds_max"] = round(stats["wait_seconds_max"], 4)
+    stats["pool_class"] = type(pool).__name__
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        })
+    return stats
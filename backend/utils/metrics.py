@@ -0,0 +1,245 @@
+"""Low-overhead Prometheus metrics.
+
+Counters and histograms are recorded into a shard owned by the current OS
+thread, so the hot path is a couple of dict updates with no lock. Under the
+gevent worker all greenlets share their OS thread's shard, which is safe
+because greenlets only switch at I/O. GET /api/metrics sums the shards and
+evaluates registered gauges, in the Prometheus text format. Shards of
+threads that have exited are folded into one retired total at scrape time.
+
+Counts are per worker process; Prometheus sums them across workers.
+"""
+import sys
+import threading
+import time
+from flask import g, has_request_context, request
+
+try:
+    from gevent.monkey import get_original
+    _get_ident = get_original("_thread", "get_ident")
+except ImportError:
+    from _thread import get_ident as _get_ident
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# Metric name -> (type, help, buckets for histograms)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by route, method and status", None),
+    "http_request_duration_seconds": ("histogram", "Time to produce the response, by route", LATENCY_BUCKETS),
+    "http_request_db_queries": ("histogram", "Database queries per request, by route", COUNT_BUCKETS),
+    "http_request_db_seconds": ("histogram", "Database time per request, by route", LATENCY_BUCKETS),
+    "db_queries_total": ("counter", "Database queries executed", None),
+    "db_query_duration_seconds": ("histogram", "Database query time", LATENCY_BUCKETS),
+    "external_api_duration_seconds": ("histogram", "Outbound API call latency by api and operation", LATENCY_BUCKETS),
+    "external_api_errors_total": ("counter", "Failed outbound API calls by api and operation", None),
+    "claude_tokens_total": ("counter", "Claude tokens by operation and kind", None),
+    "sentiment_reviews_total": ("counter", "Reviews analyzed by tier (local, claude, fallback)", None),
+    "chat_time_to_first_token_seconds": ("histogram", "Chat stream time to first text chunk", LATENCY_BUCKETS),
+}
+
+_shards = {}
+_shards_lock = threading.Lock()
+_retired = ({}, {})  # Totals folded in from the shards of threads that have exited
+_gauges = {}  # name -> (help, callback returning {labels: value})
+
+
+def _shard():
+    ident = _get_ident()
+    shard = _shards.get(ident)
+    if shard is None:
+        with _shards_lock:
+            shard = _shards.setdefault(ident, ({}, {}))
+    return shard
+
+
+def inc(name, labels=(), value=1):
+    """Add to a counter. labels is a tuple of (name, value) pairs."""
+    counters = _shard()[0]
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + value
+
+
+def observe(name, value, labels=()):
+    """Record one observation in a histogram."""
+    histograms = _shard()[1]
+    key = (name, labels)
+    entry = histograms.get(key)
+    if entry is None:
+        # Per-bucket counts (non-cumulative), then sum and count
+        entry = histograms[key] = [0] * (len(METRICS[name][2]) + 2)
+    buckets = METRICS[name][2]
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            entry[i] += 1
+            break
+    entry[-2] += value
+    entry[-1] += 1
+
+
+class timed:
+    """Context manager observing elapsed seconds into a histogram (and errors into a counter)."""
+
+    def __init__(self, name, labels=(), error_counter=None):
+        self.name = name
+        self.labels = labels
+        self.error_counter = error_counter
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.start, self.labels)
+        if exc_type is not None and self.error_counter:
+            inc(self.error_counter, self.labels)
+        return False
+
+
+def register_gauge(name, help_text, callback):
+    """Register a gauge computed at scrape time. callback returns {labels: value}."""
+    _gauges[name] = (help_text, callback)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _merge(into, shard):
+    counters, histograms = into
+    shard_counters, shard_histograms = shard
+    for key, value in list(shard_counters.items()):
+        counters[key] = counters.get(key, 0) + value
+    for key, entry in list(shard_histograms.items()):
+        total = histograms.get(key)
+        if total is None:
+            histograms[key] = list(entry)
+        else:
+            for i, value in enumerate(entry):
+                total[i] += value
+
+
+def _prune_shards():
+    """Fold the shards of exited threads into _retired, so _shards doesn't grow forever."""
+    # OS thread idents (not greenlets), the same ids _get_ident returns
+    live = sys._current_frames().keys()
+    with _shards_lock:
+        for ident in [ident for ident in _shards if ident not in live]:
+            _merge(_retired, _shards.pop(ident))
+
+
+def _collect():
+    _prune_shards()
+    totals = ({}, {})
+    with _shards_lock:
+        _merge(totals, _retired)
+        shards = list(_shards.values())
+    for shard in shards:
+        _merge(totals, shard)
+    return totals
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    counters, histograms = _collect()
+    lines = []
+
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        else:
+            for (metric, labels), entry in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, entry):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {entry[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {round(entry[-2], 6)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {entry[-1]}")
+
+    for name, (help_text, callback) in _gauges.items():
+        try:
+            values = callback()
+        except Exception:
+            continue  # A failing gauge shouldn't break the scrape
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in values.items():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _route_labels(status=None):
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    labels = (("route", rule), ("method", request.method))
+    if status is not None:
+        labels += (("status", str(status)),)
+    return labels
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_db_queries = 0
+    g.metrics_db_seconds = 0.0
+
+
+def _after_request(response):
+    start = g.get("metrics_start")
+    if start is not None:
+        route = _route_labels()
+        observe("http_request_duration_seconds", time.perf_counter() - start, route)
+        observe("http_request_db_queries", g.metrics_db_queries, route)
+        observe("http_request_db_seconds", g.metrics_db_seconds, route)
+        inc("http_requests_total", _route_labels(response.status_code))
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    inc("db_queries_total")
+    observe("db_query_duration_seconds", elapsed)
+    if has_request_context() and "metrics_db_queries" in g:
+        g.metrics_db_queries += 1
+        g.metrics_db_seconds += elapsed
+
+
+def _handle_error(context):
+    # A failed query never reaches after_cursor_execute; drop its start time
+    conn = context.connection
+    if conn is not None:
+        starts = conn.info.get("metrics_query_start")
+        if starts:
+            starts.pop()
+
+
+def init_app(app, engine):
+    """Time every request and database query."""
+    from sqlalchemy import event
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
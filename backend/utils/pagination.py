@@ -0,0 +1,126 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe token encoding (sort name, sort key, id) of
+the last row on the previous page. The next page is fetched with a WHERE
+on (sort key, id) instead of OFFSET, so deep pages cost the same as the
+first one and no COUNT is needed.
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from utils.database import db
+
+# Filtered "approx" totals stop counting here
+APPROX_COUNT_CAP = 1000
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor token can't be decoded or doesn't match the sort."""
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+
+def encode_cursor(sort, key, row_id):
+    """Encode the position after a row as an opaque token."""
+    payload = json.dumps([sort, _encode_value(key), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token, sort):
+    """
+    Decode a cursor token for the given sort.
+
+    Returns:
+        (key, row_id) of the last row on the previous page.
+
+    Raises:
+        InvalidCursorError if the token is malformed or was issued for another sort.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        cursor_sort, key, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        key = _decode_value(key)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid cursor") from e
+    if cursor_sort != sort:
+        raise InvalidCursorError("Cursor was issued for a different sort order")
+    return key, row_id
+
+
+def keyset_query(query, column, id_column, descending, cursor_position=None):
+    """
+    Order a query by (column, id_column) and start it after the cursor position.
+    NULL keys sort as the lowest value (last when descending, first when
+    ascending) on every dialect, and are compared with IS NULL explicitly.
+
+    Args:
+        cursor_position: (key, row_id) from decode_cursor, or None for the first page.
+    """
+    if cursor_position is not None:
+        key, row_id = cursor_position
+        if descending:
+            if key is None:
+                query = query.filter(column.is_(None), id_column < row_id)
+            else:
+                query = query.filter(db.or_(
+                    column < key,
+                    db.and_(column == key, id_column < row_id),
+                    column.is_(None),
+                ))
+        else:
+            if key is None:
+                query = query.filter(db.or_(
+                    db.and_(column.is_(None), id_column > row_id),
+                    column.isnot(None),
+                ))
+            else:
+                query = query.filter(db.or_(column > key, db.and_(column == key, id_column > row_id)))
+
+    if descending:
+        return query.order_by(column.desc().nulls_last(), id_column.desc())
+    return query.order_by(column.asc().nulls_first(), id_column.asc())
+
+
+def capped_count(query, cap=APPROX_COUNT_CAP):
+    """
+    Count rows, but stop after `cap`.
+
+    Returns:
+        (count, is_capped)
+    """
+    limited = query.order_by(None).limit(cap + 1).subquery()
+    count = db.session.query(db.func.count()).select_from(limited).scalar()
+    return min(count, cap), count > cap
+
+
+def estimated_table_rows(table_name):
+    """Cheap row estimate for an unfiltered table, from planner statistics where available."""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        estimate = db.session.execute(
+            db.text("SELECT reltuples::bigint FROM pg_class WHERE relname = :name"),
+            {"name": table_name},
+        ).scalar()
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+    if dialect == "sqlite":
+        # rowids are assigned ascending, so max(rowid) bounds the row count without a scan
+        return db.session.execute(db.text(f"SELECT max(rowid) FROM {table_name}")).scalar() or 0
+    return db.session.execute(db.text(f"SELECT count(*) FROM {table_name}")).scalar()
@@ -0,0 +1,186 @@
+"""Opt-in per-request profiling.
+
+When PROFILING_SECRET is set, a request carrying `X-Profile: <secret>` runs
+under a sampling profiler and SQL recorder, and its response body is
+replaced by a JSON report:
+
+- collapsed: sampled stacks in collapsed format ("root;child;leaf count"
+  per line), ready for flamegraph.pl, speedscope or inferno
+- sql: every statement with its duration, in execution order
+- n_plus_one: statements executed PROFILING_N_PLUS_ONE_THRESHOLD or more
+  times in the request, usually a lazy load inside a loop
+
+Save the flamegraph input with: curl -H "X-Profile: $SECRET" URL | jq -r .collapsed
+
+Without PROFILING_SECRET no hooks are installed at all. Streamed responses
+are profiled up to the point the view returns; their body is closed unread.
+Under the gevent worker the request's own greenlet is sampled, not whichever
+greenlet happens to be running on the OS thread.
+"""
+import hmac
+import json
+import os
+import sys
+import time
+from collections import Counter
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+
+try:
+    from gevent import getcurrent as _gevent_current
+    from gevent.monkey import get_original, is_module_patched
+    _get_ident = get_original("_thread", "get_ident")
+    _start_thread = get_original("_thread", "start_new_thread")
+    _allocate_lock = get_original("_thread", "allocate_lock")
+    _sleep = get_original("time", "sleep")
+except ImportError:
+    from _thread import allocate_lock as _allocate_lock
+    from _thread import get_ident as _get_ident
+    from _thread import start_new_thread as _start_thread
+    _sleep = time.sleep
+    _gevent_current = None
+
+PROFILE_HEADER = "X-Profile"
+
+# Statements longer than this are truncated in the report
+MAX_STATEMENT_CHARS = 2000
+
+
+def _request_greenlet():
+    """The current greenlet when running under gevent's monkey-patching, else None."""
+    if _gevent_current is not None and is_module_patched("threading"):
+        return _gevent_current()
+    return None
+
+
+class StackSampler:
+    """
+    Samples one thread's (or greenlet's) Python stack from a separate OS thread.
+    All greenlets share their OS thread, so with a greenlet its saved frame is
+    used while it is switched out, and the thread's frame only while it runs.
+    """
+
+    def __init__(self, thread_id, interval, greenlet=None):
+        self.thread_id = thread_id
+        self.greenlet = greenlet
+        self.interval = interval
+        self.samples = Counter()
+        self._running = False
+        self._finished = None
+
+    def start(self):
+        self._running = True
+        self._finished = _allocate_lock()
+        self._finished.acquire()
+        # A real OS thread even under gevent, so it samples while the request runs
+        _start_thread(self._run, ())
+
+    def _run(self):
+        try:
+            while self._running:
+                frame = self.greenlet.gr_frame if self.greenlet is not None else None
+                if frame is None:
+                    # Not switched out: the thread is running this greenlet's stack
+                    frame = sys._current_frames().get(self.thread_id)
+                if frame is not None:
+                    self.samples[_collapse(frame)] += 1
+                _sleep(self.interval)
+        finally:
+            self._finished.release()
+
+    def stop(self):
+        self._running = False
+        self._finished.acquire()
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and g.get("profile_sql") is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    queries = g.get("profile_sql")
+    starts = conn.info.get("profile_query_start")
+    if queries is None or not starts:
+        return
+    queries.append((statement, time.perf_counter() - starts.pop()))
+
+
+def _is_profiled():
+    secret = current_app.config.get("PROFILING_SECRET", "")
+    supplied = request.headers.get(PROFILE_HEADER)
+    return bool(supplied) and hmac.compare_digest(supplied.encode("utf-8"), secret.encode("utf-8"))
+
+
+def _before_request():
+    if not _is_profiled():
+        return
+    g.profile_sql = []
+    g.profile_start = time.perf_counter()
+    interval = current_app.config.get("PROFILING_INTERVAL_MS", 1) / 1000.0
+    g.profile_sampler = StackSampler(_get_ident(), interval, _request_greenlet())
+    g.profile_sampler.start()
+
+
+def _after_request(response):
+    sampler = g.get("profile_sampler")
+    if sampler is None:
+        return response
+    sampler.stop()
+    duration = time.perf_counter() - g.profile_start
+    queries = g.profile_sql
+    g.profile_sql = None
+
+    threshold = current_app.config.get("PROFILING_N_PLUS_ONE_THRESHOLD", 3)
+    repeated = Counter(statement for statement, _ in queries)
+    report = {
+        "path": request.full_path.rstrip("?"),
+        "status": response.status_code,
+        "duration_ms": round(duration * 1000, 3),
+        "samples": sum(sampler.samples.values()),
+        "collapsed": sampler.collapsed(),
+        "sql_count": len(queries),
+        "sql_ms": round(sum(elapsed for _, elapsed in queries) * 1000, 3),
+        "sql": [
+            {"statement": statement[:MAX_STATEMENT_CHARS], "ms": round(elapsed * 1000, 3)}
+            for statement, elapsed in queries
+        ],
+        "n_plus_one": [
+            {
+                "statement": statement[:MAX_STATEMENT_CHARS],
+                "count": count,
+                "total_ms": round(sum(e for s, e in queries if s == statement) * 1000, 3),
+            }
+            for statement, count in repeated.most_common()
+            if count >= threshold
+        ],
+    }
+    # The original is never sent: close it so its call_on_close callbacks
+    # (e.g. a chat stream's slot release) still run
+    response.close()
+    return Response(json.dumps(report), status=200, mimetype="application/json")
+
+
+def init_app(app, engine):
+    """Install the profiling hooks if PROFILING_SECRET is configured."""
+    if not app.config.get("PROFILING_SECRET"):
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
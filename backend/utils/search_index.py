@@ -0,0 +1,183 @@
+"""Full-text product search index.
+
+SQLite: an FTS5 table (products_fts) keyed by products.id, kept in sync by
+triggers on products. Postgres: a generated, weighted tsvector column with a
+GIN index. Both stay current for every writer (API, sync.py, bulk SQL)
+because the database maintains them. Other dialects fall back to LIKE.
+"""
+import logging
+import re
+from sqlalchemy import event
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+# products has a string primary key and its implicit rowid is not stable
+# (VACUUM or a dump/restore may renumber it), so the FTS5 table keeps its own
+# copy of the text plus products.id. products_fts_ids gives each product a
+# stable INTEGER PRIMARY KEY for the FTS rowid, so the triggers can find a
+# product's FTS row without scanning.
+SQLITE_FTS_DDL = [
+    """CREATE TABLE IF NOT EXISTS products_fts_ids (
+        rowid INTEGER PRIMARY KEY,
+        product_id VARCHAR(36) NOT NULL UNIQUE
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        product_id UNINDEXED, name, description, category,
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT OR IGNORE INTO products_fts_ids(product_id) VALUES (new.id);
+        INSERT INTO products_fts(rowid, product_id, name, description, category)
+        SELECT rowid, new.id, new.name, new.description, new.category
+        FROM products_fts_ids WHERE product_id = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        DELETE FROM products_fts WHERE rowid = (SELECT rowid FROM products_fts_ids WHERE product_id = old.id);
+        DELETE FROM products_fts_ids WHERE product_id = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description, category ON products BEGIN
+        UPDATE products_fts SET name = new.name, description = new.description, category = new.category
+        WHERE rowid = (SELECT rowid FROM products_fts_ids WHERE product_id = new.id);
+    END""",
+]
+
+# Index rows written before the triggers existed
+SQLITE_FTS_REBUILD = [
+    "DELETE FROM products_fts",
+    "DELETE FROM products_fts_ids",
+    "INSERT INTO products_fts_ids(product_id) SELECT id FROM products",
+    """INSERT INTO products_fts(rowid, product_id, name, description, category)
+        SELECT m.rowid, p.id, p.name, p.description, p.category
+        FROM products p JOIN products_fts_ids m ON m.product_id = p.id""",
+]
+
+# The earlier index was external-content, keyed on products.rowid
+SQLITE_FTS_DROP = [
+    "DROP TRIGGER IF EXISTS products_fts_ai",
+    "DROP TRIGGER IF EXISTS products_fts_ad",
+    "DROP TRIGGER IF EXISTS products_fts_au",
+    "DROP TABLE IF EXISTS products_fts",
+    "DROP TABLE IF EXISTS products_fts_ids",
+]
+
+POSTGRES_FTS_DDL = [
+    """ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(category, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'C')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING GIN (search_vector)",
+]
+
+# bm25() column weights for product_id (unindexed), name, description, category
+SQLITE_BM25_WEIGHTS = (0.0, 10.0, 1.0, 5.0)
+
+# engine URL -> whether the full-text index exists
+_available = {}
+
+
+def install_search_index(connection):
+    """Create the search index for this dialect if missing (idempotent)."""
+    dialect = connection.dialect.name
+    key = str(connection.engine.url)
+
+    if dialect == "sqlite":
+        existing = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE name = 'products_fts'"
+        ).scalar()
+        if existing and "product_id" not in existing:
+            for sql in SQLITE_FTS_DROP:
+                connection.exec_driver_sql(sql)
+            existing = None
+        try:
+            for sql in SQLITE_FTS_DDL:
+                connection.exec_driver_sql(sql)
+        except Exception as e:
+            # SQLite built without FTS5
+            logger.warning("FTS5 unavailable, product search will use LIKE: %s", e)
+            _available[key] = False
+            return
+        if not existing:
+            for sql in SQLITE_FTS_REBUILD:
+                connection.exec_driver_sql(sql)
+        _available[key] = True
+
+    elif dialect == "postgresql":
+        for sql in POSTGRES_FTS_DDL:
+            connection.exec_driver_sql(sql)
+        _available[key] = True
+
+    else:
+        _available[key] = False
+
+
+def _drop_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        for sql in SQLITE_FTS_DROP:
+            connection.exec_driver_sql(sql)
+    _available.pop(str(connection.engine.url), None)
+
+
+def _after_create(target, connection, **kw):
+    install_search_index(connection)
+
+
+def register_search_index(products_table):
+    """Keep the index in step with create_all()/drop_all() on the products table."""
+    if not event.contains(products_table, "after_create", _after_create):
+        event.listen(products_table, "after_create", _after_create)
+        event.listen(products_table, "before_drop", _drop_search_index)
+
+
+def _tokens(term):
+    return re.findall(r"\w+", term.lower())
+
+
+def apply_search(query, term):
+    """
+    Filter a Product query by a full-text search term.
+
+    Returns:
+        (query, relevance_order): relevance_order is an ORDER BY clause that
+        puts the best matches first, or None when falling back to LIKE.
+    """
+    from models.product import Product
+
+    tokens = _tokens(term)
+    engine = db.engine
+    dialect = engine.dialect.name
+
+    if tokens and _available.get(str(engine.url)):
+        if dialect == "sqlite":
+            # Quoted prefix terms, implicitly ANDed: "wire"* "head"*
+            match = " ".join(f'"{t}"*' for t in tokens)
+            fts = (
+                db.select(
+                    db.literal_column("product_id").label("product_id"),
+                    db.func.bm25(db.literal_column("products_fts"), *SQLITE_BM25_WEIGHTS).label("rank"),
+                )
+                .select_from(db.table("products_fts"))
+                .where(db.literal_column("products_fts").op("MATCH")(match))
+                .subquery("fts")
+            )
+            query = query.join(fts, fts.c.product_id == Product.id)
+            # bm25() is lower-is-better
+            return query, fts.c.rank.asc()
+
+        if dialect == "postgresql":
+            tsquery = db.func.to_tsquery("english", " & ".join(f"{t}:*" for t in tokens))
+            vector = db.literal_column("products.search_vector")
+            query = query.filter(vector.op("@@")(tsquery))
+            return query, db.func.ts_rank_cd(vector, tsquery).desc()
+
+    search_pattern = f"%{term}%"
+    query = query.filter(
+        db.or_(
+            Product.name.like(search_pattern),
+            Product.description.like(search_pattern),
+            Product.category.like(search_pattern),
+        )
+    )
+    return query, None
@@ -0,0 +1,70 @@
+"""
+Review refresh worker — drains the background review refresh queue.
+Run: python worker.py [--once] [--poll-interval SECONDS]
+
+GET /api/products/<id> enqueues stale products; this process does the
+SerpApi fetches and Claude sentiment analysis outside the web workers.
+Every REVIEW_SCHEDULE_SECONDS it also enqueues viewed products whose
+reviews are due, within the paced SerpApi budget.
+"""
+import argparse
+import logging
+import time
+from app import create_app
+from services import shared_counters
+from services.refresh_queue import process_next_job, schedule_due_refreshes
+from utils.database import db
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker(once=False, poll_interval=None):
+    """Process refresh jobs until the queue is empty (--once) or forever."""
+    app = create_app()
+
+    with app.app_context():
+        if poll_interval is None:
+            poll_interval = app.config.get("REVIEW_REFRESH_POLL_SECONDS", 5)
+        schedule_interval = app.config.get("REVIEW_SCHEDULE_SECONDS", 300)
+
+        processed = 0
+        last_scheduled = None
+        while True:
+            try:
+                if last_scheduled is None or time.monotonic() - last_scheduled >= schedule_interval:
+                    last_scheduled = time.monotonic()
+                    scheduled = schedule_due_refreshes()
+                    if scheduled:
+                        logger.info("Scheduled %d due review refresh(es)", scheduled)
+                did_work = process_next_job()
+            except Exception as e:
+                # Database hiccup — back off and keep the worker alive
+                logger.exception("Refresh worker error: %s", e)
+                db.session.rollback()
+                did_work = False
+            finally:
+                db.session.remove()
+
+            if did_work:
+                processed += 1
+                continue
+
+            # Idle: publish buffered stats so /api/cache-stats sees them now
+            shared_counters.flush()
+            if once:
+                break
+            time.sleep(poll_interval)
+
+        print(f"Processed {processed} review refresh job(s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drain the review refresh queue")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--poll-interval", type=float, default=None,
+                        help="Seconds to sleep when the queue is empty (default: REVIEW_REFRESH_POLL_SECONDS)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    print("Starting review refresh worker...")
+    run_worker(once=args.once, poll_interval=args.poll_interval)
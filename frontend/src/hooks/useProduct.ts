@@ -11,5 +11,7 @@ export const useProduct = (productId: string | undefined) => {
       return response.data;
     },
     enabled: !!productId,
+    // Poll while the backend refreshes reviews in the background
+    refetchInterval: (query) => (query.state.data?.refreshing ? 5000 : false),
   });
 };
@@ -6,7 +6,7 @@ export interface UseProductsParams {
   page?: number;
   limit?: number;
   category?: string;
-  sort?: 'rating_desc' | 'rating_asc' | 'price_asc' | 'price_desc' | 'newest';
+  sort?: 'relevance' | 'rating_desc' | 'rating_asc' | 'price_asc' | 'price_desc' | 'newest';
   search?: string;
 }
 
@@ -10,6 +10,7 @@ import { CategoryCard } from '../components/categories/CategoryCard';
 import { ChevronRight } from 'lucide-react';
 
 const SORT_OPTIONS: SortOption[] = [
+  { value: 'relevance', label: 'Best Match' },
   { value: 'rating_desc', label: 'Highest Rated' },
   { value: 'rating_asc', label: 'Lowest Rated' },
   { value: 'price_desc', label: 'Price: High to Low' },
@@ -22,7 +23,7 @@ export const SearchPage = () => {
 
   const query = searchParams.get('q') || '';
   const page = parseInt(searchParams.get('page') || '1', 10);
-  const sort = (searchParams.get('sort') || 'rating_desc') as NonNullable<UseProductsParams['sort']>;
+  const sort = (searchParams.get('sort') || 'relevance') as NonNullable<UseProductsParams['sort']>;
 
   const { data, isLoading, error } = useProducts({
     search: query,
@@ -9,6 +9,16 @@ export interface Review {
   scraped_at: string | null;
 }
 
+export interface ReviewStats {
+  total: number;
+  by_source: Record<string, number>;
+  sentiment_histogram: number[]; // 5 equal buckets over 0-1 sentiment
+  average_sentiment: number | null;
+  average_star_rating: number | null; // 1-5, from source star ratings
+  top_pros: string[];
+  top_cons: string[];
+}
+
 export interface Product {
   id: string;
   name: string;
@@ -21,10 +31,12 @@ export interface Product {
   source_url: string | null;
   created_at: string | null;
   updated_at: string | null;
+  review_stats: ReviewStats;
 }
 
 export interface ProductDetail extends Product {
   reviews: Review[];
+  refreshing: boolean; // true while a background review refresh is queued
 }
 
 export interface Category {